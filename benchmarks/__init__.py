@@ -0,0 +1,6 @@
+"""
+Benchmarks for the inventory: seeded synthetic data (generators), timing and
+baseline comparison helpers (harness), and the regression suite run with
+`python -m benchmarks`. The bench_*.py scripts alongside compare one data
+structure against the approach it replaced.
+"""
@@ -0,0 +1,195 @@
+"""
+Regression benchmarks for the inventory's hot paths.
+
+Builds a seeded synthetic inventory and sales/returns ledgers in a temporary
+directory, drives loading, saving, searches, expiry windows, sales and
+ledger reporting through the same non-interactive calls the menu and the API
+use, and prints ops/sec, latency percentiles and peak memory per case. With
+--save the run becomes the baseline; otherwise it is compared against the
+stored baseline and the exit status is 1 if any case regressed.
+
+Usage: python -m benchmarks [--size N] [--ledger N] [--backend NAME] [--save]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from main import (BACKENDS, RETURNS_FILE, SALES_FILE, ExpiryIndex, InventoryError,
+                  InventoryStore, LotIndex, NameIndex, SalesAggregates, expiry_window,
+                  open_backend)
+
+from benchmarks.generators import iter_ledger_frames, make_inventory
+from benchmarks.harness import compare, load_baseline, measure, save_baseline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LEDGER_BATCH = 10_000
+
+
+def ledger_batches(frames: Iterator[List[Any]]) -> Iterator[Tuple[List[List[Any]]]]:
+    """Generated frames in write-sized batches, as measure() call arguments"""
+    while True:
+        batch = list(islice(frames, LEDGER_BATCH))
+        if not batch:
+            return
+        yield (batch,)
+
+
+def search_queries(store: InventoryStore, rng: random.Random, count: int) -> List[Tuple[str]]:
+    """What the counter types: whole names, a generic alone, partial words, and misses"""
+    names = sorted({med.name for med in store})
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.4:
+            queries.append((name,))
+        elif roll < 0.7:
+            queries.append((name.split()[0],))
+        elif roll < 0.9:
+            queries.append((name[:rng.randint(3, 6)],))
+        else:
+            queries.append((f"xq{rng.randint(0, 999)}z",))
+    return queries
+
+
+def run_suite(args: argparse.Namespace, report: Callable[[str, Dict[str, float]], None]) -> None:
+    """Run every selected case, handing each result to report as it finishes"""
+    rng = random.Random(args.seed)
+    wanted = set(args.cases or [])
+
+    def case(name: str, fn: Callable[..., Any], calls, trace_memory: bool = True) -> None:
+        if not wanted or name in wanted:
+            report(name, measure(fn, calls, trace_memory))
+
+    medicines = make_inventory(args.size, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        # A fresh backend per call, so the pickle backend's reload cache is not measured
+        case("save_all", lambda: open_backend(args.backend, directory).save_all(medicines),
+             [()] * args.repeat)
+        if wanted and "save_all" not in wanted:
+            open_backend(args.backend, directory).save_all(medicines)
+        case("load", lambda: open_backend(args.backend, directory).load(), [()] * args.repeat)
+
+        backend = open_backend(args.backend, directory)
+
+        def write(ledger: str, batch: List[List[Any]]) -> None:
+            _, spans = backend.write_transactions(ledger, batch)
+            backend.index_transactions(ledger, batch, spans)
+
+        sales = iter_ledger_frames(medicines, args.ledger, args.seed)
+        returns = iter_ledger_frames(medicines, args.ledger // 50, args.seed + 1, returns=True)
+        # Always written, since the reporting cases below read them; measured
+        # per batch, without the memory pass that would append frames out of date order
+        report_write = not wanted or "ledger_write" in wanted
+        calls = ledger_batches(sales)
+        if report_write:
+            report("ledger_write", measure(lambda batch: write(SALES_FILE, batch), calls, False))
+        else:
+            for (batch,) in calls:
+                write(SALES_FILE, batch)
+        for (batch,) in ledger_batches(returns):
+            write(RETURNS_FILE, batch)
+
+        case("aggregates_rebuild", lambda: SalesAggregates.rebuild(backend), [()] * args.repeat)
+        today = datetime.date.today()
+        windows = [(today - datetime.timedelta(days=rng.randint(30, 365)),) for _ in range(20)]
+        case("ledger_between",
+             lambda start: sum(frame[3] for frame in backend.transactions_between(
+                 SALES_FILE, start, start + datetime.timedelta(days=30))),
+             windows)
+
+        store = InventoryStore(backend)
+        # The store builds these lazily on its first search after a load
+        case("index_build", lambda: (NameIndex().rebuild(store.medicines),
+                                     ExpiryIndex().rebuild(store.medicines),
+                                     LotIndex().rebuild(store.medicines)),
+             [()] * args.repeat)
+        store.search("")
+        case("search", store.search, search_queries(store, rng, args.calls))
+        case("expiry_window",
+             lambda answer: store.expiring_by(expiry_window(answer)),
+             [(rng.choice(["7", "30", "90"]),) for _ in range(args.calls)])
+
+        stocked = [med.id for med in store if med.quantity > 0 and med.expiry_date > today]
+
+        def sell(m_id: int) -> None:
+            try:
+                store.checkout([(m_id, 1)])
+            except InventoryError:
+                pass
+
+        case("checkout", sell, [(rng.choice(stocked),) for _ in range(args.calls)])
+        case("record_transaction",
+             lambda name: store.record_transaction(SALES_FILE, name, 1, 1.0),
+             [(rng.choice(medicines).name,) for _ in range(args.calls)])
+
+
+def main_(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark the inventory and compare against a baseline")
+    parser.add_argument("--size", type=int, default=100_000, help="medicines (lots) in the inventory")
+    parser.add_argument("--ledger", type=int, default=1_000_000, help="sales frames in the ledger")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="pickle")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--calls", type=int, default=1000, help="calls per per-request case")
+    parser.add_argument("--repeat", type=int, default=3, help="calls per whole-inventory case")
+    parser.add_argument("--cases", nargs="*", metavar="CASE", help="run only these cases")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth before a case is flagged")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    settings = {"size": args.size, "ledger": args.ledger, "backend": args.backend,
+                "seed": args.seed, "calls": args.calls, "repeat": args.repeat}
+    baseline = load_baseline(args.baseline)
+    if args.save or not baseline:
+        if not args.save:
+            print(f"no baseline at {args.baseline} yet; run with --save to store one")
+        base_results = {}
+    elif baseline.get("settings") != settings:
+        print(f"baseline {args.baseline} was run with {baseline.get('settings')}; not comparing")
+        base_results = {}
+    else:
+        base_results = baseline["results"]
+
+    print(f"backend {args.backend}, {args.size:,} medicines, {args.ledger:,} sales frames, seed {args.seed}")
+    print(f"{'CASE':<20}{'CALLS':>7}{'OPS/S':>12}{'P50 ms':>10}{'P95 ms':>10}"
+          f"{'P99 ms':>10}{'PEAK KiB':>11}  VS BASELINE")
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+
+    def report(name: str, result: Dict[str, float]) -> None:
+        results[name] = result
+        verdict = ""
+        if name in base_results:
+            problems = compare(result, base_results[name], args.tolerance)
+            change = result["ops_per_sec"] / base_results[name]["ops_per_sec"] - 1
+            verdict = f"{change:+.0%}" + (f"  REGRESSED: {'; '.join(problems)}" if problems else "")
+            if problems:
+                regressions.append(name)
+        print(f"{name:<20}{result['calls']:>7}{result['ops_per_sec']:>12,.1f}{result['p50_ms']:>10.3f}"
+              f"{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['peak_kib']:>11,.0f}  {verdict}")
+
+    start = time.perf_counter()
+    run_suite(args, report)
+    print(f"finished in {time.perf_counter() - start:.1f}s")
+
+    if args.save:
+        save_baseline(args.baseline, settings, results)
+        print(f"baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,72 @@
+"""
+Benchmark the pickle and SQLite storage backends on the same workload:
+bulk load, single-item sales (inventory write + ledger append), reload,
+and ledger queries.
+
+Usage: python benchmarks/bench_backends.py [catalog_size] [sales]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import BACKENDS, SALES_FILE, InventoryStore, SalesAggregates, open_backend  # noqa: E402
+from benchmarks.generators import make_stock  # noqa: E402
+
+
+def run(backend_name: str, medicines, sales: int):
+    rng = random.Random(7)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        backend = open_backend(backend_name, directory)
+        start = time.perf_counter()
+        backend.save_all(medicines)
+        results["bulk save"] = time.perf_counter() - start
+
+        store = InventoryStore(open_backend(backend_name, directory))
+        start = time.perf_counter()
+        for _ in range(sales):
+            med = store.get(rng.randint(1, len(medicines)))
+            store.record_transaction(SALES_FILE, med.name, 1, med.price)
+            med.quantity -= 1
+            store.update(med)
+        results[f"{sales} sales"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        open_backend(backend_name, directory).load()
+        results["reload"] = time.perf_counter() - start
+
+        today = datetime.date.today()
+        start = time.perf_counter()
+        sum(1 for _ in store.backend.transactions_between(SALES_FILE, today, today))
+        results["sales today"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sum(1 for _ in store.backend.transactions_for_medicine(SALES_FILE, "Medicine 1"))
+        results["sales of one"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        SalesAggregates.rebuild(store.backend)
+        results["rebuild totals"] = time.perf_counter() - start
+    return results
+
+
+def main_() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    sales = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    medicines = make_stock(size, 10_000)
+    table = {name: run(name, medicines, sales) for name in sorted(BACKENDS)}
+    names = sorted(table)
+    print(f"catalog: {size} medicines, {sales} sales")
+    print(f"{'OPERATION':<18}" + "".join(f"{name.upper() + ' ms':>14}" for name in names))
+    for op in table[names[0]]:
+        print(f"{op:<18}" + "".join(f"{table[name][op] * 1000:>14.1f}" for name in names))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,69 @@
+"""
+Benchmark the chain-wide reports as the number of stores grows: every
+store's shard read one after another in this process, against one worker
+process per core. Each store gets its own seeded inventory and a year of
+sales; the worker pool is started before timing, as it is kept between
+reports.
+
+Usage: python benchmarks/bench_chain.py [lots_per_store] [sales_per_store] [store_count ...]
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import iter_ledger_frames, make_inventory, write_ledger  # noqa: E402
+
+REPORTS = ["valuation", "expiry", "stock", "sales"]
+
+
+def reports(chain: main.StoreChain) -> dict:
+    """Seconds taken by each chain-wide report"""
+    window = datetime.date.today() + datetime.timedelta(days=30)
+    calls = {"valuation": chain.valuation,
+             "expiry": lambda: list(chain.expiring_by(window)),
+             "stock": lambda: chain.stock_of("paracetamol"),
+             "sales": chain.sales}
+    timings = {}
+    for name in REPORTS:
+        start = time.perf_counter()
+        calls[name]()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def main_() -> None:
+    lots = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    sales = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    counts = [int(arg) for arg in sys.argv[3:]] or [1, 2, 4, 8]
+    cores = os.cpu_count() or 1
+    print(f"{lots} lots and {sales} sales per store, {cores} cores")
+    if cores == 1:
+        print("(only one core here: the parallel column can show pool overhead, not speed-up)")
+    print(f"{'STORES':>7}{'REPORT':>11}{'SERIAL ms':>11}{'PARALLEL ms':>13}{'SPEED-UP':>10}")
+    with tempfile.TemporaryDirectory() as root:
+        built = 0
+        for count in sorted(counts):
+            for seed in range(built, count):
+                medicines = make_inventory(lots, seed=seed)
+                backend = main.StoreChain(root).open_backend(f"store{seed:03d}")
+                backend.save_all(medicines)
+                write_ledger(backend, main.SALES_FILE, iter_ledger_frames(medicines, sales, seed=seed))
+            built = max(built, count)
+            serial = main.StoreChain(root, workers=1)
+            parallel = main.StoreChain(root, workers=cores)
+            parallel.valuation()
+            one, many = reports(serial), reports(parallel)
+            parallel.close()
+            for name in REPORTS:
+                print(f"{count:>7}{name:>11}{one[name] * 1000:>11.1f}{many[name] * 1000:>13.1f}"
+                      f"{one[name] / many[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
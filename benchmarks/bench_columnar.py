@@ -0,0 +1,57 @@
+"""
+Benchmark inventory valuation: a Python loop over Medicine objects against
+ColumnarInventory (NumPy when installed, plain arrays otherwise).
+
+Usage: python benchmarks/bench_columnar.py [sizes...]
+"""
+
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from main import ColumnarInventory  # noqa: E402
+from benchmarks.generators import make_inventory  # noqa: E402
+from benchmarks.harness import best_time  # noqa: E402
+
+
+def loop_value_at_risk(medicines, m_type, cutoff):
+    """Valuation the way a list-of-records inventory has to do it"""
+    return sum(med.quantity * med.price for med in medicines
+               if med.type == m_type and med.expiry_date <= cutoff)
+
+
+def main_() -> None:
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000_000]
+    cutoff = datetime.date.today() + datetime.timedelta(days=90)
+    engine = "numpy" if main.numpy is not None else "array"
+    print(f"columnar engine: {engine}")
+    print(f"{'RECORDS':>10}{'QUERY':>22}{'LOOP ms':>12}{'COLUMN ms':>12}{'SPEEDUP':>10}")
+    for n in sizes:
+        medicines = make_inventory(n)
+        start = time.perf_counter()
+        columns = ColumnarInventory.from_medicines(medicines)
+        build = time.perf_counter() - start
+
+        t_loop, expected = best_time(lambda: sum(med.amount for med in medicines))
+        t_col, got = best_time(columns.value)
+        assert abs(expected - got) < 1e-6 * max(1.0, expected)
+        print(f"{n:>10}{'total value':>22}{t_loop * 1000:>12.1f}{t_col * 1000:>12.1f}{t_loop / t_col:>9.1f}x")
+
+        t_loop, expected = best_time(loop_value_at_risk, medicines, 1, cutoff)
+        t_col, got = best_time(columns.value, m_type=1, expiring_by=cutoff)
+        assert abs(expected - got) < 1e-6 * max(1.0, expected)
+        print(f"{n:>10}{'tablets expiring 90d':>22}{t_loop * 1000:>12.1f}{t_col * 1000:>12.1f}{t_loop / t_col:>9.1f}x")
+
+        t_loop, expected = best_time(lambda: sum(1 for med in medicines if med.quantity <= 10))
+        t_col, got = best_time(columns.count, max_quantity=10)
+        assert expected == got
+        print(f"{n:>10}{'low stock count':>22}{t_loop * 1000:>12.1f}{t_col * 1000:>12.1f}{t_loop / t_col:>9.1f}x")
+        print(f"{n:>10}  column build: {build:.2f}s")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,49 @@
+"""
+Benchmark the expiry report: parsing every date against ExpiryIndex range queries.
+
+A fixed number of medicines expire inside the window and the rest are spread
+over the following five years, so the indexed query should stay flat while the
+scan grows with the catalog.
+
+Usage: python benchmarks/bench_expiry.py [sizes...]
+"""
+
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ExpiryIndex, parse_date  # noqa: E402
+from benchmarks.generators import make_expiring  # noqa: E402
+from benchmarks.harness import best_time  # noqa: E402
+
+EXPIRING = 100
+
+
+def scan(records, threshold):
+    """The report loop before the index existed, over schema 1 list records"""
+    return [med for med in records if parse_date(med[4]) <= threshold]
+
+
+def main_() -> None:
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    threshold = datetime.date.today() + datetime.timedelta(days=30)
+    print(f"{'RECORDS':>10}{'MATCHES':>10}{'SCAN ms':>12}{'INDEX ms':>12}{'BUILD s':>10}")
+    for n in sizes:
+        records = make_expiring(n, EXPIRING)
+        index = ExpiryIndex()
+        start = time.perf_counter()
+        index.rebuild(records)
+        build = time.perf_counter() - start
+        matches = len(index.expiring_by(threshold))
+        assert matches == EXPIRING
+        legacy = [med.to_list() for med in records]
+        t_scan, _ = best_time(scan, legacy, threshold, repeat=1 if n >= 1_000_000 else 3)
+        t_index, _ = best_time(index.expiring_by, threshold)
+        print(f"{n:>10}{matches:>10}{t_scan * 1000:>12.2f}{t_index * 1000:>12.4f}{build:>10.2f}")
+
+
+if __name__ == "__main__":
+    main_()
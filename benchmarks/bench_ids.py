@@ -0,0 +1,68 @@
+"""
+Benchmark the two lookups a new lot and a scanned sale need. Handing out an
+ID used to scan every ID in use (max + 1); it is now a stored counter. A
+scanned sale used to find its medicine by matching names; the barcode is
+now looked up directly.
+
+Usage: python benchmarks/bench_ids.py [catalog_size ...]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import make_inventory  # noqa: E402
+from benchmarks.harness import mean_time  # noqa: E402
+
+ADDS = 1_000
+LOOKUPS = 2_000
+
+
+def with_barcodes(medicines):
+    """Give every product one barcode, shared by all its lots"""
+    codes = {}
+    for med in medicines:
+        med.barcode = codes.setdefault(main.product_key(med), f"890{len(codes):010d}")
+    return medicines
+
+
+def run(size: int):
+    medicines = with_barcodes(make_inventory(size))
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as directory:
+        main.open_backend("pickle", directory).save_all(medicines)
+        store = main.InventoryStore(main.open_backend("pickle", directory))
+        store.search("")
+
+        old_id = 1e6 * mean_time(lambda: max(store._by_id, default=0) + 1, [()] * ADDS)
+        new_id = 1e6 * mean_time(store.next_id, [()] * ADDS)
+
+        def add(m_id: int) -> None:
+            store.add(main.Medicine(m_id, "Bench Tablet", "Bench", datetime.date(2025, 1, 1),
+                                    datetime.date(2030, 1, 1), 1, 10, 1.0))
+
+        adds = 1e6 * mean_time(lambda: add(store.next_id()), [()] * ADDS)
+
+        picks = [rng.choice(medicines) for _ in range(LOOKUPS)]
+        by_name = 1e6 * mean_time(lambda name: store.search(name)[0], [(med.name,) for med in picks])
+        by_code = 1e6 * mean_time(store.find_barcode, [(med.barcode,) for med in picks])
+        wrong = sum(store.find_barcode(med.barcode).barcode != med.barcode for med in picks)
+        assert not wrong, f"{wrong} barcodes resolved to the wrong product"
+    return size, old_id, new_id, adds, by_name, by_code
+
+
+def main_() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'MEDICINES':>10}{'MAX+1 us':>10}{'COUNTER us':>12}{'ADD us':>9}"
+          f"{'BY NAME us':>12}{'BY BARCODE us':>15}")
+    for size, old_id, new_id, adds, by_name, by_code in map(run, sizes):
+        print(f"{size:>10}{old_id:>10.1f}{new_id:>12.2f}{adds:>9.1f}{by_name:>12.1f}{by_code:>15.2f}")
+
+
+if __name__ == "__main__":
+    main_()
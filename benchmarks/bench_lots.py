@@ -0,0 +1,68 @@
+"""
+Benchmark first-expiry-first-out allocation for a medicine with many lots:
+the per-product heap in LotIndex against sorting the product's lots on
+every sale.
+
+Usage: python benchmarks/bench_lots.py [lots ...]
+"""
+
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import LotIndex  # noqa: E402
+from benchmarks.generators import make_product_lots  # noqa: E402
+
+SALES = 20_000
+
+
+def sorted_allocate(lots, qty: int, today: datetime.date):
+    """Baseline: sort the product's lots by expiry on every sale"""
+    plan = []
+    for lot in sorted(lots, key=lambda lot: (lot.expiry_date, lot.id)):
+        if qty == 0:
+            break
+        if lot.quantity > 0 and lot.expiry_date > today:
+            take = min(qty, lot.quantity)
+            plan.append((lot, take))
+            qty -= take
+    return plan
+
+
+def run_sales(lots, allocate, restock):
+    rng = random.Random(7)
+    start = time.perf_counter()
+    for _ in range(SALES):
+        plan = allocate(rng.randint(1, 10))
+        for lot, take in plan:
+            lot.quantity -= take
+        if rng.random() < 0.05:
+            lot = rng.choice(lots)
+            lot.quantity += 50
+            restock(lot)
+    return time.perf_counter() - start
+
+
+def main_() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500, 2000]
+    today = datetime.date.today()
+    print(f"{SALES} sales of 1-10 units, 5% followed by a restock")
+    print(f"{'LOTS':>8}{'SORT ms':>12}{'HEAP ms':>12}{'SPEEDUP':>10}")
+    for n in sizes:
+        lots = make_product_lots(n)
+        baseline = run_sales(lots, lambda qty: sorted_allocate(lots, qty, today), lambda lot: None)
+
+        lots = make_product_lots(n)
+        by_id = {lot.id: lot for lot in lots}
+        index = LotIndex()
+        index.rebuild(lots)
+        heap = run_sales(lots, lambda qty: index.allocate(1, qty, by_id, today)[0], index.add)
+        print(f"{n:>8}{baseline * 1000:>12.1f}{heap * 1000:>12.1f}{baseline / heap:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
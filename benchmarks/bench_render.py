@@ -0,0 +1,77 @@
+"""
+Benchmark screen rendering: the menu redraw and VIEW ALL MEDICINES as they
+were (a `clear` subprocess, one print() per row of the whole inventory)
+against the ANSI clear, one write per page and lazily sorted pages.
+
+Output goes to a line-buffered /dev/null so, as on a terminal, every line
+printed is its own write; the old clear's subprocess output is discarded.
+
+Usage: python benchmarks/bench_render.py [catalog_size ...]
+"""
+
+import builtins
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import make_inventory  # noqa: E402
+from benchmarks.harness import mean_time  # noqa: E402
+
+REDRAWS = 200
+
+
+def old_show_menu() -> None:
+    """The menu redraw before this change"""
+    os.system("clear >/dev/null 2>&1")
+    for line in main.MENU.split("\n"):
+        print(line)
+
+
+def old_view_all(medicines) -> None:
+    """Every row printed on its own, the whole inventory at once"""
+    print(main.MEDICINE_HEADER)
+    for med in medicines:
+        m_type_name = main.get_medicine_type_name(med.type)
+        print(f"{med.id:<10}{med.name:<20}{med.brand:<15}{main.format_date(med.expiry_date):<15}"
+              f"{med.quantity:<8}{m_type_name:<10}₹{med.price:<9.2f}₹{med.amount:<9.2f}")
+
+
+def new_view(medicines, order: str, pages: int) -> None:
+    """Show the first pages, then stop as the user would with Q"""
+    answers = iter([""] * (pages - 1) + ["q"])
+    builtins.input = lambda prompt="": next(answers)
+    key, descending = main.VIEW_ORDERS[order]
+    main.page_rows(main.MEDICINE_HEADER, main.iter_sorted(medicines, key, descending), main.medicine_row)
+
+
+def main_() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    real_input = builtins.input
+    with open(os.devnull, "w", buffering=1) as sink, contextlib.redirect_stdout(sink):
+        old_menu = mean_time(old_show_menu, [()] * REDRAWS)
+        new_menu = mean_time(main.show_menu, [()] * REDRAWS)
+        rows = []
+        for n in sizes:
+            medicines = make_inventory(n)
+            old = mean_time(old_view_all, [(medicines,)])
+            old_sorted = mean_time(lambda: old_view_all(sorted(medicines, key=main.VIEW_ORDERS["name"][0])), [()])
+            first = mean_time(new_view, [(medicines, "id", 1)])
+            first_sorted = mean_time(new_view, [(medicines, "name", 1)])
+            ten = mean_time(new_view, [(medicines, "name", 10)])
+            rows.append((n, old, old_sorted, first, first_sorted, ten))
+    builtins.input = real_input
+
+    print(f"menu redraw: {old_menu * 1000:.2f} ms with `clear` subprocess and print per line, "
+          f"{new_menu * 1000:.3f} ms with ANSI clear and one write ({old_menu / new_menu:.0f}x)")
+    print(f"{'MEDICINES':>10}{'OLD ALL ms':>12}{'OLD BY NAME':>13}{'PAGE 1 ms':>11}"
+          f"{'PAGE 1 BY NAME':>16}{'10 PAGES BY NAME':>18}")
+    for n, old, old_sorted, first, first_sorted, ten in rows:
+        print(f"{n:>10}{old * 1000:>12.1f}{old_sorted * 1000:>13.1f}{first * 1000:>11.1f}"
+              f"{first_sorted * 1000:>16.1f}{ten * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,62 @@
+"""
+Benchmark the low-stock queue: re-ranking one product after a sale and
+reading the top K most urgent products, against rescanning and sorting every
+product that has a reorder level on each request.
+
+Usage: python benchmarks/bench_reorder.py [catalog_size ...]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ReorderQueue, open_backend  # noqa: E402
+
+UPDATES = 10_000
+TOP_K = 20
+
+
+def main_() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'PRODUCTS':>10}{'BUILD s':>10}{'UPDATE us':>11}{'TOP-20 ms':>11}{'SCAN ms':>10}")
+    for n in sizes:
+        rng = random.Random(42)
+        keys = [(f"medicine {i}", "brand") for i in range(n)]
+        stock = {key: rng.randint(0, 200) for key in keys}
+        velocity = {key: rng.uniform(0, 10) for key in keys}
+
+        with tempfile.TemporaryDirectory() as directory:
+            queue = ReorderQueue(open_backend("pickle", directory))
+            queue.levels = {key: 100 for key in keys}
+
+            start = time.perf_counter()
+            queue.rebuild(stock.get, velocity.get)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(UPDATES):
+                key = rng.choice(keys)
+                stock[key] = max(0, stock[key] - rng.randint(1, 5))
+                queue.update(key, stock[key], velocity[key])
+            update = (time.perf_counter() - start) / UPDATES
+
+            start = time.perf_counter()
+            top = queue.top(TOP_K)
+            top_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            scan = sorted(((ReorderQueue.urgency(stock[key], level, velocity[key]), key)
+                           for key, level in queue.levels.items() if stock[key] < level),
+                          reverse=True)[:TOP_K]
+            scan_time = time.perf_counter() - start
+            assert [key for key, _ in top] == [key for _, key in scan]
+
+        print(f"{n:>10}{build:>10.2f}{update * 1e6:>11.1f}{top_time * 1000:>11.3f}{scan_time * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,44 @@
+"""
+Benchmark medicine-name search: the original linear scan against NameIndex.
+
+Usage: python benchmarks/bench_search.py [sizes...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import NameIndex  # noqa: E402
+from benchmarks.generators import make_named  # noqa: E402
+from benchmarks.harness import best_time  # noqa: E402
+
+
+def scan(records, query):
+    """The lookup every screen used before the index existed"""
+    return [med for med in records if query.upper() in med.name.upper()]
+
+
+def main_() -> None:
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    queries = ["paracetamol", "mycin", "xyzzy", "dolo 650"]
+    print(f"{'RECORDS':>10}{'QUERY':>14}{'MATCHES':>10}{'SCAN ms':>12}{'INDEX ms':>12}{'SPEEDUP':>10}")
+    for n in sizes:
+        records = make_named(n)
+        index = NameIndex()
+        start = time.perf_counter()
+        index.rebuild(records)
+        build = time.perf_counter() - start
+        for query in queries:
+            matches = len(index.search(query))
+            assert matches == len(scan(records, query))
+            t_scan, _ = best_time(scan, records, query)
+            t_index, _ = best_time(index.search, query)
+            print(f"{n:>10}{query:>14}{matches:>10}{t_scan * 1000:>12.2f}"
+                  f"{t_index * 1000:>12.2f}{t_scan / t_index:>9.1f}x")
+        print(f"{n:>10}  index build: {build:.2f}s")
+
+
+if __name__ == "__main__":
+    main_()
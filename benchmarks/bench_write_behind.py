@@ -0,0 +1,80 @@
+"""
+Benchmark a burst of sales saved synchronously against the write-behind
+backend, which accepts each sale in memory and merges the burst into a few
+synced writes. Synchronous saves are timed as they are (left to the OS
+cache) and synced after every sale; write-behind flushing once when the
+burst is over, and after every sale as the menu does before it reports one.
+
+Usage: python benchmarks/bench_write_behind.py [catalog_size] [sales] [backend ...]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import make_inventory  # noqa: E402
+
+
+def burst(store: main.InventoryStore, ids, each: bool) -> float:
+    """Sell one of each ID in turn; the time until all of them are on disk"""
+    start = time.perf_counter()
+    for m_id in ids:
+        try:
+            store.checkout([(m_id, 1)])
+        except main.InventoryError:
+            pass
+        if each:
+            if store.backend.deferred:
+                store.flush()
+            else:
+                store.backend.sync()
+    store.flush()
+    return time.perf_counter() - start
+
+
+def run(name: str, size: int, sales: int) -> None:
+    medicines = make_inventory(size)
+    today = datetime.date.today()
+    stocked = [med.id for med in medicines if med.quantity > 0 and med.expiry_date > today]
+    rng = random.Random(7)
+    ids = [rng.choice(stocked) for _ in range(sales)]
+    results = []
+    for label, write_behind, each in [("sync", False, False),
+                                      ("sync, fsync each", False, True),
+                                      ("write-behind", True, False),
+                                      ("write-behind, flush each", True, True)]:
+        with tempfile.TemporaryDirectory() as directory:
+            main.open_backend(name, directory).save_all(medicines)
+            backend = main.open_backend(name, directory)
+            if write_behind:
+                backend = main.WriteBehindBackend(backend)
+            store = main.InventoryStore(backend)
+            store.search("")
+            elapsed = burst(store, ids, each)
+            backend.close()
+            final = {med.id: med.quantity for med in main.open_backend(name, directory).load()}
+            assert final == {med.id: med.quantity for med in store}, f"{label}: disk differs from memory"
+            results.append((label, elapsed))
+
+    base = results[0][1]
+    for label, elapsed in results:
+        print(f"{name:<8}{label:<27}{elapsed * 1000:>10.1f} ms{sales / elapsed:>12,.0f} sales/s"
+              f"{base / elapsed:>8.1f}x")
+
+
+def main_() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    sales = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    print(f"{size} medicines, a burst of {sales} single-item sales, timed until all are on disk")
+    for name in sys.argv[3:] or ["pickle", "sqlite", "mmap"]:
+        run(name, size, sales)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,107 @@
+"""
+Check that the record file backend applies a multi-record save completely or
+not at all. First the write-ahead log of a three-line sale is cut at every
+byte and, separately, left complete with only some of its slots written;
+each time the next load must show either none or all of the sale. Then a
+process selling three-line carts is killed with SIGKILL again and again,
+and the three lots of every cart must always hold the same stock.
+
+Usage: python benchmarks/crash_mmap_wal.py [kills]
+"""
+
+import datetime
+import os
+import pickle
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+
+GROUPS = 10
+START_QUANTITY = 1_000_000
+
+CHILD = """
+import random, sys
+sys.path.insert(0, {root!r})
+import main
+store = main.InventoryStore(main.open_backend("mmap", {directory!r}))
+rng = random.Random({seed})
+while True:
+    group = rng.randrange({groups})
+    store.checkout([(group * 3 + line + 1, 1) for line in range(3)])
+"""
+
+
+def stock(count: int):
+    """Three lots (distinct products) per group, all starting with the same stock"""
+    return [main.Medicine(m_id, f"Medicine {m_id}", "Brand", datetime.date(2024, 1, 1),
+                          datetime.date(2030, 1, 1), 1, START_QUANTITY, 1.0)
+            for m_id in range(1, count + 1)]
+
+
+def quantities(directory: str):
+    return [med.quantity for med in sorted(main.open_backend("mmap", directory).load(), key=lambda m: m.id)]
+
+
+def torn_logs() -> int:
+    """Cut a sale's log at every byte, and crash between its slot writes; returns cases checked"""
+    sold = [main.Medicine(med.id, med.name, med.brand, med.manufacturing_date, med.expiry_date,
+                          med.type, med.quantity - 10, med.price) for med in stock(3)]
+    log = pickle.dumps(("batch", [("put", med.to_record()) for med in sold]))
+    before, after = [START_QUANTITY] * 3, [START_QUANTITY - 10] * 3
+    cases = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for cut in range(len(log) + 1):
+            main.open_backend("mmap", directory).save_all(stock(3))
+            with open(os.path.join(directory, f"{main.RECORD_FILE}.wal"), "wb") as f:
+                f.write(log[:cut])
+            found = quantities(directory)
+            expected = after if cut == len(log) else before
+            assert found == expected, f"log cut at byte {cut}/{len(log)}: stock {found}"
+            cases += 1
+        for written in range(3):
+            # The log is complete and only the first slots were written before the crash
+            backend = main.open_backend("mmap", directory)
+            backend.save_all(stock(3))
+            backend._apply([("put", med) for med in sold[:written]])
+            with open(os.path.join(directory, f"{main.RECORD_FILE}.wal"), "wb") as f:
+                f.write(log)
+            found = quantities(directory)
+            assert found == after, f"crash after {written} of 3 slots: stock {found}"
+            cases += 1
+    return cases
+
+
+def kills(count: int, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        main.open_backend("mmap", directory).save_all(stock(GROUPS * 3))
+        for kill in range(count):
+            code = CHILD.format(root=ROOT, directory=directory, seed=seed * 1000 + kill, groups=GROUPS)
+            child = subprocess.Popen([sys.executable, "-c", code])
+            time.sleep(rng.uniform(0.2, 0.6))
+            child.send_signal(signal.SIGKILL)
+            child.wait()
+            found = quantities(directory)
+            for group in range(GROUPS):
+                cart = found[group * 3:group * 3 + 3]
+                assert len(set(cart)) == 1, f"kill {kill + 1}: cart lots {cart} sold unevenly"
+        carts = sum(START_QUANTITY - quantity for quantity in found) // 3
+        print(f"mmap     {count} kills: {carts} three-line carts on disk, every one whole -> OK")
+
+
+def main_() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"mmap     {torn_logs()} torn or half-applied logs: each sale all or nothing -> OK")
+    kills(count)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,101 @@
+"""
+Kill a process selling through the write-behind backend with SIGKILL, again
+and again, and check what survives on disk each time: the files must load,
+every sale the process saw acknowledged by flush() must be on disk, and the
+stock must be exactly what the sales ledger accounts for.
+
+The child compacts its journal often, so kills also land mid-compaction.
+
+Usage: python benchmarks/crash_write_behind.py [kills] [backend ...]
+"""
+
+import datetime
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+
+CATALOG = 50
+START_QUANTITY = 1_000_000
+
+CHILD = """
+import random, sys
+sys.path.insert(0, {root!r})
+import main
+main.JOURNAL_COMPACT_BYTES = 4096
+backend = main.WriteBehindBackend(main.open_backend({backend!r}, {directory!r}))
+store = main.InventoryStore(backend)
+rng = random.Random({seed})
+sold = 0
+while True:
+    for _ in range(rng.randint(1, 20)):
+        qty = rng.randint(1, 3)
+        store.checkout([(rng.randint(1, {catalog}), qty)])
+        sold += qty
+    if store.flush():
+        print(sold, flush=True)
+"""
+
+
+def check(name: str, directory: str, acked: int) -> str:
+    """What is wrong with the files left behind, or an empty string"""
+    try:
+        backend = main.open_backend(name, directory)
+        stock = sum(med.quantity for med in backend.load())
+        ledger = sum(frame[2] for _, _, frame in backend.iter_transactions(main.SALES_FILE))
+    except Exception as e:  # noqa: BLE001 - any failure to load is the finding
+        return f"files do not load: {e!r}"
+    initial = CATALOG * START_QUANTITY
+    if ledger < acked:
+        return f"acknowledged sales lost: {ledger} in the ledger < {acked} acknowledged"
+    if stock != initial - ledger:
+        return f"stock {stock} does not match the ledger ({initial} - {ledger})"
+    return ""
+
+
+def run(name: str, kills: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        main.open_backend(name, directory).save_all(
+            [main.Medicine(m_id, f"Medicine {m_id}", "Brand", datetime.date(2024, 1, 1),
+                           datetime.date(2030, 1, 1), 1, START_QUANTITY, 1.0)
+             for m_id in range(1, CATALOG + 1)])
+        acked_total = 0
+        for kill in range(kills):
+            code = CHILD.format(root=ROOT, backend=name, directory=directory,
+                                seed=seed * 1000 + kill, catalog=CATALOG)
+            child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+            time.sleep(rng.uniform(0.2, 0.6))
+            child.send_signal(signal.SIGKILL)
+            out, _ = child.communicate()
+            lines = out.split()
+            acked_total += int(lines[-1]) if lines else 0
+            problem = check(name, directory, acked_total)
+            if problem:
+                print(f"{name:<8} kill {kill + 1}: {problem}")
+                return False
+        backend = main.open_backend(name, directory)
+        stock = sum(med.quantity for med in backend.load())
+        ledger = sum(frame[2] for _, _, frame in backend.iter_transactions(main.SALES_FILE))
+        print(f"{name:<8} {kills} kills: {acked_total} units acknowledged, "
+              f"{CATALOG * START_QUANTITY - stock} on disk, {ledger} in the ledger -> OK")
+        return True
+
+
+def main_() -> None:
+    kills = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    backends = sys.argv[2:] or ["pickle", "sqlite", "mmap"]
+    if not all([run(name, kills, seed) for seed, name in enumerate(backends)]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,207 @@
+"""
+Seeded generators for realistic synthetic inventories and ledgers.
+
+A few generics and manufacturers account for most of the stock (Zipf-like
+weights), every product is restocked in several lots, and expiry dates are
+spread from already expired to three years out, so searches, expiry windows
+and first-expiry-first-out sales see the same shapes as a real counter.
+
+The rest build the fixed shapes single benchmarks need: nearly all distinct
+names for search, an exact number of lots expiring this month, lots deep
+enough in stock that sales never run out, and many lots of one product.
+"""
+
+import datetime
+import math
+import random
+from itertools import accumulate, islice
+from typing import Any, Iterator, List, Optional, Tuple
+
+from main import Medicine, MedicineType, StorageBackend, ledger_frame
+
+# (generic name, base price per unit, usual strengths)
+GENERICS = [
+    ("Paracetamol", 0.8, ["500mg", "650mg", "125mg/5ml"]),
+    ("Ibuprofen", 1.2, ["200mg", "400mg", "100mg/5ml"]),
+    ("Amoxicillin", 3.5, ["250mg", "500mg", "125mg/5ml"]),
+    ("Azithromycin", 9.0, ["250mg", "500mg", "200mg/5ml"]),
+    ("Cetirizine", 1.5, ["10mg", "5mg/5ml"]),
+    ("Metformin", 1.1, ["500mg", "850mg", "1000mg"]),
+    ("Amlodipine", 2.0, ["2.5mg", "5mg", "10mg"]),
+    ("Atorvastatin", 4.5, ["10mg", "20mg", "40mg"]),
+    ("Omeprazole", 2.8, ["20mg", "40mg"]),
+    ("Pantoprazole", 3.0, ["20mg", "40mg"]),
+    ("Losartan", 3.2, ["25mg", "50mg"]),
+    ("Levofloxacin", 6.5, ["250mg", "500mg", "750mg"]),
+    ("Ciprofloxacin", 4.0, ["250mg", "500mg"]),
+    ("Montelukast", 7.5, ["4mg", "5mg", "10mg"]),
+    ("Diclofenac", 1.4, ["50mg", "75mg", "100mg"]),
+    ("Ranitidine", 1.0, ["150mg", "300mg"]),
+    ("Salbutamol", 2.2, ["2mg", "4mg", "2mg/5ml"]),
+    ("Levocetirizine", 2.4, ["5mg", "2.5mg/5ml"]),
+    ("Domperidone", 1.8, ["10mg", "1mg/ml"]),
+    ("Ondansetron", 4.2, ["4mg", "8mg", "2mg/5ml"]),
+    ("Glimepiride", 3.6, ["1mg", "2mg", "4mg"]),
+    ("Telmisartan", 5.1, ["20mg", "40mg", "80mg"]),
+    ("Rosuvastatin", 8.0, ["5mg", "10mg", "20mg"]),
+    ("Clopidogrel", 6.0, ["75mg"]),
+    ("Metronidazole", 1.3, ["200mg", "400mg", "200mg/5ml"]),
+    ("Fluconazole", 5.5, ["50mg", "150mg"]),
+    ("Doxycycline", 3.9, ["100mg"]),
+    ("Prednisolone", 2.6, ["5mg", "10mg", "15mg/5ml"]),
+    ("Vitamin D3", 1.9, ["1000IU", "60000IU"]),
+    ("Folic Acid", 0.5, ["5mg"]),
+    ("Ferrous Sulfate", 0.7, ["200mg", "125mg/5ml"]),
+    ("Calcium Carbonate", 1.0, ["500mg", "1250mg"]),
+    ("Dextromethorphan", 2.1, ["10mg/5ml", "15mg/5ml"]),
+    ("Loratadine", 2.3, ["10mg", "5mg/5ml"]),
+    ("Aceclofenac", 2.7, ["100mg", "200mg"]),
+    ("Esomeprazole", 4.8, ["20mg", "40mg"]),
+    ("Sertraline", 6.8, ["50mg", "100mg"]),
+    ("Escitalopram", 6.2, ["5mg", "10mg", "20mg"]),
+    ("Gabapentin", 7.0, ["100mg", "300mg"]),
+    ("Tramadol", 5.0, ["50mg", "100mg"]),
+]
+
+BRANDS = ["Sun Pharma", "Cipla", "Lupin", "Dr Reddy's", "Mankind", "Alkem",
+          "Torrent", "Zydus", "Glenmark", "Micro Labs", "Intas", "Abbott",
+          "GSK", "Pfizer", "Sanofi", "Novartis", "Macleods", "Ipca",
+          "Ajanta", "Wockhardt", "Emcure", "Biocon", "Aristo", "FDC",
+          "Unichem"]
+
+RETURN_REASONS = ["expired", "damaged", "recalled", "customer return"]
+
+# Fragments made-up names are joined from, so almost every lot's name differs
+NAME_STEMS = ["para", "ceta", "mol", "amoxi", "cillin", "ibu", "pro", "fen", "azi",
+              "thro", "mycin", "metfor", "min", "cetri", "zine", "dolo", "pan", "tol",
+              "losar", "tan", "ator", "vasta", "tin", "omep", "razole", "levo", "flox"]
+NAME_STRENGTHS = ["", " 100", " 250", " 500", " 650", " 5mg", " 10mg", " syrup"]
+
+
+def zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    """Cumulative Zipf weights for n ranked choices"""
+    return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def make_products(rng: random.Random, count: int) -> List[Tuple[str, str, int, float]]:
+    """(name, brand, type, unit price) for up to count distinct products, popular ones first"""
+    generic_weights = [1 / rank ** 1.1 for rank in range(1, len(GENERICS) + 1)]
+    brand_weights = [1 / rank ** 1.1 for rank in range(1, len(BRANDS) + 1)]
+    combos = [(generic_weight * brand_weight, generic, base, strength, brand)
+              for generic_weight, (generic, base, strengths) in zip(generic_weights, GENERICS)
+              for strength in strengths
+              for brand_weight, brand in zip(brand_weights, BRANDS)]
+    # Weighted sampling without replacement: the largest u ** (1 / weight) wins,
+    # compared as log(u) / weight so tiny weights do not underflow
+    picked = sorted(combos, key=lambda combo: math.log(1 - rng.random()) / combo[0],
+                    reverse=True)[:count]
+    picked.sort(key=lambda combo: combo[0], reverse=True)
+    products = []
+    for _, generic, base, strength, brand in picked:
+        syrup = "/" in strength
+        m_type = MedicineType.SYRUP.value if syrup else MedicineType.TABLET.value
+        price = round(base * rng.uniform(0.7, 1.6) * (25 if syrup else 1), 2)
+        products.append((f"{generic} {strength}", brand, m_type, price))
+    return products
+
+
+def make_inventory(n: int, seed: int = 42,
+                   today: Optional[datetime.date] = None) -> List[Medicine]:
+    """n lots with IDs 1..n spread over realistic products and expiry dates"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    # Roughly eight lots per product on average, popular products more
+    products = make_products(rng, max(1, n // 8))
+    product_weights = zipf_weights(len(products), 0.8)
+    medicines = []
+    for m_id in range(1, n + 1):
+        name, brand, m_type, price = rng.choices(products, cum_weights=product_weights)[0]
+        # Shelf lives of one to three years; about 3% of lots already expired
+        # and a few percent expiring within the month
+        shelf_life = rng.randint(365, 3 * 365)
+        man_date = today - datetime.timedelta(days=rng.randint(0, shelf_life + 30))
+        exp_date = man_date + datetime.timedelta(days=shelf_life)
+        quantity = int(rng.lognormvariate(3.5, 1.0))
+        medicines.append(Medicine(m_id, name, brand, man_date, exp_date, m_type, quantity, price))
+    return medicines
+
+
+def make_named(n: int, seed: int = 42) -> List[Medicine]:
+    """n lots with made-up, nearly all distinct names and otherwise identical"""
+    rng = random.Random(seed)
+    medicines = []
+    for m_id in range(1, n + 1):
+        name = "".join(rng.choice(NAME_STEMS) for _ in range(rng.randint(2, 4)))
+        name = name.capitalize() + rng.choice(NAME_STRENGTHS)
+        medicines.append(Medicine(m_id, name, "Brand", datetime.date(2024, 1, 1),
+                                  datetime.date(2030, 1, 1), 1, 10, 5.0))
+    return medicines
+
+
+def make_expiring(n: int, expiring: int, seed: int = 42,
+                  today: Optional[datetime.date] = None) -> List[Medicine]:
+    """n lots in random order, exactly expiring of them due within 30 days and the rest up to five years out"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    medicines = []
+    for m_id in range(1, n + 1):
+        days = rng.randint(-10, 30) if m_id <= expiring else rng.randint(31, 5 * 365)
+        medicines.append(Medicine(m_id, f"Medicine {m_id}", "Brand", datetime.date(2024, 1, 1),
+                                  today + datetime.timedelta(days=days), 1, 10, 5.0))
+    rng.shuffle(medicines)
+    return medicines
+
+
+def make_stock(n: int, quantity: int, seed: int = 42,
+               today: Optional[datetime.date] = None) -> List[Medicine]:
+    """n unexpired lots named "Medicine <id>", each holding quantity units so sales never run out"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    return [Medicine(m_id, f"Medicine {m_id}", f"Brand {m_id % 300}", datetime.date(2024, 1, 1),
+                     today + datetime.timedelta(days=rng.randint(1, 3 * 365)),
+                     rng.randint(0, 1), quantity, round(rng.uniform(5, 500), 2))
+            for m_id in range(1, n + 1)]
+
+
+def make_product_lots(n: int, seed: int = 42,
+                      today: Optional[datetime.date] = None) -> List[Medicine]:
+    """One product restocked n times, each lot with its own expiry"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    return [Medicine(lot_id, "Dolo 650", "Micro Labs", datetime.date(2024, 1, 1),
+                     today + datetime.timedelta(days=rng.randint(1, 3 * 365)),
+                     1, rng.randint(1, 60), 2.0)
+            for lot_id in range(1, n + 1)]
+
+
+def iter_ledger_frames(medicines: List[Medicine], count: int, seed: int = 42,
+                       days: int = 365, returns: bool = False,
+                       today: Optional[datetime.date] = None) -> Iterator[List[Any]]:
+    """count sales (or returns) frames over the last days, in date order as ledgers are written"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    weights = zipf_weights(len(medicines), 0.9)
+    per_day, extra = divmod(count, days)
+    for day in range(days):
+        date = today - datetime.timedelta(days=days - 1 - day)
+        for _ in range(per_day + (1 if day < extra else 0)):
+            med = rng.choices(medicines, cum_weights=weights)[0]
+            qty = 1 + int(rng.expovariate(0.4))
+            if returns:
+                yield ledger_frame(date, med.name, qty, round(qty * med.price, 2),
+                                   rng.choice(RETURN_REASONS), med.id)
+            else:
+                yield ledger_frame(date, med.name, qty, round(qty * med.price, 2), lot=med.id)
+
+
+def write_ledger(backend: StorageBackend, ledger: str, frames: Iterator[List[Any]],
+                 batch: int = 10_000) -> int:
+    """Append generated frames to a backend's ledger and index them; returns the count"""
+    written = 0
+    while True:
+        chunk = list(islice(frames, batch))
+        if not chunk:
+            return written
+        _, spans = backend.write_transactions(ledger, chunk)
+        backend.index_transactions(ledger, chunk, spans)
+        written += len(chunk)
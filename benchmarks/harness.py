@@ -0,0 +1,109 @@
+"""
+Timing, memory and baseline-comparison helpers for the benchmark suite.
+
+Each case is a list of calls timed one by one, so a result carries ops/sec
+and latency percentiles; one extra call runs under tracemalloc for the peak
+memory, kept out of the timings because tracing slows everything down.
+"""
+
+import json
+import os
+import platform
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(fn: Callable[..., Any], calls: Iterable[Tuple[Any, ...]],
+            trace_memory: bool = True) -> Dict[str, float]:
+    """Time fn(*args) for every args in calls; report rate, latencies in ms and peak KiB
+
+    calls may be a generator, so large inputs need not exist all at once. The
+    memory pass repeats the first call, so leave it off for appends whose
+    order matters."""
+    latencies = []
+    first = None
+    clock = time.perf_counter
+    for args in calls:
+        if first is None:
+            first = args
+        start = clock()
+        fn(*args)
+        latencies.append(clock() - start)
+    latencies.sort()
+    total = sum(latencies)
+
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fn(*first)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {"calls": len(latencies),
+            "ops_per_sec": len(latencies) / total if total else float("inf"),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "peak_kib": peak / 1024}
+
+
+def best_time(fn: Callable[..., Any], *args: Any, repeat: int = 5,
+              **kwargs: Any) -> Tuple[float, Any]:
+    """Fastest of repeat runs of fn(*args, **kwargs) in seconds, with the last result"""
+    best = float("inf")
+    result = None
+    clock = time.perf_counter
+    for _ in range(repeat):
+        start = clock()
+        result = fn(*args, **kwargs)
+        best = min(best, clock() - start)
+    return best, result
+
+
+def mean_time(fn: Callable[..., Any], calls: Iterable[Tuple[Any, ...]]) -> float:
+    """Average seconds per call of fn(*args) over calls, without the memory pass"""
+    return 1 / measure(fn, calls, trace_memory=False)["ops_per_sec"]
+
+
+def environment() -> Dict[str, str]:
+    """Where a run happened, stored with baselines so odd comparisons are explainable"""
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "system": platform.system(), "cpus": str(os.cpu_count())}
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    """Read a stored baseline, or an empty one if there is none yet"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, settings: Dict[str, Any], results: Dict[str, Dict[str, float]]) -> None:
+    """Store a run as the baseline later runs are compared against"""
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "settings": settings, "results": results},
+                  f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(result: Dict[str, float], base: Dict[str, float], tolerance: float) -> List[str]:
+    """Regressions of one case against its baseline: slower rate or p99, or more memory"""
+    problems = []
+    if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+        problems.append(f"ops/sec {result['ops_per_sec']:,.0f} < {base['ops_per_sec']:,.0f}")
+    # Tails are noisier than rates, and with few calls p99 is just the slowest one
+    if result["calls"] >= 100 and result["p99_ms"] > base["p99_ms"] * (1 + 2 * tolerance):
+        problems.append(f"p99 {result['p99_ms']:.3f}ms > {base['p99_ms']:.3f}ms")
+    if base["peak_kib"] and result["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+        problems.append(f"peak {result['peak_kib']:,.0f}KiB > {base['peak_kib']:,.0f}KiB")
+    return problems
@@ -0,0 +1,117 @@
+"""
+Load-test the JSON API server: start `main.py --serve` on a synthetic catalog
+in a temporary directory, drive it with concurrent keep-alive clients sending
+a mix of searches, lookups, expiry queries and sales, and report requests/sec
+and latency percentiles.
+
+Usage: python benchmarks/load_api.py [clients] [requests_per_client] [catalog_size] [backend]
+                                     [server flags, e.g. --write-behind]
+"""
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import open_backend  # noqa: E402
+from benchmarks.generators import make_stock  # noqa: E402
+from benchmarks.harness import percentile  # noqa: E402
+
+PORT = 8765
+
+
+def next_request(rng: random.Random, catalog: int):
+    """Pick a request: mostly reads, a fifth of them sales"""
+    m_id = rng.randint(1, catalog)
+    roll = rng.random()
+    if roll < 0.35:
+        return "GET", f"/search?q=medicine+{m_id}&limit=5", None
+    if roll < 0.65:
+        return "GET", f"/medicines/{m_id}", None
+    if roll < 0.8:
+        return "GET", f"/expiry?within={rng.choice([7, 30, 90])}", None
+    return "POST", "/sell", {"id": m_id, "quantity": 1}
+
+
+async def client(seed: int, requests: int, catalog: int, latencies, statuses) -> None:
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    for _ in range(requests):
+        method, target, payload = next_request(rng, catalog)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        start = time.perf_counter()
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+
+
+async def wait_for_server(timeout: float = 10.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def drive(clients: int, requests: int, catalog: int):
+    await wait_for_server()
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed, requests, catalog, latencies, statuses)
+                           for seed in range(clients)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def main_() -> None:
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    catalog = int(sys.argv[3]) if len(sys.argv) > 3 else 10_000
+    backend = sys.argv[4] if len(sys.argv) > 4 else "pickle"
+    flags = sys.argv[5:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        open_backend(backend, directory).save_all(make_stock(catalog, 1_000_000))
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), "--backend", backend,
+                                   "--serve", f"127.0.0.1:{PORT}", *flags],
+                                  cwd=directory, stdout=subprocess.DEVNULL)
+        try:
+            elapsed, latencies, statuses = asyncio.run(drive(clients, requests, catalog))
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = len(latencies)
+    latencies.sort()
+    print(f"backend: {' '.join([backend, *flags])}, catalog: {catalog} medicines, {clients} clients x {requests} requests")
+    print(f"statuses: {dict(sorted(statuses.items()))}")
+    print(f"throughput: {total / elapsed:,.0f} req/s")
+    print(f"latency ms: p50 {percentile(latencies, 0.5) * 1000:.2f}  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}  max {latencies[-1] * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,103 @@
+"""
+Check that instrumentation costs nothing while it is off: no instrumented
+function may be wrapped before METRICS.enable() or after METRICS.disable(),
+and nothing may be recorded. Then time the same workload (sales, searches,
+expiry windows, date parsing, reloads) with metrics off, on, and off again
+to show what turning them on costs.
+
+Usage: python benchmarks/metrics_overhead.py [catalog_size] [operations]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import make_inventory  # noqa: E402
+
+
+def instrumented_functions():
+    """The objects currently bound under every instrumented name"""
+    found = {}
+    for name in main.INSTRUMENTED:
+        owner_name, _, attr = name.rpartition(".")
+        owner = getattr(main, owner_name) if owner_name else main
+        found[name] = vars(owner)[attr]
+    return found
+
+
+def workload(store: main.InventoryStore, operations: int, seed: int) -> float:
+    rng = random.Random(seed)
+    stocked = [med.id for med in store if med.quantity > 0 and not main.medicine_expired(med.expiry_date)]
+    names = [med.name for med in store]
+    start = time.perf_counter()
+    for _ in range(operations):
+        roll = rng.random()
+        if roll < 0.4:
+            try:
+                store.checkout([(rng.choice(stocked), 1)])
+            except main.InventoryError:
+                pass
+        elif roll < 0.7:
+            store.search(rng.choice(names).split()[0])
+        elif roll < 0.9:
+            store.expiring_by(main.expiry_window(rng.choice(["7", "30", "90"])))
+        else:
+            main.parse_date(f"2025, {rng.randint(1, 12):02d}, {rng.randint(1, 28):02d}")
+            store.refresh()
+    return time.perf_counter() - start
+
+
+def best_of(store: main.InventoryStore, operations: int, runs: int = 3) -> float:
+    return min(workload(store, operations, seed) for seed in range(runs))
+
+
+def main_() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    plain = instrumented_functions()
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        main.open_backend("pickle", directory).save_all(make_inventory(size))
+        store = main.InventoryStore(main.open_backend("pickle", directory))
+        store.search("")
+
+        off = best_of(store, operations)
+        if main.METRICS.stats:
+            failures.append("metrics recorded while disabled")
+
+        main.METRICS.enable()
+        if any(fn is plain[name] for name, fn in instrumented_functions().items()):
+            failures.append("enable() left some functions unwrapped")
+        on = best_of(store, operations)
+        calls = sum(count for (metric, _), (count, _, _) in main.METRICS.stats.items()
+                    if metric == "operation_seconds")
+        main.METRICS.disable()
+
+        if instrumented_functions() != plain:
+            failures.append("disable() left wrappers behind")
+        main.METRICS.stats.clear()
+        off_again = best_of(store, operations)
+        if main.METRICS.stats:
+            failures.append("metrics recorded after disable()")
+
+    per_op = (on - off) / operations
+    print(f"{size} medicines, {operations} operations, best of 3 runs")
+    print(f"metrics off:       {off * 1000:9.1f} ms")
+    print(f"metrics on:        {on * 1000:9.1f} ms  ({on / off - 1:+.1%}, {per_op * 1e6:+.1f} us/op, "
+          f"{calls // 3} timed calls per run)")
+    print(f"metrics off again: {off_again * 1000:9.1f} ms  ({off_again / off - 1:+.1%})")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: nothing is wrapped or recorded while metrics are off")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,93 @@
+"""
+Run several worker processes selling, returning and restocking against the
+same data directory at once, then check that no update was lost: the final
+stock must equal the starting stock minus everything the ledgers recorded,
+plus the restocks the workers report.
+
+Usage: python benchmarks/stress_concurrency.py [workers] [operations] [backend]
+"""
+
+import datetime
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (RETURNS_FILE, SALES_FILE, InventoryError,  # noqa: E402
+                  InventoryStore, Medicine, open_backend)
+
+CATALOG = 20
+START_QUANTITY = 500
+
+
+def worker(backend_name: str, directory: str, seed: int, operations: int, results) -> None:
+    """Sell, return and restock random medicines; report what was restocked"""
+    rng = random.Random(seed)
+    store = InventoryStore(open_backend(backend_name, directory))
+    restocked = refused = 0
+    for _ in range(operations):
+        m_id = rng.randint(1, CATALOG)
+        action = rng.random()
+        try:
+            if action < 0.7:
+                store.checkout([(m_id, rng.randint(1, 5))])
+            elif action < 0.8:
+                store.checkout([(m_id, rng.randint(1, 3)), (rng.randint(1, CATALOG), 1)])
+            elif action < 0.9:
+                store.return_stock(m_id, 1, "damage")
+            else:
+                qty = rng.randint(1, 10)
+                store.adjust_stock(m_id, qty)
+                restocked += qty
+        except InventoryError:
+            refused += 1
+    results.put((restocked, refused))
+
+
+def run(backend_name: str, workers: int, operations: int) -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        backend = open_backend(backend_name, directory)
+        backend.save_all([Medicine(m_id, f"Medicine {m_id}", "Brand", datetime.date(2024, 1, 1),
+                                   datetime.date(2030, 1, 1), 1, START_QUANTITY, 10.0)
+                          for m_id in range(1, CATALOG + 1)])
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker,
+                                             args=(backend_name, directory, seed, operations, results))
+                     for seed in range(workers)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        restocked = sum(report[0] for report in reports)
+        refused = sum(report[1] for report in reports)
+        backend = open_backend(backend_name, directory)
+        final = sum(med.quantity for med in backend.load())
+        sold = sum(frame[2] for _, _, frame in backend.iter_transactions(SALES_FILE))
+        returned = sum(frame[2] for _, _, frame in backend.iter_transactions(RETURNS_FILE))
+        expected = CATALOG * START_QUANTITY - sold - returned + restocked
+
+        ok = final == expected and min(med.quantity for med in backend.load()) >= 0
+        print(f"{backend_name:<8} {workers} workers x {operations} ops in {elapsed:.2f}s "
+              f"({refused} refused): stock {final}, expected {expected} -> {'OK' if ok else 'LOST UPDATES'}")
+        return ok
+
+
+def main_() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    backends = sys.argv[3:] or ["pickle", "sqlite", "mmap"]
+    if not all([run(name, workers, operations) for name in backends]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
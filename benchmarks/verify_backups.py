@@ -0,0 +1,177 @@
+"""
+Check incremental backups against the data they were taken from. For each
+backend: snapshot a seeded inventory with its ledgers and reorder levels,
+change it (sales, returns, new, updated and deleted lots), snapshot again,
+keep changing it, then restore each snapshot in turn (and into an empty
+directory) and compare everything with what was there when it was taken,
+including the ledgers' date and per-medicine queries. A snapshot built from
+only the lots changed since the last one must hold the same chunks as one
+built from everything, and a snapshot of an unchanged directory must write
+nothing. A damaged chunk must stop a restore before anything changes.
+
+Then time a snapshot after a handful of sales against the first, full one
+as the inventory grows: the later snapshot should write about the same
+small amount whatever the size.
+
+Usage: python benchmarks/verify_backups.py [catalog_size ...]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from benchmarks.generators import iter_ledger_frames, make_inventory, write_ledger  # noqa: E402
+
+LEDGERS = (main.SALES_FILE, main.RETURNS_FILE)
+
+
+def state(backend: main.StorageBackend):
+    """Everything a snapshot covers, in comparable form"""
+    try:
+        with open(backend.path(main.REORDER_FILE), "rb") as f:
+            reorder = f.read()
+    except FileNotFoundError:
+        reorder = None
+    frames = {ledger: [frame for _, _, frame in backend.iter_transactions(ledger)] for ledger in LEDGERS}
+    return sorted(med.to_record() for med in backend.load()), frames, reorder
+
+
+def full_inventory(backend: main.StorageBackend):
+    """The inventory chunk digests a snapshot reading every lot would list"""
+    ranges = {}
+    for med in backend.load():
+        ranges.setdefault(med.id // main.BACKUP_CHUNK_IDS, []).append(med.to_record())
+    return [main.backup_digest(main.backup_bytes(sorted(records))) for _, records in sorted(ranges.items())]
+
+
+def check(label: str, backend: main.StorageBackend, expected, next_id: int) -> None:
+    records, frames, reorder = state(backend)
+    assert records == expected[0], f"{label}: inventory differs"
+    assert frames == expected[1], f"{label}: ledgers differ"
+    assert reorder == expected[2], f"{label}: reorder levels differ"
+    assert backend.next_id() >= next_id, f"{label}: ID counter went back"
+    for ledger in LEDGERS:
+        # The ledgers' indexes must agree with what was restored
+        everything = list(backend.transactions_between(ledger, datetime.date.min, datetime.date.max))
+        assert everything == expected[1][ledger], f"{label}: {ledger} date query differs"
+        if expected[1][ledger]:
+            name = expected[1][ledger][-1][1]
+            wanted = [frame for frame in expected[1][ledger] if frame[1].lower() == name.lower()]
+            assert list(backend.transactions_for_medicine(ledger, name)) == wanted, \
+                f"{label}: {ledger} medicine query differs"
+    store = main.InventoryStore(backend)
+    rebuilt = main.SalesAggregates.rebuild(backend)
+    assert store.aggregates.totals() == rebuilt.totals(), f"{label}: sales summary not recounted"
+
+
+def change(store: main.InventoryStore, rng: random.Random, sales: int) -> None:
+    """Sell, return, add, update and delete a little"""
+    today = datetime.date.today()
+    stocked = [med.id for med in store if med.quantity > 0 and med.expiry_date > today]
+    for _ in range(sales):
+        try:
+            store.checkout([(rng.choice(stocked), 1)])
+        except main.InventoryError:
+            pass
+    store.return_stock(stocked[0], 1, "damaged")
+    for _ in range(3):
+        store.add(main.Medicine(store.next_id(), "Backup Tablet", "Bench", today,
+                                today + datetime.timedelta(days=400), 1, 10, 2.5))
+    med = store.get(stocked[-1])
+    store.update(main.Medicine(med.id, med.name, med.brand, med.manufacturing_date,
+                               med.expiry_date, med.type, med.quantity + 5, med.price))
+    store.delete(stocked[1])
+    store.set_reorder_level(stocked[2], rng.randint(10, 100))
+
+
+def verify(name: str) -> None:
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as elsewhere:
+        backend = main.open_backend(name, directory)
+        medicines = make_inventory(5000)
+        backend.save_all(medicines)
+        write_ledger(backend, main.SALES_FILE, iter_ledger_frames(medicines, 25_000))
+        write_ledger(backend, main.RETURNS_FILE, iter_ledger_frames(medicines, 500, returns=True))
+        store = main.InventoryStore(backend)
+        store.set_reorder_level(medicines[0].id, 50)
+        backups = main.BackupRepository(backend.path(main.BACKUP_DIR))
+
+        first = backups.snapshot(backend)
+        first_state, first_id = state(backend), backend.next_id()
+        change(store, rng, 40)
+        second = backups.snapshot(backend)
+        second_state, second_id = state(backend), backend.next_id()
+        assert second["inventory"] == full_inventory(backend), "incremental snapshot differs from a full one"
+        again = backups.snapshot(backend)
+        assert again["inventory"] == second["inventory"], "unchanged snapshot differs"
+        assert again["chunks_written"] == 0, "unchanged snapshot wrote chunks"
+        assert again["next_id"] == second["next_id"] and again["medicines"] == second["medicines"]
+        change(store, rng, 40)
+        store.aggregates.save()
+
+        backups.restore(backend, first["id"])
+        check("restore first", backend, first_state, first_id)
+        backups.restore(backend, second["id"])
+        check("restore second", backend, second_state, second_id)
+
+        fresh = main.open_backend(name, elsewhere)
+        backups.restore(fresh, "latest")
+        check("restore into an empty directory", fresh, second_state, second_id)
+
+        # A damaged chunk is found before anything is changed
+        damaged = backups._chunk_path(first["inventory"][0])
+        with open(damaged, "r+b") as f:
+            f.write(b"\0\0\0\0")
+        try:
+            backups.restore(backend, first["id"])
+            raise AssertionError("restore from a damaged chunk went ahead")
+        except main.InventoryError:
+            pass
+        check("after refusing a damaged snapshot", backend, second_state, second_id)
+
+        print(f"{name:<8} first snapshot {first['chunks_written']} chunks "
+              f"({first['bytes_written'] / 1024:.0f} KB), second {second['chunks_written']} chunks "
+              f"({second['bytes_written'] / 1024:.1f} KB); restores match -> OK")
+
+
+def scaling(sizes) -> None:
+    print(f"\n{'MEDICINES':>10}{'SALES':>10}{'FULL ms':>10}{'FULL KB':>10}"
+          f"{'NEXT ms':>10}{'NEXT KB':>10}{'RESTORE ms':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            backend = main.open_backend("pickle", directory)
+            medicines = make_inventory(size)
+            backend.save_all(medicines)
+            write_ledger(backend, main.SALES_FILE, iter_ledger_frames(medicines, size * 5))
+            backups = main.BackupRepository(backend.path(main.BACKUP_DIR))
+            start = time.perf_counter()
+            full = backups.snapshot(backend)
+            full_time = time.perf_counter() - start
+
+            store = main.InventoryStore(backend)
+            change(store, random.Random(5), 10)
+            start = time.perf_counter()
+            small = backups.snapshot(backend)
+            small_time = time.perf_counter() - start
+            change(store, random.Random(6), 10)
+            start = time.perf_counter()
+            backups.restore(backend, small["id"])
+            restore_time = time.perf_counter() - start
+            print(f"{size:>10}{size * 5:>10}{full_time * 1000:>10.0f}{full['bytes_written'] / 1024:>10.0f}"
+                  f"{small_time * 1000:>10.0f}{small['bytes_written'] / 1024:>10.1f}{restore_time * 1000:>12.0f}")
+
+
+def main_() -> None:
+    for name in ["pickle", "sqlite", "mmap"]:
+        verify(name)
+    scaling([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
+
+
+if __name__ == "__main__":
+    main_()
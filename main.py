@@ -3,11 +3,48 @@ Medicine Inventory Management System
 A simple CLI application to manage medical store inventory.
 """
 
+import argparse
+import asyncio
+import atexit
+import cProfile
+import csv
+import hashlib
+import json
+import math
 import pickle
 import os
+import shutil
+import signal
 import datetime
-from typing import Optional, List, Dict, Any
+import bisect
+import heapq
+import mmap
+import operator
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import compress, groupby, islice
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Iterator, Callable
+from urllib.parse import parse_qs, quote, unquote, urlsplit
 from enum import Enum
+from functools import lru_cache, wraps
+
+try:
+    import numpy
+except ImportError:  # optional; ColumnarInventory falls back to plain arrays
+    numpy = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 
 class MedicineType(Enum):
@@ -16,11 +53,18 @@ class MedicineType(Enum):
     TABLET = 1
 
 
+class InventoryError(Exception):
+    """An inventory operation that was refused or rolled back"""
+
+
 class Medicine:
     """Class to represent a medicine"""
+    __slots__ = ("id", "name", "brand", "manufacturing_date", "expiry_date",
+                 "type", "quantity", "price", "barcode")
+
     def __init__(self, m_id: int, name: str, brand: str, 
-                 man_date: str, exp_date: str, m_type: int, 
-                 quantity: int, price: float):
+                 man_date: datetime.date, exp_date: datetime.date, m_type: int, 
+                 quantity: int, price: float, barcode: str = ""):
         self.id = m_id
         self.name = name
         self.brand = brand
@@ -29,43 +73,162 @@ class Medicine:
         self.type = m_type
         self.quantity = quantity
         self.price = price
-        self.amount = quantity * price
+        # Barcode or SKU printed on the pack; empty if it has none
+        self.barcode = barcode
+
+    @property
+    def amount(self) -> float:
+        """Total value of the stock, derived from quantity and price"""
+        return self.quantity * self.price
     
     def to_list(self) -> List[Any]:
         """Convert medicine object to list format for backward compatibility"""
-        return [self.id, self.name, self.brand, self.manufacturing_date, 
-                self.expiry_date, self.type, self.quantity, self.price, self.amount]
+        return [self.id, self.name, self.brand, format_date(self.manufacturing_date), 
+                format_date(self.expiry_date), self.type, self.quantity, self.price, self.amount]
     
     @classmethod
     def from_list(cls, data: List[Any]) -> 'Medicine':
         """Create medicine object from list format"""
-        return cls(data[0], data[1], data[2], data[3], data[4], 
+        return cls(data[0], data[1], data[2], parse_date(data[3]), parse_date(data[4]), 
                    data[5], data[6], data[7])
 
+    def to_record(self) -> Tuple[Any, ...]:
+        """Convert medicine object to the compact on-disk tuple (dates as ordinals)"""
+        record = (self.id, self.name, self.brand, self.manufacturing_date.toordinal(),
+                  self.expiry_date.toordinal(), self.type, self.quantity, self.price)
+        # The barcode only when there is one, so records without stay as they were
+        return record + (self.barcode,) if self.barcode else record
+
+    @classmethod
+    def from_record(cls, data: Tuple[Any, ...]) -> 'Medicine':
+        """Create medicine object from the compact on-disk tuple"""
+        return cls(data[0], data[1], data[2], datetime.date.fromordinal(data[3]),
+                   datetime.date.fromordinal(data[4]), data[5], data[6], data[7],
+                   data[8] or "" if len(data) > 8 else "")
+
+
+# Erase the display and home the cursor; understood by Linux, macOS and
+# Windows 10+ terminals, and far cheaper than running `clear` in a subprocess
+CLEAR_SCREEN = "\033[2J\033[H"
+
+MENU = "\n".join([
+    "=" * 75,
+    "  GOOD HEALTH FAMILY MEDICAL STORE - INVENTORY MANAGEMENT SYSTEM  ".center(75),
+    "=" * 75,
+    "\n",
+    "\t\t\t 1. ADD STOCK",
+    "\t\t\t 2. UPDATE STOCK",
+    "\t\t\t 3. DELETE MEDICINE",
+    "\t\t\t 4. SELL MEDICINE",
+    "\t\t\t 5. RETURN MEDICINE",
+    "\t\t\t 6. UPCOMING EXPIRY MEDICINE LIST",
+    "\t\t\t 7. SEARCH MEDICINE",
+    "\t\t\t 8. VIEW ALL MEDICINES",
+    "\t\t\t 9. SALES REPORT",
+    "\t\t\t10. CART CHECKOUT (MULTIPLE ITEMS)",
+    "\t\t\t11. LOW STOCK / REORDER ALERTS",
+    "\t\t\t 0. EXIT",
+    "\n",
+    "=" * 75,
+    "",
+])
+
 
 def clear_screen() -> None:
     """Clear the console screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
 
 
 def show_menu() -> None:
     """Display the instructions and features of the program"""
-    clear_screen()
-    print("=" * 75)
-    print("  GOOD HEALTH FAMILY MEDICAL STORE - INVENTORY MANAGEMENT SYSTEM  ".center(75))
-    print("=" * 75)
-    print("\n")
-    print("\t\t\t 1. ADD STOCK")
-    print("\t\t\t 2. UPDATE STOCK")
-    print("\t\t\t 3. DELETE MEDICINE")
-    print("\t\t\t 4. SELL MEDICINE")
-    print("\t\t\t 5. RETURN MEDICINE")
-    print("\t\t\t 6. UPCOMING EXPIRY MEDICINE LIST")
-    print("\t\t\t 7. SEARCH MEDICINE")
-    print("\t\t\t 8. VIEW ALL MEDICINES")
-    print("\t\t\t 0. EXIT")
-    print("\n")
-    print("=" * 75)
+    # One write for the whole redraw instead of a line at a time
+    sys.stdout.write(CLEAR_SCREEN + MENU)
+    sys.stdout.flush()
+
+
+# Rows per screenful in the paged tables
+PAGE_SIZE = 40
+
+MEDICINE_HEADER = (f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}"
+                   f"{'QTY':<8}{'TYPE':<10}{'PRICE':<10}{'AMOUNT':<10}\n" + "-" * 100)
+
+
+def medicine_row(med: Medicine) -> str:
+    """One line of the medicine table"""
+    return (f"{med.id:<10}{med.name:<20}{med.brand:<15}{format_date(med.expiry_date):<15}"
+            f"{med.quantity:<8}{get_medicine_type_name(med.type):<10}₹{med.price:<9.2f}₹{med.amount:<9.2f}")
+
+
+# Marks the end of the rows being paged
+_END = object()
+
+
+def page_rows(header: str, rows: Iterable[Any], render: Callable[[Any], str],
+              page_size: int = PAGE_SIZE) -> int:
+    """Show rows a page at a time, each page written in one go; returns how many were shown
+
+    Rows are pulled from the iterable only as pages are shown, so a generator
+    over a large inventory is never rendered (or sorted) past what is viewed."""
+    rows = iter(rows)
+    shown = 0
+    following = next(rows, _END)
+    while following is not _END:
+        page = [render(following)]
+        for row in islice(rows, page_size - 1):
+            page.append(render(row))
+        shown += len(page)
+        following = next(rows, _END)
+        sys.stdout.write(f"{header}\n" + "\n".join(page) + "\n")
+        sys.stdout.flush()
+        if following is not _END:
+            answer = input(f"\n\t\t ...::: {shown} SHOWN. ENTER: NEXT PAGE, Q: STOP :::... ")
+            if answer.strip().lower() == "q":
+                break
+    return shown
+
+
+def iter_sorted(items: List[Any], key: Callable[[Any], Any], reverse: bool = False,
+                where: Optional[Callable[[Any], bool]] = None, 
+                chunk: int = PAGE_SIZE) -> Iterator[Any]:
+    """Yield the items passing where in key order, without copying or sorting the whole list
+
+    Each batch is one pass picking the next smallest (or largest) keys after
+    the last one yielded, so the first pages of a large inventory cost a few
+    linear scans rather than a full sort. Batches double as paging goes on.
+    Keys must be unique; include the ID to break ties."""
+    pick = heapq.nlargest if reverse else heapq.nsmallest
+    first = operator.itemgetter(0)
+    last = None
+    while True:
+        keyed = ((key(item), item) for item in items if where is None or where(item))
+        if last is not None:
+            keyed = (pair for pair in keyed if (pair[0] < last if reverse else pair[0] > last))
+        batch = pick(chunk, keyed, key=first)
+        for _, item in batch:
+            yield item
+        if len(batch) < chunk:
+            return
+        last = batch[-1][0]
+        chunk = min(chunk * 2, 64 * PAGE_SIZE)
+
+
+# Orders and row filters offered by VIEW ALL MEDICINES: name -> (key, descending)
+VIEW_ORDERS = {
+    "id": (lambda med: med.id, False),
+    "name": (lambda med: (med.name.lower(), med.brand.lower(), med.id), False),
+    "expiry": (lambda med: (med.expiry_date, med.id), False),
+    "stock": (lambda med: (med.quantity, med.id), True),
+    "value": (lambda med: (med.quantity * med.price, med.id), True),
+}
+VIEW_FILTERS = {
+    "all": None,
+    "syrup": lambda med: med.type == MedicineType.SYRUP.value,
+    "tablet": lambda med: med.type == MedicineType.TABLET.value,
+    "in stock": lambda med: med.quantity > 0,
+    "out of stock": lambda med: med.quantity == 0,
+    "expired": lambda med: medicine_expired(med.expiry_date),
+}
 
 
 def medicine_expired(date: datetime.date) -> bool:
@@ -88,40 +251,1169 @@ def parse_date(date_str: str) -> datetime.date:
     return datetime.datetime.strptime(date_str, "%Y, %m, %d").date()
 
 
-def load_medicines() -> List[List[Any]]:
-    """Load medicines from file"""
-    if os.path.exists('Medicines.dat'):
+def format_date(date: datetime.date) -> str:
+    """Format date object as the "yyyy, mm, dd" string used on screen"""
+    return f"{date.year:04d}, {date.month:02d}, {date.day:02d}"
+
+
+# Set to a file path to write operation metrics there at exit (.json, 
+# otherwise Prometheus text format), or to profile the session with cProfile
+METRICS_ENV = "MEDICINES_METRICS"
+PROFILE_ENV = "MEDICINES_PROFILE"
+
+# Timed while metrics are on: module functions by name, methods as "Class.method"
+INSTRUMENTED = [
+    "read_snapshot", "save_medicines", "read_journal", "save_changes",
+    "parse_date", "import_medicines", "export_medicines", "export_ledger",
+    "add_stock", "update_stock", "delete_medicine", "sell_medicine", "return_medicine",
+    "expiry_list", "search_medicine", "view_all_medicines", "sales_report", "cart_checkout",
+    "low_stock_alerts",
+    "InventoryStore.refresh", "InventoryStore.record_transaction", "InventoryStore._withdraw",
+    "InventoryStore.checkout", "InventoryStore.return_stock", "InventoryStore.search",
+    "InventoryStore.expiring_by",
+    "PickleBackend.load", "PickleBackend.save_changes", "PickleBackend.save_all",
+    # Sales and returns reach the ledgers here (the record file backend
+    # inherits these ledger methods, so they count under PickleBackend)
+    "PickleBackend.write_transactions",
+    "SQLiteBackend.load", "SQLiteBackend.save_changes", "SQLiteBackend.save_all",
+    "SQLiteBackend.write_transactions",
+    "RecordFileBackend.load", "RecordFileBackend.save_changes", "RecordFileBackend.save_all",
+    "WriteBehindBackend.save_changes", "WriteBehindBackend.write_transactions",
+]
+# Label each metric's series by this name in the Prometheus output
+METRIC_LABELS = {"operation_seconds": "op", "bytes_read": "file", 
+                 "bytes_written": "file", "records_loaded": "backend"}
+
+
+class Metrics:
+    """Call counts and wall time of instrumented operations, plus file I/O volumes
+
+    Nothing is wrapped until enable(), so a session without metrics runs the
+    plain functions; the I/O counts cost a flag check where they are taken."""
+    def __init__(self):
+        self.enabled = False
+        # (metric, label) -> [count, sum, max]
+        self.stats: Dict[Tuple[str, str], List[float]] = {}
+        self._originals: Dict[Tuple[Any, str], Callable] = {}
+
+    def observe(self, metric: str, label: str, value: float) -> None:
+        """Add one observation (a duration, a byte count) to a series"""
+        stat = self.stats.get((metric, label))
+        if stat is None:
+            self.stats[(metric, label)] = [1, value, value]
+        else:
+            stat[0] += 1
+            stat[1] += value
+            if value > stat[2]:
+                stat[2] = value
+
+    def io(self, metric: str, path: str, size: int) -> None:
+        """Count bytes read from or written to a file, by file name"""
+        if size > 0:
+            self.observe(metric, os.path.basename(path), size)
+
+    def _timed(self, name: str, fn: Callable) -> Callable:
+        observe, clock = self.observe, time.perf_counter
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe("operation_seconds", name, clock() - start)
+        return timed
+
+    def enable(self, names: Optional[List[str]] = None) -> None:
+        """Start timing the instrumented functions and counting I/O"""
+        if self.enabled:
+            return
+        module = sys.modules[__name__]
+        for name in names or INSTRUMENTED:
+            owner_name, _, attr = name.rpartition(".")
+            owner = getattr(module, owner_name) if owner_name else module
+            fn = vars(owner)[attr]
+            self._originals[(owner, attr)] = fn
+            setattr(owner, attr, self._timed(name, fn))
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Put the plain functions back"""
+        for (owner, attr), fn in self._originals.items():
+            setattr(owner, attr, fn)
+        self._originals = {}
+        self.enabled = False
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{metric: {label: {"count", "sum", "max"}}}"""
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (metric, label), (count, total, peak) in sorted(self.stats.items()):
+            result.setdefault(metric, {})[label] = {"count": count, "sum": total, "max": peak}
+        return result
+
+    def to_prometheus(self) -> str:
+        """The metrics in Prometheus text exposition format"""
+        lines = []
+        for metric, series in self.to_dict().items():
+            name, key = f"medicines_{metric}", METRIC_LABELS.get(metric, "name")
+            lines.append(f"# TYPE {name} summary")
+            for label, stat in series.items():
+                lines.append(f'{name}_count{{{key}="{label}"}} {stat["count"]}')
+                lines.append(f'{name}_sum{{{key}="{label}"}} {stat["sum"]}')
+            lines.append(f"# TYPE {name}_max gauge")
+            for label, stat in series.items():
+                lines.append(f'{name}_max{{{key}="{label}"}} {stat["max"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Write the metrics to a .json file, or any other file as Prometheus text"""
         try:
-            with open("Medicines.dat", "rb") as f:
-                return pickle.load(f)
-        except (pickle.UnpicklingError, EOFError):
-            print("\n\t\t ## ERROR READING FILE. Starting with empty database ##")
-            return []
-    return []
+            with open(f"{path}.tmp", "w") as f:
+                if path.endswith(".json"):
+                    json.dump(self.to_dict(), f, indent=2)
+                else:
+                    f.write(self.to_prometheus())
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"\n\t\t ## ERROR WRITING METRICS: {e} ##")
+
+
+METRICS = Metrics()
+
+
+def write_profile(profiler: cProfile.Profile, path: str) -> None:
+    """Stop a session's profiler and save its stats (read them with pstats)"""
+    profiler.disable()
+    try:
+        profiler.dump_stats(path)
+    except OSError as e:
+        print(f"\n\t\t ## ERROR WRITING PROFILE: {e} ##")
+
+
+MEDICINES_FILE = "Medicines.dat"
+JOURNAL_FILE = "Medicines.journal"
+# Fold the journal back into the snapshot once it grows past this many bytes
+JOURNAL_COMPACT_BYTES = 256 * 1024
+# Batches with more changes than this go straight into a new snapshot
+JOURNAL_BATCH_LIMIT = 4096
+# Schema 1: a bare list of 9-element lists with "yyyy, mm, dd" date strings
+# Schema 2: {"schema": 2, "next_id": int, "medicines": [Medicine.to_record(), ...]}
+# (next_id is missing from older schema 2 files)
+SCHEMA_VERSION = 2
+
+
+def upgrade_record(data: Any) -> Medicine:
+    """Build a medicine from an on-disk record of any schema version"""
+    if isinstance(data, tuple):
+        return Medicine.from_record(data)
+    return Medicine.from_list(data)
+
+
+def read_snapshot(path: str = MEDICINES_FILE) -> Tuple[List[Medicine], bool, int]:
+    """Load the medicines snapshot, reporting whether it used an older schema
+
+    Also returns the ID counter stored with it (0 if it has none)."""
+    if not os.path.exists(path):
+        return [], False, 0
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+            if METRICS.enabled:
+                METRICS.io("bytes_read", path, f.tell())
+    except (pickle.UnpicklingError, EOFError):
+        print("\n\t\t ## ERROR READING FILE. Starting with empty database ##")
+        return [], False, 0
+
+    if isinstance(data, dict) and data.get("schema") == SCHEMA_VERSION:
+        return ([Medicine.from_record(record) for record in data["medicines"]], False,
+                data.get("next_id", 0))
+
+    medicines = []
+    for record in data:
+        try:
+            medicines.append(Medicine.from_list(record))
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"\t\t ## ERROR PROCESSING MEDICINE ID {record[0]}: {e} ##")
+    return medicines, True, 0
+
+
+def save_medicines(medicines: List[Medicine], path: str = MEDICINES_FILE, next_id: int = 0) -> bool:
+    """Save the medicines snapshot to file, with the ID counter (at least past every ID in it)"""
+    next_id = max(next_id, max((med.id for med in medicines), default=0) + 1)
+    try:
+        # Written aside and swapped in, so a crash never leaves half a snapshot
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump({"schema": SCHEMA_VERSION, "next_id": next_id,
+                         "medicines": [med.to_record() for med in medicines]}, f)
+            if METRICS.enabled:
+                METRICS.io("bytes_written", path, f.tell())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        fsync_directory(path)
+        return True
+    except Exception as e:
+        print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+        return False
+
+
+def fsync_path(path: str) -> None:
+    """Force a file already written (through any handle) onto the disk"""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def fsync_directory(path: str) -> None:
+    """Make a file just renamed into place survive a power cut (POSIX only)"""
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_journal(journal_path: str = JOURNAL_FILE, start: int = 0,
+                 repair: bool = True) -> List[Tuple[str, Any]]:
+    """Read the journal entries written since the last snapshot (or from an offset),
+    cutting off a torn last frame unless repair is off"""
+    entries = []
+    if not os.path.exists(journal_path):
+        return entries
 
+    with open(journal_path, "rb") as f:
+        f.seek(start)
+        good_offset = start
+        while True:
+            try:
+                entries.append(pickle.load(f))
+                good_offset = f.tell()
+            except EOFError:
+                break
+            except Exception:
+                # A torn frame from an interrupted write; drop it so later
+                # appends are not hidden behind it
+                break
+
+    if METRICS.enabled:
+        METRICS.io("bytes_read", journal_path, good_offset - start)
+    if repair and good_offset < os.path.getsize(journal_path):
+        with open(journal_path, "r+b") as f:
+            f.truncate(good_offset)
+    return entries
+
+
+def apply_journal(medicines: List[Medicine], 
+                  entries: List[Tuple[str, Any]]) -> List[Medicine]:
+    """Replay journal entries on top of a snapshot"""
+    records = {med.id: med for med in medicines}
+    pending = list(reversed(entries))
+    while pending:
+        op, payload = pending.pop()
+        if op == "put":
+            med = upgrade_record(payload)
+            records[med.id] = med
+        elif op == "delete":
+            records.pop(payload, None)
+        elif op == "batch":
+            # One frame holding several changes, so they apply all or nothing
+            pending.extend(reversed(payload))
+    return list(records.values())
+
+
+def journal_next_id(entries: List[Tuple[str, Any]]) -> int:
+    """ID after the highest one the journal entries put or delete (0 if there are none)"""
+    # Deletes count too, for snapshots written before the counter was stored
+    highest = -1
+    pending = list(entries)
+    while pending:
+        op, payload = pending.pop()
+        if op == "put":
+            highest = max(highest, payload[0])
+        elif op == "delete":
+            highest = max(highest, payload)
+        elif op == "batch":
+            pending.extend(payload)
+    return highest + 1
 
-def save_medicines(medicines: List[List[Any]]) -> bool:
-    """Save medicines to file"""
+
+def load_inventory(path: str = MEDICINES_FILE, journal_path: str = JOURNAL_FILE,
+                   upgrade: bool = True) -> Tuple[List[Medicine], int]:
+    """Load medicines from the last snapshot plus the journal, and the ID counter
+
+    Without upgrade nothing is written: a schema 1 file stays as it is and a
+    torn journal frame is skipped rather than cut off."""
+    snapshot, legacy, next_id = read_snapshot(path)
+    entries = read_journal(journal_path, repair=upgrade)
+    medicines = apply_journal(snapshot, entries)
+    next_id = max(next_id, journal_next_id(entries))
+    if legacy and upgrade:
+        # First load of a schema 1 file: keep a copy of the original alongside
+        # and rewrite it in the current schema. Copied, not moved, so a crash
+        # before the new snapshot is swapped in still leaves the old one
+        try:
+            shutil.copyfile(path, f"{path}.v1")
+        except OSError as e:
+            print(f"\n\t\t ## ERROR BACKING UP OLD FILE: {e} ##")
+        else:
+            compact_journal(medicines, path, journal_path, next_id)
+    return medicines, next_id
+
+
+def compact_journal(medicines: List[Medicine], path: str = MEDICINES_FILE,
+                    journal_path: str = JOURNAL_FILE, next_id: int = 0) -> bool:
+    """Write a fresh snapshot and empty the journal"""
+    # The journal is only cleared once the snapshot holding its changes is on
+    # disk; replaying it again after a crash in between is harmless
+    if not save_medicines(medicines, path, next_id):
+        return False
     try:
-        with open("Medicines.dat", "wb") as f:
-            pickle.dump(medicines, f)
+        with open(journal_path, "wb"):
+            pass
         return True
+    except Exception as e:
+        print(f"\n\t\t ## ERROR COMPACTING JOURNAL: {e} ##")
+        return False
+
+
+def save_changes(medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]],
+                 path: str = MEDICINES_FILE, journal_path: str = JOURNAL_FILE,
+                 next_id: int = 0) -> bool:
+    """Append changes ("put" medicine or "delete" id) to the journal as one frame
+
+    next_id is the ID counter a compaction stores in the snapshot. Without
+    the in-memory medicines, a compaction reads both back from the files,
+    which then hold every change."""
+    if len(changes) > JOURNAL_BATCH_LIMIT:
+        # A bulk import would only be compacted straight away
+        return compact_journal(medicines, path, journal_path, next_id)
+    entries = [(op, payload.to_record() if op == "put" else payload) 
+               for op, payload in changes]
+    frame = entries[0] if len(entries) == 1 else ("batch", entries)
+    try:
+        with open(journal_path, "ab") as f:
+            start = f.tell()
+            pickle.dump(frame, f)
+            size = f.tell()
+        if METRICS.enabled:
+            METRICS.io("bytes_written", journal_path, size - start)
     except Exception as e:
         print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
         return False
 
+    if size > JOURNAL_COMPACT_BYTES:
+        if medicines is None:
+            medicines, next_id = load_inventory(path, journal_path)
+        compact_journal(medicines, path, journal_path, next_id)
+    return True
+
+
+def name_trigrams(text: str) -> set:
+    """Get the set of three-character substrings of a string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """Inverted trigram index for case-insensitive substring search on names"""
+    def __init__(self, include_brand: bool = False):
+        self.include_brand = include_brand
+        self._names: Dict[int, str] = {}
+        self._texts: Dict[int, str] = {}
+        self._postings: Dict[str, set] = {}
+
+    def _text(self, med: Medicine) -> str:
+        # The separator never occurs in a query, so no trigram spans both fields
+        if self.include_brand:
+            return f"{med.name.lower()}\x00{med.brand.lower()}"
+        return med.name.lower()
+
+    def add(self, med: Medicine) -> None:
+        """Index a medicine (or re-index it after a rename)"""
+        m_id = med.id
+        text = self._text(med)
+        if self._texts.get(m_id) == text:
+            return
+        self.remove(m_id)
+        self._names[m_id] = med.name.lower()
+        self._texts[m_id] = text
+        for gram in name_trigrams(text):
+            self._postings.setdefault(gram, set()).add(m_id)
+
+    def remove(self, m_id: int) -> None:
+        """Drop a medicine from the index"""
+        text = self._texts.pop(m_id, None)
+        if text is None:
+            return
+        del self._names[m_id]
+        for gram in name_trigrams(text):
+            ids = self._postings[gram]
+            ids.discard(m_id)
+            if not ids:
+                del self._postings[gram]
+
+    def rebuild(self, medicines: List[Medicine]) -> None:
+        """Index a full list of medicines from scratch"""
+        self._names.clear()
+        self._texts.clear()
+        self._postings.clear()
+        for med in medicines:
+            self.add(med)
+
+    def search(self, query: str) -> List[int]:
+        """IDs whose name contains the query, ranked exact > prefix > substring"""
+        query = query.lower()
+        grams = name_trigrams(query)
+        if grams:
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        else:
+            # Queries shorter than a trigram fall back to the lowered names
+            candidates = self._texts.keys()
+
+        texts = self._texts
+        names = self._names
+        # Within each rank, keep catalog (ID) order like the old linear scan
+        matches = sorted(m_id for m_id in candidates if query in texts[m_id])
+        exact, prefix, substring = [], [], []
+        for m_id in matches:
+            name = names[m_id]
+            if name == query:
+                exact.append(m_id)
+            elif name.startswith(query):
+                prefix.append(m_id)
+            else:
+                substring.append(m_id)
+        return exact + prefix + substring
+
+
+class ExpiryIndex:
+    """Medicine IDs sorted by expiry date ordinal for range queries"""
+    def __init__(self):
+        self._entries: List[Tuple[int, int]] = []
+        self._ordinals: Dict[int, int] = {}
+
+    def add(self, med: Medicine) -> None:
+        """Index a medicine (or move it after its expiry date changed)"""
+        m_id = med.id
+        ordinal = med.expiry_date.toordinal()
+        if self._ordinals.get(m_id) == ordinal:
+            return
+        self.remove(m_id)
+        self._ordinals[m_id] = ordinal
+        bisect.insort(self._entries, (ordinal, m_id))
+
+    def add_many(self, medicines: List[Medicine]) -> None:
+        """Index a batch of medicines not yet in the index with one merge"""
+        new = [(med.expiry_date.toordinal(), med.id) for med in medicines]
+        self._ordinals.update((m_id, ordinal) for ordinal, m_id in new)
+        new.sort()
+        # Two sorted runs: the sort only has to merge them
+        self._entries = sorted(self._entries + new)
+
+    def remove(self, m_id: int) -> None:
+        """Drop a medicine from the index"""
+        ordinal = self._ordinals.pop(m_id, None)
+        if ordinal is None:
+            return
+        del self._entries[bisect.bisect_left(self._entries, (ordinal, m_id))]
+
+    def rebuild(self, medicines: List[Medicine]) -> None:
+        """Index a full list of medicines from scratch"""
+        self._ordinals = {med.id: med.expiry_date.toordinal() for med in medicines}
+        self._entries = sorted((ordinal, m_id) for m_id, ordinal in self._ordinals.items())
+
+    def expiring_by(self, date: datetime.date) -> List[Tuple[int, int]]:
+        """(expiry ordinal, ID) pairs expiring on or before a date, soonest first"""
+        end = bisect.bisect_right(self._entries, (date.toordinal(), float("inf")))
+        return self._entries[:end]
+
+
+def product_key(med: Medicine) -> Tuple[str, str]:
+    """Medicines with the same name and brand are lots of one product"""
+    return (med.name.lower(), med.brand.lower())
+
+
+class LotIndex:
+    """Per-product min-heaps of (expiry ordinal, lot ID) for first-expiry-first-out sales"""
+    def __init__(self):
+        self._heaps: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self._members: Dict[Tuple[str, str], set] = {}
+        # Lot ID -> (product, expiry ordinal) of its live heap entry; heap
+        # entries that no longer match are stale and skipped when popped
+        self._live: Dict[int, Tuple[Tuple[str, str], int]] = {}
+        self._keys: Dict[int, Tuple[str, str]] = {}
+
+    def add(self, med: Medicine) -> None:
+        """Index a lot (or re-index it after a restock, rename or new expiry date)"""
+        key, ordinal = product_key(med), med.expiry_date.toordinal()
+        old_key = self._keys.get(med.id)
+        if old_key != key:
+            if old_key is not None:
+                self._members[old_key].discard(med.id)
+            self._keys[med.id] = key
+            self._members.setdefault(key, set()).add(med.id)
+        if self._live.get(med.id) != (key, ordinal):
+            self._live[med.id] = (key, ordinal)
+            heapq.heappush(self._heaps.setdefault(key, []), (ordinal, med.id))
+
+    def remove(self, m_id: int) -> None:
+        """Drop a lot from the index"""
+        self._live.pop(m_id, None)
+        key = self._keys.pop(m_id, None)
+        if key is not None:
+            self._members[key].discard(m_id)
+
+    def rebuild(self, medicines: List[Medicine]) -> None:
+        """Index a full list of lots from scratch"""
+        self._heaps, self._members, self._live, self._keys = {}, {}, {}, {}
+        for med in medicines:
+            key, ordinal = product_key(med), med.expiry_date.toordinal()
+            self._keys[med.id] = key
+            self._members.setdefault(key, set()).add(med.id)
+            self._live[med.id] = (key, ordinal)
+            self._heaps.setdefault(key, []).append((ordinal, med.id))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def key_of(self, m_id: int) -> Optional[Tuple[str, str]]:
+        """Product a lot belongs to"""
+        return self._keys.get(m_id)
+
+    def lot_ids(self, key: Tuple[str, str]) -> List[int]:
+        """IDs of every lot of a product"""
+        return list(self._members.get(key, ()))
+
+    def allocate(self, m_id: int, qty: int, lots: Dict[int, Medicine],
+                 today: datetime.date) -> Tuple[List[Tuple[Medicine, int]], int]:
+        """Take qty from the product's unexpired lots, soonest expiry first
+
+        Returns the (lot, quantity) plan and how much could not be covered;
+        nothing is changed, so the caller applies the plan."""
+        key = self._keys.get(m_id)
+        heap = self._heaps.get(key, [])
+        plan, kept = [], []
+        while qty > 0 and heap:
+            ordinal, lot_id = heapq.heappop(heap)
+            if self._live.get(lot_id) != (key, ordinal):
+                continue
+            lot = lots[lot_id]
+            if lot.quantity <= 0 or medicine_expired(lot.expiry_date):
+                # Sold out or expired: leave it off the heap until a restock
+                # or new expiry date re-adds it
+                del self._live[lot_id]
+                continue
+            take = min(qty, lot.quantity)
+            plan.append((lot, take))
+            qty -= take
+            kept.append((ordinal, lot_id))
+        for entry in kept:
+            heapq.heappush(heap, entry)
+        return plan, qty
+
+
+class BarcodeIndex:
+    """Barcode -> IDs of the lots sold under it, for scanner lookups without name matching"""
+    def __init__(self):
+        self._lots: Dict[str, set] = {}
+        self._codes: Dict[int, str] = {}
+
+    def add(self, med: Medicine) -> None:
+        """Index a lot (or move it after its barcode changed)"""
+        if self._codes.get(med.id, "") == med.barcode:
+            return
+        self.remove(med.id)
+        if med.barcode:
+            self._codes[med.id] = med.barcode
+            self._lots.setdefault(med.barcode, set()).add(med.id)
+
+    def remove(self, m_id: int) -> None:
+        """Drop a lot from the index"""
+        code = self._codes.pop(m_id, None)
+        if code is not None:
+            lots = self._lots[code]
+            lots.discard(m_id)
+            if not lots:
+                del self._lots[code]
+
+    def rebuild(self, medicines: List[Medicine]) -> None:
+        """Index a full list of lots from scratch"""
+        self._lots, self._codes = {}, {}
+        for med in medicines:
+            if med.barcode:
+                self._codes[med.id] = med.barcode
+                self._lots.setdefault(med.barcode, set()).add(med.id)
+
+    def any_lot(self, code: str) -> Optional[int]:
+        """ID of one lot with this barcode; a sale fills from all the product's lots anyway"""
+        return next(iter(self._lots.get(code, ())), None)
+
+
+class ColumnarInventory:
+    """Inventory held as parallel typed columns for fast aggregate queries"""
+    def __init__(self):
+        self.ids = array('q')
+        self.quantities = array('q')
+        self.prices = array('d')
+        self.types = array('b')
+        self.manufacturing_ordinals = array('q')
+        self.expiry_ordinals = array('q')
+        # Names and brands are codes into one shared string table
+        self.strings: List[str] = []
+        self._string_codes: Dict[str, int] = {}
+        self.name_codes = array('l')
+        self.brand_codes = array('l')
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _intern(self, text: str) -> int:
+        code = self._string_codes.get(text)
+        if code is None:
+            code = self._string_codes[text] = len(self.strings)
+            self.strings.append(text)
+        return code
+
+    def append(self, med: Medicine) -> None:
+        """Add one medicine as a new row"""
+        self.ids.append(med.id)
+        self.quantities.append(med.quantity)
+        self.prices.append(med.price)
+        self.types.append(med.type)
+        self.manufacturing_ordinals.append(med.manufacturing_date.toordinal())
+        self.expiry_ordinals.append(med.expiry_date.toordinal())
+        self.name_codes.append(self._intern(med.name))
+        self.brand_codes.append(self._intern(med.brand))
+
+    @classmethod
+    def from_medicines(cls, medicines: List[Medicine]) -> 'ColumnarInventory':
+        """Build the columns from a list of medicines"""
+        columns = cls()
+        for med in medicines:
+            columns.append(med)
+        return columns
+
+    @classmethod
+    def from_records(cls, records: List[Tuple[Any, ...]]) -> 'ColumnarInventory':
+        """Build the columns from on-disk (schema 2) record tuples"""
+        columns = cls()
+        for record in records:
+            columns.ids.append(record[0])
+            columns.name_codes.append(columns._intern(record[1]))
+            columns.brand_codes.append(columns._intern(record[2]))
+            columns.manufacturing_ordinals.append(record[3])
+            columns.expiry_ordinals.append(record[4])
+            columns.types.append(record[5])
+            columns.quantities.append(record[6])
+            columns.prices.append(record[7])
+        return columns
+
+    def to_records(self):
+        """Yield each row as an on-disk (schema 2) record tuple"""
+        strings = self.strings
+        for row in zip(self.ids, self.name_codes, self.brand_codes,
+                       self.manufacturing_ordinals, self.expiry_ordinals,
+                       self.types, self.quantities, self.prices):
+            yield (row[0], strings[row[1]], strings[row[2]]) + row[3:]
+
+    def to_medicines(self) -> List[Medicine]:
+        """Convert the rows back into medicine objects"""
+        return [Medicine.from_record(record) for record in self.to_records()]
+
+    def _mask(self, m_type: Optional[int], expiring_by: Optional[datetime.date],
+              max_quantity: Optional[int]):
+        """Row filter as a NumPy boolean array, or None when unfiltered"""
+        mask = None
+        if m_type is not None:
+            mask = numpy.frombuffer(self.types, dtype=numpy.int8) == m_type
+        if expiring_by is not None:
+            due = numpy.frombuffer(self.expiry_ordinals, dtype=numpy.int64) <= expiring_by.toordinal()
+            mask = due if mask is None else mask & due
+        if max_quantity is not None:
+            low = numpy.frombuffer(self.quantities, dtype=numpy.int64) <= max_quantity
+            mask = low if mask is None else mask & low
+        return mask
+
+    def _rows(self, m_type: Optional[int], expiring_by: Optional[datetime.date],
+              max_quantity: Optional[int]):
+        """Row filter as a lazy iterator of booleans, or None when unfiltered"""
+        # Bound comparison methods keep the per-row work inside C
+        tests = []
+        if m_type is not None:
+            tests.append(map(m_type.__eq__, self.types))
+        if expiring_by is not None:
+            tests.append(map(expiring_by.toordinal().__ge__, self.expiry_ordinals))
+        if max_quantity is not None:
+            tests.append(map(max_quantity.__ge__, self.quantities))
+        if not tests:
+            return None
+        rows = tests[0]
+        for test in tests[1:]:
+            rows = map(operator.and_, rows, test)
+        return rows
+
+    def value(self, m_type: Optional[int] = None, 
+              expiring_by: Optional[datetime.date] = None,
+              max_quantity: Optional[int] = None) -> float:
+        """Sum of quantity * price over the rows matching every given filter"""
+        if numpy is not None:
+            values = (numpy.frombuffer(self.quantities, dtype=numpy.int64)
+                      * numpy.frombuffer(self.prices, dtype=numpy.float64))
+            mask = self._mask(m_type, expiring_by, max_quantity)
+            return float(values.sum() if mask is None else values[mask].sum())
+
+        values = map(operator.mul, self.quantities, self.prices)
+        rows = self._rows(m_type, expiring_by, max_quantity)
+        if rows is not None:
+            values = compress(values, rows)
+        return float(sum(values))
+
+    def count(self, m_type: Optional[int] = None, 
+              expiring_by: Optional[datetime.date] = None,
+              max_quantity: Optional[int] = None) -> int:
+        """Number of rows matching every given filter"""
+        if numpy is not None:
+            mask = self._mask(m_type, expiring_by, max_quantity)
+            return len(self.ids) if mask is None else int(mask.sum())
+
+        rows = self._rows(m_type, expiring_by, max_quantity)
+        return len(self.ids) if rows is None else sum(rows)
+
+    def value_by_type(self) -> Dict[MedicineType, float]:
+        """Stock value split by medicine type"""
+        return {m_type: self.value(m_type=m_type.value) for m_type in MedicineType}
+
+
+class InventoryStore:
+    """Resident copy of the inventory that reloads only when the files change"""
+    def __init__(self, backend: Optional['StorageBackend'] = None):
+        self.backend = backend or open_backend()
+        self.medicines: List[Medicine] = []
+        self._by_id: Dict[int, Medicine] = {}
+        self._signature: Optional[Tuple[Any, ...]] = None
+        self.name_index = NameIndex()
+        self.expiry_index = ExpiryIndex()
+        self.lot_index = LotIndex()
+        self.barcode_index = BarcodeIndex()
+        # Kept apart from the IDs in use, so a deleted medicine's ID is never reused
+        self._next_id = 1
+        # The indexes are built on the first search after a load, so runs
+        # that never search (bulk import/export) do not pay for them
+        self._indexed = False
+        self._columns: Optional[ColumnarInventory] = None
+        self.aggregates = SalesAggregates.load(self.backend)
+        self.reorder = ReorderQueue(self.backend)
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.medicines)
+
+    def __iter__(self):
+        return iter(self.medicines)
+
+    def refresh(self) -> bool:
+        """Reload from disk if the stored inventory changed since the last load"""
+        if self.backend.signature() == self._signature:
+            return False
+        # Locked so a frame another terminal is still writing is not
+        # mistaken for a torn tail
+        with self.backend.lock():
+            self.medicines = self.backend.load()
+            if METRICS.enabled:
+                METRICS.observe("records_loaded", self.backend.name, len(self.medicines))
+            self._by_id = {med.id: med for med in self.medicines}
+            self._next_id = max(self.backend.next_id(), max(self._by_id, default=0) + 1)
+            self._indexed = False
+            self.reorder.built_on = None
+            self._columns = None
+            # Taken after loading, since loading may trim a torn journal tail
+            self._signature = self.backend.signature()
+        return True
+
+    def _indexes(self) -> None:
+        """Build the name and expiry indexes if the last load has not been indexed"""
+        if not self._indexed:
+            self.name_index.rebuild(self.medicines)
+            self.expiry_index.rebuild(self.medicines)
+            self.lot_index.rebuild(self.medicines)
+            self.barcode_index.rebuild(self.medicines)
+            self._indexed = True
+
+    @contextmanager
+    def locked(self) -> Iterator['InventoryStore']:
+        """Hold the inventory lock with an up-to-date copy, for read-modify-write changes"""
+        with self.backend.lock():
+            self.refresh()
+            yield self
+
+    def _commit(self, op: str, payload: Any) -> bool:
+        """Journal a change and remember the resulting file state"""
+        return self._commit_many([(op, payload)])
+
+    def _commit_many(self, changes: List[Tuple[str, Any]]) -> bool:
+        """Journal several changes as one frame and remember the resulting file state"""
+        self._columns = None
+        if self._indexed:
+            changed = set()
+            for op, payload in changes:
+                if op == "put":
+                    self.lot_index.add(payload)
+                    self.barcode_index.add(payload)
+                    changed.add(product_key(payload))
+                else:
+                    changed.add(self.lot_index.key_of(payload))
+                    self.lot_index.remove(payload)
+                    self.barcode_index.remove(payload)
+            self._restock_changed(changed)
+        with self.backend.lock():
+            unchanged = self.backend.signature() == self._signature
+            ok = self.backend.save_changes(self.medicines, changes)
+            # If someone else wrote since our last load, or the write failed,
+            # force a reload on the next refresh rather than trusting memory
+            self._signature = self.backend.signature() if ok and unchanged else None
+        return ok
+
+    def flush(self) -> bool:
+        """Wait until every change made so far is on disk (with a write-behind backend)"""
+        return self.backend.flush()
+
+    def get(self, m_id: int) -> Optional[Medicine]:
+        """Get a medicine by ID"""
+        return self._by_id.get(m_id)
+
+    def next_id(self) -> int:
+        """ID to assign to the next added medicine"""
+        return self._next_id
+
+    def find_barcode(self, code: str) -> Optional[Medicine]:
+        """A lot sold under a barcode, or None"""
+        self._indexes()
+        lot_id = self.barcode_index.any_lot(code.strip())
+        return None if lot_id is None else self._by_id[lot_id]
+
+    def check_barcode(self, med: Medicine) -> None:
+        """Raise InventoryError if a new lot's barcode already belongs to another product"""
+        if not med.barcode:
+            return
+        owner = self.find_barcode(med.barcode)
+        if owner is not None and product_key(owner) != product_key(med):
+            raise InventoryError(f"BARCODE {med.barcode} ALREADY BELONGS TO {owner.name.upper()} "
+                                 f"({owner.brand.upper()})")
+
+    def add(self, med: Medicine) -> bool:
+        """Add a new medicine, moving it to the next ID if that was handed out since it was shown"""
+        with self.locked():
+            self.check_barcode(med)
+            if med.id < self._next_id:
+                med.id = self._next_id
+            self._next_id = med.id + 1
+            self.medicines.append(med)
+            self._by_id[med.id] = med
+            if self._indexed:
+                self.name_index.add(med)
+                self.expiry_index.add(med)
+            return self._commit("put", med)
+
+    def add_many(self, meds: List[Medicine]) -> bool:
+        """Add new medicines in one commit, numbering them on from the next ID"""
+        with self.locked():
+            first_id = self._next_id
+            for offset, med in enumerate(meds):
+                med.id = first_id + offset
+            self._next_id = first_id + len(meds)
+            self.medicines.extend(meds)
+            self._by_id.update((med.id, med) for med in meds)
+            if self._indexed:
+                for med in meds:
+                    self.name_index.add(med)
+                self.expiry_index.add_many(meds)
+            return self._commit_many([("put", med) for med in meds])
+
+    def update(self, med: Medicine) -> bool:
+        """Persist changes made to a medicine already in the store"""
+        with self.locked():
+            current = self._by_id.get(med.id)
+            if current is None:
+                return False
+            if current is not med:
+                # Reloaded because another terminal wrote; keep this edit
+                self.medicines[self.medicines.index(current)] = med
+                self._by_id[med.id] = med
+            if self._indexed:
+                self.name_index.add(med)
+                self.expiry_index.add(med)
+            return self._commit("put", med)
+
+    def delete(self, m_id: int) -> bool:
+        """Delete a medicine by ID"""
+        with self.locked():
+            med = self._by_id.pop(m_id, None)
+            if med is None:
+                return False
+            self.medicines.remove(med)
+            if self._indexed:
+                self.name_index.remove(m_id)
+                self.expiry_index.remove(m_id)
+            return self._commit("delete", m_id)
+
+    def adjust_stock(self, m_id: int, change: int) -> Medicine:
+        """Add to (or, if negative, take from) a medicine's stock against the latest saved quantity"""
+        with self.locked():
+            med = self.get(m_id)
+            if med is None:
+                raise InventoryError(f"MEDICINE ID {m_id} NOT FOUND")
+            if med.quantity + change < 0:
+                raise InventoryError("CANNOT REDUCE BELOW ZERO")
+            med.quantity += change
+            if not self._commit("put", med):
+                med.quantity -= change
+                raise InventoryError("ERROR SAVING FILE")
+            return med
+
+    def lots(self, m_id: int) -> List[Medicine]:
+        """Every lot of the same product as a lot, soonest expiry first"""
+        med = self.get(m_id)
+        return self.product_lots(med.name, med.brand) if med else []
+
+    def product_lots(self, name: str, brand: str) -> List[Medicine]:
+        """Every lot with this name and brand, soonest expiry first"""
+        self._indexes()
+        lot_ids = self.lot_index.lot_ids((name.lower(), brand.lower()))
+        return sorted((self._by_id[lot_id] for lot_id in lot_ids),
+                      key=lambda lot: (lot.expiry_date, lot.id))
+
+    def available(self, m_id: int) -> int:
+        """Unexpired stock that can be sold across every lot of a lot's product"""
+        return sum(lot.quantity for lot in self.lots(m_id) if not medicine_expired(lot.expiry_date))
+
+    def allocate(self, m_id: int, qty: int) -> List[Tuple[Medicine, int]]:
+        """Plan a sale of a product from its lots, first expiry first out"""
+        self._indexes()
+        med = self.get(m_id)
+        if med is None:
+            raise InventoryError(f"MEDICINE ID {m_id} NOT FOUND")
+        plan, missing = self.lot_index.allocate(m_id, qty, self._by_id, datetime.date.today())
+        if missing:
+            raise InventoryError(f"NOT ENOUGH STOCK OF {med.name.upper()}. "
+                                 f"CURRENT STOCK: {qty - missing}")
+        return plan
+
+    def plan_checkout(self, lines: List[Tuple[int, int]]) -> List[Tuple[Medicine, int]]:
+        """The (lot, quantity) entries a checkout of these lines would sell; nothing is changed"""
+        self._indexes()
+        wanted: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for m_id, qty in lines:
+            if qty <= 0:
+                raise InventoryError("QUANTITY MUST BE POSITIVE")
+            med = self.get(m_id)
+            if med is None:
+                raise InventoryError(f"MEDICINE ID {m_id} NOT FOUND")
+            # Lines for lots of the same product are filled together
+            first_id, total = wanted.get(product_key(med), (m_id, 0))
+            wanted[product_key(med)] = (first_id, total + qty)
+        return [entry for m_id, qty in wanted.values() for entry in self.allocate(m_id, qty)]
+
+    def checkout(self, lines: List[Tuple[int, int]]) -> List[Tuple[Medicine, int, float]]:
+        """Sell several (medicine ID, quantity) lines as one all-or-nothing bill
+
+        Each line is filled from the unexpired lots of that medicine's product,
+        soonest expiry first, so the bill has one entry per lot used."""
+        with self.locked():
+            return self._withdraw(SALES_FILE, self.plan_checkout(lines))
+
+    def return_stock(self, m_id: int, qty: int, reason: str = "") -> Tuple[Medicine, int, float]:
+        """Take returned stock (expired, damaged) out of one lot and record it"""
+        with self.locked():
+            lot = self.get(m_id)
+            if lot is None:
+                raise InventoryError(f"MEDICINE ID {m_id} NOT FOUND")
+            if qty <= 0:
+                raise InventoryError("QUANTITY MUST BE POSITIVE")
+            if qty > lot.quantity:
+                raise InventoryError(f"NOT ENOUGH STOCK OF {lot.name.upper()}. CURRENT STOCK: {lot.quantity}")
+            return self._withdraw(RETURNS_FILE, [(lot, qty)], reason)[0]
+
+    def _withdraw(self, ledger: str, plan: List[Tuple[Medicine, int]], 
+                  reason: str = "") -> List[Tuple[Medicine, int, float]]:
+        """Record (lot, quantity) entries in a ledger and take them out of stock"""
+        bill = [(lot, qty, qty * lot.price) for lot, qty in plan]
+        today = datetime.date.today()
+        frames = [ledger_frame(today, lot.name, qty, amount, reason, lot.id) 
+                  for lot, qty, amount in bill]
+        # The ledger is written first so a failed inventory write can be
+        # undone by cutting the ledger back to where it was
+        try:
+            start, spans = self.backend.write_transactions(ledger, frames)
+        except Exception as e:
+            raise InventoryError(f"ERROR RECORDING TRANSACTION: {e}")
+
+        for med, qty, _ in bill:
+            med.quantity -= qty
+        if not self._commit_many([("put", med) for med, _, _ in bill]):
+            for med, qty, _ in bill:
+                med.quantity += qty
+            self.backend.rollback_transactions(ledger, start)
+            raise InventoryError("ERROR SAVING FILE. TRANSACTION CANCELLED")
+
+        self._transactions_written(ledger, frames, spans)
+        # Sales velocity moved too
+        self._restock_changed({product_key(lot) for lot, _, _ in bill})
+        return bill
+
+    def product_stock(self, key: Tuple[str, str]) -> int:
+        """Unexpired stock across every lot of a product"""
+        return sum(self._by_id[lot_id].quantity for lot_id in self.lot_index.lot_ids(key)
+                   if not medicine_expired(self._by_id[lot_id].expiry_date))
+
+    def product_velocity(self, key: Tuple[str, str]) -> float:
+        """Average units of a product sold per day, across every lot of it"""
+        return self.aggregates.velocity(self.lot_index.lot_ids(key))
+
+    def _restock_changed(self, keys: set) -> None:
+        """Re-rank products whose stock or sales changed in the low-stock queue"""
+        if self.reorder.built_on is None:
+            return
+        for key in keys:
+            if key is not None:
+                self.reorder.update(key, self.product_stock(key), self.product_velocity(key))
+
+    def low_stock(self, count: int = 20) -> List[Tuple[Medicine, int, int, float, float]]:
+        """(a lot, stock, reorder level, sales per day, urgency) for the most urgent products"""
+        self._indexes()
+        if self.reorder.load_levels() or self.reorder.built_on != datetime.date.today():
+            # New levels from another terminal, or a new day for the velocities
+            self.aggregates.catch_up()
+            self.reorder.rebuild(self.product_stock, self.product_velocity)
+        found = []
+        for key, urgency in self.reorder.top(count):
+            lot_ids = self.lot_index.lot_ids(key)
+            if lot_ids:
+                found.append((self._by_id[min(lot_ids)], self.product_stock(key), 
+                              self.reorder.levels[key], self.product_velocity(key), urgency))
+        return found
+
+    def set_reorder_level(self, m_id: int, level: Optional[int]) -> bool:
+        """Set (or with None, clear) the reorder level of a medicine's product"""
+        med = self.get(m_id)
+        if med is None:
+            raise InventoryError(f"MEDICINE ID {m_id} NOT FOUND")
+        if level is not None and level < 0:
+            raise InventoryError("REORDER LEVEL CANNOT BE NEGATIVE")
+        with self.backend.lock():
+            if self.reorder.load_levels():
+                # Levels another terminal set are not in the queue yet
+                self.reorder.built_on = None
+            key = product_key(med)
+            if level is None:
+                self.reorder.levels.pop(key, None)
+            else:
+                self.reorder.levels[key] = level
+            if not self.reorder.save_levels():
+                return False
+        self._indexes()
+        if self.reorder.built_on is not None:
+            self.reorder.update(key, self.product_stock(key), self.product_velocity(key))
+        return True
+
+    def _transactions_written(self, ledger: str, frames: List[List[Any]], 
+                              spans: List[Tuple[int, int]]) -> None:
+        """Count and index ledger frames once their write is final"""
+        for frame, (offset, end) in zip(frames, spans):
+            self.aggregates.apply(ledger, offset, end, frame)
+        self.backend.index_transactions(ledger, frames, spans)
+
+    def record_transaction(self, ledger: str, med_name: str, qty: int, amount: float,
+                           reason: str = "") -> bool:
+        """Record a transaction (sale or return) in one of the ledgers"""
+        frame = ledger_frame(datetime.date.today(), med_name, qty, amount, reason)
+        with self.backend.lock():
+            try:
+                _, spans = self.backend.write_transactions(ledger, [frame])
+            except Exception as e:
+                print(f"\n\t\t ## ERROR RECORDING TRANSACTION: {e} ##")
+                return False
+            self._transactions_written(ledger, [frame], spans)
+        return True
+
+    def search(self, m_name: str) -> List[Medicine]:
+        """Medicines whose name contains the given text, best matches first"""
+        self._indexes()
+        return [self._by_id[m_id] for m_id in self.name_index.search(m_name)]
+
+    def columns(self) -> ColumnarInventory:
+        """Columnar view of the inventory, rebuilt only after changes"""
+        if self._columns is None:
+            self._columns = ColumnarInventory.from_medicines(self.medicines)
+        return self._columns
+
+    def expiring_by(self, date: datetime.date) -> List[Medicine]:
+        """Medicines expiring on or before a date, soonest first"""
+        self._indexes()
+        return [self._by_id[m_id] for _, m_id in self.expiry_index.expiring_by(date)]
+
 
 def get_medicine_type_name(m_type: int) -> str:
     """Get readable name for medicine type"""
     return "Tablet" if m_type == 1 else "Syrup"
 
 
-def add_stock() -> None:
+def check_medicine_dates(man_date: datetime.date, exp_date: datetime.date) -> None:
+    """Raise InventoryError unless the expiry date comes after the manufacturing date"""
+    if exp_date <= man_date:
+        raise InventoryError("EXPIRY DATE MUST BE AFTER MANUFACTURING DATE")
+
+
+def build_medicine(m_id: int, name: str, brand: str, man_date: datetime.date,
+                   exp_date: datetime.date, m_type: Any, price: Any, quantity: Any,
+                   allow_expired: bool = False, barcode: Any = "") -> Medicine:
+    """Validate the fields of a new medicine and build it, raising InventoryError on bad input"""
+    name, brand, barcode = str(name).strip(), str(brand).strip(), str(barcode or "").strip()
+    if not name:
+        raise InventoryError("MEDICINE NAME CANNOT BE EMPTY")
+    check_medicine_dates(man_date, exp_date)
+    if exp_date <= datetime.date.today() and not allow_expired:
+        raise InventoryError("THIS MEDICINE IS ALREADY EXPIRED")
+    # A JSON 1.9 would otherwise be cut down to 1 rather than refused
+    if any(isinstance(value, float) and not value.is_integer() for value in (m_type, quantity)):
+        raise InventoryError("TYPE AND QUANTITY MUST BE WHOLE NUMBERS")
+    try:
+        m_type, price, quantity = int(m_type), float(price), int(quantity)
+    except (TypeError, ValueError, OverflowError):
+        raise InventoryError("INVALID NUMERICAL INPUT")
+    if m_type not in [0, 1]:
+        raise InventoryError("INVALID TYPE. MUST BE 0 OR 1")
+    if not math.isfinite(price):
+        raise InventoryError("INVALID PRICE")
+    if price <= 0:
+        raise InventoryError("PRICE MUST BE POSITIVE")
+    if quantity <= 0:
+        raise InventoryError("QUANTITY MUST BE POSITIVE")
+    return Medicine(m_id, name, brand, man_date, exp_date, m_type, quantity, price, barcode)
+
+
+def medicine_to_dict(med: Medicine) -> Dict[str, Any]:
+    """JSON-friendly view of a medicine, with ISO dates"""
+    return {
+        'id': med.id,
+        'name': med.name,
+        'brand': med.brand,
+        'manufacturing_date': med.manufacturing_date.isoformat(),
+        'expiry_date': med.expiry_date.isoformat(),
+        'type': med.type,
+        'quantity': med.quantity,
+        'price': med.price,
+        'amount': med.amount,
+        'barcode': med.barcode,
+    }
+
+
+def add_stock(store: InventoryStore) -> None:
     """Add medicines to the database"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     # Generate new ID
-    m_id = max([med[0] for med in medicines], default=0) + 1
+    m_id = store.next_id()
     
     print('\n\n\t\t\t Medicine ID: ', m_id)
     m_name = input('\n\t\t\t Enter Medicine Name: ').strip()
@@ -131,6 +1423,15 @@ def add_stock() -> None:
         return
     
     m_brand = input('\n\t\t\t Enter Medicine Brand Name: ').strip()
+    lots = store.product_lots(m_name, m_brand)
+    if lots:
+        print(f"\n\t\t\t (Adding a new lot; {len(lots)} lot(s) of this medicine already in stock,"
+              f" {sum(lot.quantity for lot in lots)} units)")
+
+    # New lots of a product usually carry the same barcode as the last one
+    known = next((lot.barcode for lot in reversed(lots) if lot.barcode), "")
+    prompt = f"Enter for {known}" if known else "blank if none"
+    barcode = input(f'\n\t\t\t Scan or Enter Barcode ({prompt}): ').strip() or known
 
     # Manufacturing Date
     man_date = input('\n\t\t\t Enter Medicine Manufacturing Date (yyyy, mm, dd): ')
@@ -145,8 +1446,10 @@ def add_stock() -> None:
         exp_date = input('\n\t\t\t Enter Medicine Expiry Date (yyyy, mm, dd): ')
     
     # Validate expiry date is after manufacturing date
-    if parse_date(exp_date) <= parse_date(man_date):
-        print("\n\t\t\t ## EXPIRY DATE MUST BE AFTER MANUFACTURING DATE ##")
+    try:
+        check_medicine_dates(parse_date(man_date), parse_date(exp_date))
+    except InventoryError as e:
+        print(f"\n\t\t\t ## {e} ##")
         input("\n\t\t\t\t...:::::Press Enter Key:::::...")
         return
     
@@ -191,18 +1494,25 @@ def add_stock() -> None:
     amount = total_qty * price
     print(f"\n\t\t\t TOTAL AMOUNT: ₹{amount:.2f}")
 
-    medicines.append([m_id, m_name, m_brand, man_date, exp_date, 
-                     m_type, total_qty, price, amount])
+    # Expired stock was confirmed above
+    medicine = build_medicine(m_id, m_name, m_brand, parse_date(man_date), parse_date(exp_date),
+                              m_type, price, total_qty, allow_expired=True, barcode=barcode)
 
-    if save_medicines(medicines):
-        print("\n\t\t\t ## MEDICINE ADDED SUCCESSFULLY ## ")
+    try:
+        if store.add(medicine) and store.flush():
+            print("\n\t\t\t ## MEDICINE ADDED SUCCESSFULLY ## ")
+            if medicine.id != m_id:
+                print(f"\t\t\t Medicine ID: {medicine.id}")
+    except InventoryError as e:
+        print(f"\n\t\t\t ## {e} ##")
     
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def search_medicine() -> None:
+def search_medicine(store: InventoryStore) -> None:
     """Search for a medicine in the database"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -217,26 +1527,16 @@ def search_medicine() -> None:
         input("\n\t\t\t\t...:::::Press Enter Key:::::...")
         return
     
-    found = False
-
-    print(f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}{'QTY':<8}{'TYPE':<10}{'PRICE':<10}{'AMOUNT':<10}")
-    print('-' * 100)
-
-    for med in medicines:
-        if m_name.upper() in med[1].upper():
-            m_type_name = get_medicine_type_name(med[5])
-            print(f"{med[0]:<10}{med[1]:<20}{med[2]:<15}{med[4]:<15}{med[6]:<8}{m_type_name:<10}₹{med[7]:<9.2f}₹{med[8]:<9.2f}")
-            found = True
-
-    if not found:
+    if not page_rows(MEDICINE_HEADER, store.search(m_name), medicine_row):
         print("\n\t\t ## MEDICINE NOT FOUND ##")
 
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def view_all_medicines() -> None:
+def view_all_medicines(store: InventoryStore) -> None:
     """Display all medicines in the database"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -244,20 +1544,27 @@ def view_all_medicines() -> None:
         return
 
     print("\n\n\t#################### ALL MEDICINES ####################")
-    print(f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}{'QTY':<8}{'TYPE':<10}{'PRICE':<10}{'AMOUNT':<10}")
-    print('-' * 100)
+    order = input(f"\n\t\t SORT BY ({'/'.join(VIEW_ORDERS)}) [id]: ").strip().lower() or "id"
+    show = input(f"\n\t\t SHOW ({'/'.join(VIEW_FILTERS)}) [all]: ").strip().lower() or "all"
+    if order not in VIEW_ORDERS or show not in VIEW_FILTERS:
+        print("\n\t\t ## INVALID INPUT ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
 
-    for med in medicines:
-        m_type_name = get_medicine_type_name(med[5])
-        print(f"{med[0]:<10}{med[1]:<20}{med[2]:<15}{med[4]:<15}{med[6]:<8}{m_type_name:<10}₹{med[7]:<9.2f}₹{med[8]:<9.2f}")
+    key, descending = VIEW_ORDERS[order]
+    rows = iter_sorted(medicines, key, descending, VIEW_FILTERS[show])
+    if not page_rows(MEDICINE_HEADER, rows, medicine_row):
+        print(f"\n\t\t ## NO {show.upper()} MEDICINES ##")
 
     print(f"\n\t\t Total Medicines: {len(medicines)}")
+    print(f"\t\t Total Stock Value: ₹{store.columns().value():.2f}")
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def update_stock() -> None:
+def update_stock(store: InventoryStore) -> None:
     """Update a medicine's stock quantity"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -277,31 +1584,26 @@ def update_stock() -> None:
     print(f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'EXPIRY DATE':<15}{'QTY':<8}{'TYPE':<10}{'PRICE':<10}{'AMOUNT':<10}")
     print('-' * 95)
 
-    for i, med in enumerate(medicines):
-        if m_name.upper() in med[1].upper():
-            m_type_name = get_medicine_type_name(med[5])
-            print(f"{med[0]:<10}{med[1]:<20}{med[4]:<15}{med[6]:<8}{m_type_name:<10}₹{med[7]:<9.2f}₹{med[8]:<9.2f}")
-            
-            try:
-                new_q = int(input("\nEnter quantity to add (negative to reduce): "))
-                new_total = medicines[i][6] + new_q
-                
-                if new_total < 0:
-                    print("\n\t\t ## CANNOT REDUCE BELOW ZERO ##")
-                else:
-                    medicines[i][6] = new_total
-                    medicines[i][8] = medicines[i][6] * medicines[i][7]
-                    
-                    if save_medicines(medicines):
-                        print("\n\t\t ## STOCK UPDATED SUCCESSFULLY ##")
-                        print(f"\t\t New Quantity: {medicines[i][6]}")
-                        print(f"\t\t New Amount: ₹{medicines[i][8]:.2f}")
-                    
-            except ValueError:
-                print("\n\t\t ## INVALID INPUT ##")
-            
-            found = True
-            break
+    for med in store.search(m_name)[:1]:
+        m_type_name = get_medicine_type_name(med.type)
+        print(f"{med.id:<10}{med.name:<20}{format_date(med.expiry_date):<15}{med.quantity:<8}{m_type_name:<10}₹{med.price:<9.2f}₹{med.amount:<9.2f}")
+        
+        try:
+            new_q = int(input("\nEnter quantity to add (negative to reduce): "))
+            # Applied to the stock as saved now, which another terminal may
+            # have changed since it was shown
+            med = store.adjust_stock(med.id, new_q)
+            if not store.flush():
+                raise InventoryError("STOCK CHANGED BUT NOT YET SAVED")
+            print("\n\t\t ## STOCK UPDATED SUCCESSFULLY ##")
+            print(f"\t\t New Quantity: {med.quantity}")
+            print(f"\t\t New Amount: ₹{med.amount:.2f}")
+        except ValueError:
+            print("\n\t\t ## INVALID INPUT ##")
+        except InventoryError as e:
+            print(f"\n\t\t ## {e} ##")
+        
+        found = True
 
     if not found:
         print("\n\t\t ## MEDICINE NOT FOUND ##")
@@ -309,9 +1611,10 @@ def update_stock() -> None:
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def delete_medicine() -> None:
+def delete_medicine(store: InventoryStore) -> None:
     """Delete a medicine from the records"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -331,21 +1634,18 @@ def delete_medicine() -> None:
     print(f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'EXPIRY DATE':<15}{'QTY':<8}{'TYPE':<10}{'PRICE':<10}{'AMOUNT':<10}")
     print('-' * 95)
 
-    for i, med in enumerate(medicines):
-        if m_name.upper() in med[1].upper():
-            m_type_name = get_medicine_type_name(med[5])
-            print(f"{med[0]:<10}{med[1]:<20}{med[4]:<15}{med[6]:<8}{m_type_name:<10}₹{med[7]:<9.2f}₹{med[8]:<9.2f}")
-            
-            ans = input(f"\nAre you sure you want to delete '{med[1]}'? (y/n): ")
-            if ans.lower() == 'y':
-                medicines.pop(i)
-                if save_medicines(medicines):
-                    print("\n\t\t ## MEDICINE DELETED SUCCESSFULLY ##")
-            else:
-                print("\n\t\t ## DELETION CANCELLED ##")
-            
-            found = True
-            break
+    for med in store.search(m_name)[:1]:
+        m_type_name = get_medicine_type_name(med.type)
+        print(f"{med.id:<10}{med.name:<20}{format_date(med.expiry_date):<15}{med.quantity:<8}{m_type_name:<10}₹{med.price:<9.2f}₹{med.amount:<9.2f}")
+        
+        ans = input(f"\nAre you sure you want to delete '{med.name}'? (y/n): ")
+        if ans.lower() == 'y':
+            if store.delete(med.id) and store.flush():
+                print("\n\t\t ## MEDICINE DELETED SUCCESSFULLY ##")
+        else:
+            print("\n\t\t ## DELETION CANCELLED ##")
+        
+        found = True
 
     if not found:
         print("\n\t\t ## MEDICINE NOT FOUND ##")
@@ -353,35 +1653,2152 @@ def delete_medicine() -> None:
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def get_medicine_by_name(medicines: List[List[Any]], m_name: str) -> Optional[Dict[str, Any]]:
-    """Get medicine details by name"""
-    for med in medicines:
-        if m_name.lower() in med[1].lower():
-            return {
-                'id': med[0],
-                'name': med[1],
-                'brand': med[2],
-                'quantity': med[6],
-                'price': med[7],
-                'type': med[5]
-            }
-    return None
+def get_medicine_by_name(store: InventoryStore, m_name: str) -> Optional[Dict[str, Any]]:
+    """Get details of the best-matching medicine by name, with the stock of all its lots
 
+    A scanned barcode is looked up directly, without matching names."""
+    med = store.find_barcode(m_name)
+    if med is None:
+        matches = store.search(m_name)
+        if not matches:
+            return None
+        med = matches[0]
+    medicine = medicine_to_dict(med)
+    medicine['available'] = store.available(med.id)
+    return medicine
 
-def record_transaction(filename: str, med_name: str, qty: int, amount: float) -> bool:
-    """Record a transaction (sale or return)"""
-    try:
-        with open(filename, "ab") as f:
-            pickle.dump([datetime.date.today(), med_name, qty, amount], f)
-        return True
-    except Exception as e:
-        print(f"\n\t\t ## ERROR RECORDING TRANSACTION: {e} ##")
-        return False
 
+SALES_FILE = "sales.dat"
+RETURNS_FILE = "return.dat"
 
-def sell_medicine() -> None:
-    """Sell medicine and update inventory"""
-    medicines = load_medicines()
+
+def ledger_frame(date: datetime.date, med_name: str, qty: int, amount: float,
+                 reason: str = "", lot: Optional[int] = None) -> List[Any]:
+    """Ledger entry: [date, name, qty, amount], then the return reason and the lot ID if any"""
+    frame = [date, med_name, qty, amount]
+    if lot is not None:
+        frame.extend([reason, lot])
+    elif reason:
+        frame.append(reason)
+    return frame
+
+
+# Sidecar index entry per ledger frame: offset, length, date ordinal, name hash
+LEDGER_INDEX_ENTRY = struct.Struct("<QIiI")
+
+
+def ledger_index_path(filename: str) -> str:
+    """Path of the offset index kept next to a ledger file"""
+    return f"{filename}.idx"
+
+
+def ledger_name_hash(med_name: str) -> int:
+    """Hash of a medicine name as stored in the ledger index"""
+    return zlib.crc32(med_name.lower().encode("utf-8"))
+
+
+def iter_ledger(filename: str, start: int = 0) -> Iterator[Tuple[int, int, List[Any]]]:
+    """Stream (offset, end, frame) triples from a ledger without loading it whole"""
+    if not os.path.exists(filename):
+        return
+    with open(filename, "rb") as f:
+        f.seek(start)
+        while True:
+            offset = f.tell()
+            try:
+                frame = pickle.load(f)
+            except EOFError:
+                return
+            except Exception:
+                # Torn frame from an interrupted write; nothing after it is readable
+                return
+            yield offset, f.tell(), frame
+
+
+def read_ledger_frame(f, offset: int) -> List[Any]:
+    """Load the frame at a known offset of an open ledger file"""
+    f.seek(offset)
+    return pickle.load(f)
+
+
+def _indexed_end(idx) -> int:
+    """Ledger offset just past the last frame an open index file covers"""
+    idx.seek(0, os.SEEK_END)
+    if idx.tell() < LEDGER_INDEX_ENTRY.size:
+        return 0
+    idx.seek(-LEDGER_INDEX_ENTRY.size, os.SEEK_END)
+    offset, length, _, _ = LEDGER_INDEX_ENTRY.unpack(idx.read(LEDGER_INDEX_ENTRY.size))
+    return offset + length
+
+
+def _index_entry(offset: int, length: int, frame: List[Any]) -> bytes:
+    return LEDGER_INDEX_ENTRY.pack(offset, length, frame[0].toordinal(), 
+                                   ledger_name_hash(frame[1]))
+
+
+def _append_index(idx, filename: str, start: int, stop: int) -> None:
+    """Index the ledger frames between two offsets onto an open index file"""
+    entries = []
+    with open(filename, "rb") as f:
+        f.seek(start)
+        while f.tell() < stop:
+            offset = f.tell()
+            try:
+                frame = pickle.load(f)
+            except Exception:
+                # Unreadable (torn) frame; leave the rest unindexed
+                break
+            entries.append(_index_entry(offset, f.tell() - offset, frame))
+    idx.write(b"".join(entries))
+
+
+def update_ledger_index(filename: str, stop: Optional[int] = None) -> None:
+    """Index any ledger frames appended since the index was last written"""
+    with open(ledger_index_path(filename), "ab+") as idx:
+        # Readers catch up without the inventory lock, so every append to
+        # the index is serialized on the index file itself
+        lock_file(idx)
+        try:
+            start = _indexed_end(idx)
+            if stop is None:
+                stop = os.path.getsize(filename) if os.path.exists(filename) else 0
+            if start < stop:
+                _append_index(idx, filename, start, stop)
+        finally:
+            unlock_file(idx)
+
+
+def _read_index(filename: str) -> bytes:
+    update_ledger_index(filename)
+    with open(ledger_index_path(filename), "rb") as idx:
+        return idx.read()
+
+
+def ledger_between(filename: str, start_date: datetime.date, 
+                   end_date: datetime.date) -> Iterator[List[Any]]:
+    """Stream the frames dated from start_date to end_date inclusive"""
+    index = _read_index(filename)
+    count = len(index) // LEDGER_INDEX_ENTRY.size
+    first, last = start_date.toordinal(), end_date.toordinal()
+
+    # Frames are appended in date order, so the index is sorted by date
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if LEDGER_INDEX_ENTRY.unpack_from(index, mid * LEDGER_INDEX_ENTRY.size)[2] < first:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    with open(filename, "rb") as f:
+        for i in range(lo, count):
+            offset, _, ordinal, _ = LEDGER_INDEX_ENTRY.unpack_from(index, i * LEDGER_INDEX_ENTRY.size)
+            if ordinal > last:
+                break
+            yield read_ledger_frame(f, offset)
+
+
+def ledger_for_medicine(filename: str, med_name: str) -> Iterator[List[Any]]:
+    """Stream the frames recorded for one medicine (by exact name, any case)"""
+    index = _read_index(filename)
+    wanted = ledger_name_hash(med_name)
+    with open(filename, "rb") as f:
+        for offset, _, _, name_hash in LEDGER_INDEX_ENTRY.iter_unpack(index):
+            if name_hash != wanted:
+                continue
+            frame = read_ledger_frame(f, offset)
+            # Rule out hash collisions
+            if frame[1].lower() == med_name.lower():
+                yield frame
+
+
+AGGREGATES_FILE = "sales_summary.dat"
+# Saved aggregates of another layout are recounted from the ledgers
+AGGREGATES_SCHEMA = 2
+# Sales velocity is averaged over this many days
+VELOCITY_DAYS = 30
+
+
+class SalesAggregates:
+    """Running sales and returns totals kept in step with the ledgers"""
+    _FIELDS = ("daily_revenue", "medicine_units", "medicine_revenue", 
+               "return_units", "return_amounts", "recent_units", "offsets")
+
+    def __init__(self, backend: Optional['StorageBackend']):
+        self.backend = backend
+        self.daily_revenue: Dict[int, float] = {}
+        self.medicine_units: Dict[str, int] = {}
+        self.medicine_revenue: Dict[str, float] = {}
+        self.return_units: Dict[str, int] = {}
+        self.return_amounts: Dict[str, float] = {}
+        # (day ordinal, lot ID) -> units sold, for the last VELOCITY_DAYS days
+        self.recent_units: Dict[Tuple[int, int], int] = {}
+        # Ledger position up to which each ledger has been counted
+        self.offsets: Dict[str, int] = {SALES_FILE: 0, RETURNS_FILE: 0}
+
+    def _add(self, ledger: str, frame: List[Any]) -> None:
+        """Count one ledger frame"""
+        qty, amount = frame[2], frame[3]
+        if ledger == SALES_FILE:
+            day = frame[0].toordinal()
+            self.daily_revenue[day] = self.daily_revenue.get(day, 0.0) + amount
+            self.medicine_units[frame[1]] = self.medicine_units.get(frame[1], 0) + qty
+            self.medicine_revenue[frame[1]] = self.medicine_revenue.get(frame[1], 0.0) + amount
+            # Sales recorded before lots were kept cannot tell one brand from another
+            if len(frame) > 5 and frame[5] is not None:
+                recent = (day, frame[5])
+                self.recent_units[recent] = self.recent_units.get(recent, 0) + qty
+        else:
+            # Returns recorded before reasons were kept count as "unspecified"
+            reason = (frame[4] if len(frame) > 4 and frame[4] else "unspecified").lower()
+            self.return_units[reason] = self.return_units.get(reason, 0) + qty
+            self.return_amounts[reason] = self.return_amounts.get(reason, 0.0) + amount
+
+    def apply(self, ledger: str, offset: int, end: int, frame: List[Any]) -> None:
+        """Count a frame just written at offset..end of a ledger"""
+        if offset > self.offsets[ledger]:
+            # Another terminal appended in the meantime; count its frames first
+            self.catch_up(ledger, stop=offset)
+        if offset == self.offsets[ledger]:
+            self._add(ledger, frame)
+            self.offsets[ledger] = end
+
+    def catch_up(self, ledger: Optional[str] = None, stop: Optional[int] = None) -> None:
+        """Count ledger frames appended since the aggregates were last updated"""
+        for name in ([ledger] if ledger else [SALES_FILE, RETURNS_FILE]):
+            for offset, end, frame in self.backend.iter_transactions(name, self.offsets[name]):
+                if stop is not None and offset >= stop:
+                    break
+                self._add(name, frame)
+                self.offsets[name] = end
+
+    @classmethod
+    def load(cls, backend: 'StorageBackend') -> 'SalesAggregates':
+        """Load the saved aggregates and count anything newer in the ledgers"""
+        aggregates = cls(backend)
+        path = backend.path(AGGREGATES_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    saved = pickle.load(f)
+                # Ledger positions mean different things in each backend
+                if saved.get("backend") == backend.name and saved.get("schema") == AGGREGATES_SCHEMA:
+                    for field in cls._FIELDS:
+                        setattr(aggregates, field, saved[field])
+            except Exception:
+                aggregates = cls(backend)
+        aggregates.catch_up()
+        return aggregates
+
+    @classmethod
+    def rebuild(cls, backend: 'StorageBackend') -> 'SalesAggregates':
+        """Recount everything from the ledgers, e.g. to verify the saved totals"""
+        aggregates = cls(backend)
+        aggregates.catch_up()
+        return aggregates
+
+    def velocity(self, lot_ids: Iterable[int], days: int = 0) -> float:
+        """Average units sold per day from these lots over the last days (VELOCITY_DAYS by default)"""
+        days = days or VELOCITY_DAYS
+        today = datetime.date.today().toordinal()
+        return sum(self.recent_units.get((day, lot_id), 0) for lot_id in lot_ids
+                   for day in range(today - days + 1, today + 1)) / days
+
+    def save(self) -> bool:
+        """Save the aggregates to file"""
+        oldest = datetime.date.today().toordinal() - VELOCITY_DAYS
+        self.recent_units = {key: units for key, units in self.recent_units.items() if key[0] > oldest}
+        saved = {field: getattr(self, field) for field in self._FIELDS}
+        saved["backend"] = self.backend.name
+        saved["schema"] = AGGREGATES_SCHEMA
+        path = self.backend.path(AGGREGATES_FILE)
+        try:
+            # Written aside and swapped in, so a crash never leaves half a summary
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{path}.tmp", path)
+            fsync_directory(path)
+            return True
+        except Exception as e:
+            print(f"\n\t\t ## ERROR SAVING SALES SUMMARY: {e} ##")
+            return False
+
+    def revenue_between(self, start_date: datetime.date, end_date: datetime.date) -> float:
+        """Sales revenue from start_date to end_date inclusive"""
+        return sum(self.daily_revenue.get(day, 0.0) 
+                   for day in range(start_date.toordinal(), end_date.toordinal() + 1))
+
+    def top_sellers(self, count: int = 10) -> List[Tuple[str, int, float]]:
+        """(name, units, revenue) for the best-selling medicines by revenue"""
+        names = sorted(self.medicine_revenue, key=self.medicine_revenue.get, reverse=True)
+        return [(name, self.medicine_units[name], self.medicine_revenue[name]) 
+                for name in names[:count]]
+
+    def totals(self) -> Dict[str, Dict[Any, Any]]:
+        """The running totals without ledger positions, to combine with other stores'"""
+        return {field: getattr(self, field) for field in self._FIELDS if field != "offsets"}
+
+    @classmethod
+    def combined(cls, parts: Iterable[Dict[str, Dict[Any, Any]]]) -> 'SalesAggregates':
+        """Sum of several stores' totals(), for reporting only (it belongs to no backend)"""
+        aggregates = cls(None)
+        for part in parts:
+            for field, values in part.items():
+                total = getattr(aggregates, field)
+                for key, value in values.items():
+                    total[key] = total.get(key, 0) + value
+        return aggregates
+
+
+REORDER_FILE = "reorder_levels.dat"
+# A reorder is assumed to take this many days to arrive
+REORDER_LEAD_DAYS = 7
+
+
+class ReorderQueue:
+    """Products below their reorder level, most urgent first, updated as stock changes"""
+    def __init__(self, backend: 'StorageBackend'):
+        self.backend = backend
+        self.levels: Dict[Tuple[str, str], int] = {}
+        self._levels_stamp: Optional[Tuple[int, int]] = None
+        # Max-heap of (-urgency, product) with lazy deletion: an entry is live
+        # only while it matches the product's current urgency
+        self._heap: List[Tuple[float, Tuple[str, str]]] = []
+        self._urgency: Dict[Tuple[str, str], float] = {}
+        self.built_on: Optional[datetime.date] = None
+
+    @staticmethod
+    def urgency(stock: int, level: int, velocity: float) -> float:
+        """Units short of the reorder level once the lead time's expected sales are made"""
+        return level - stock + velocity * REORDER_LEAD_DAYS
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.backend.path(REORDER_FILE))
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def load_levels(self) -> bool:
+        """Reload the reorder levels if another terminal changed them"""
+        stamp = self._stamp()
+        if stamp == self._levels_stamp:
+            return False
+        try:
+            with open(self.backend.path(REORDER_FILE), "rb") as f:
+                self.levels = pickle.load(f)
+        except FileNotFoundError:
+            self.levels = {}
+        except Exception:
+            print("\n\t\t ## ERROR READING REORDER LEVELS ##")
+            self.levels = {}
+        self._levels_stamp = stamp
+        return True
+
+    def save_levels(self) -> bool:
+        """Save the reorder levels to file"""
+        path = self.backend.path(REORDER_FILE)
+        try:
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(self.levels, f)
+            os.replace(f"{path}.tmp", path)
+            self._levels_stamp = self._stamp()
+            return True
+        except Exception as e:
+            print(f"\n\t\t ## ERROR SAVING REORDER LEVELS: {e} ##")
+            return False
+
+    def update(self, key: Tuple[str, str], stock: int, velocity: float) -> None:
+        """Re-rank one product after its stock or sales changed, in O(log n)"""
+        level = self.levels.get(key)
+        if level is None or stock >= level:
+            self._urgency.pop(key, None)
+            return
+        urgency = self.urgency(stock, level, velocity)
+        if self._urgency.get(key) == urgency:
+            return
+        self._urgency[key] = urgency
+        heapq.heappush(self._heap, (-urgency, key))
+        if len(self._heap) > 2 * len(self._urgency) + 64:
+            # Mostly stale entries: drop them in one pass
+            self._heap = [(-u, k) for k, u in self._urgency.items()]
+            heapq.heapify(self._heap)
+
+    def rebuild(self, stock: Callable[[Tuple[str, str]], int], 
+                velocity: Callable[[Tuple[str, str]], float]) -> None:
+        """Rank every product that has a reorder level"""
+        self._urgency = {}
+        for key, level in self.levels.items():
+            current = stock(key)
+            if current < level:
+                self._urgency[key] = self.urgency(current, level, velocity(key))
+        self._heap = [(-u, k) for k, u in self._urgency.items()]
+        heapq.heapify(self._heap)
+        self.built_on = datetime.date.today()
+
+    def top(self, count: int) -> List[Tuple[Tuple[str, str], float]]:
+        """The count most urgent products, without disturbing the queue"""
+        found, seen = [], set()
+        while self._heap and len(found) < count:
+            urgency, key = heapq.heappop(self._heap)
+            if self._urgency.get(key) == -urgency and key not in seen:
+                seen.add(key)
+                found.append((urgency, key))
+        for entry in found:
+            heapq.heappush(self._heap, entry)
+        return [(key, -urgency) for urgency, key in found]
+
+
+def write_ledger_frames(filename: str, frames: List[List[Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+    """Append frames to a ledger in one write; returns its old size and each frame's span"""
+    blobs = [pickle.dumps(frame) for frame in frames]
+    with open(filename, "ab") as f:
+        start = f.tell()
+        f.write(b"".join(blobs))
+    if METRICS.enabled:
+        METRICS.io("bytes_written", filename, sum(map(len, blobs)))
+    spans = []
+    offset = start
+    for blob in blobs:
+        spans.append((offset, offset + len(blob)))
+        offset += len(blob)
+    return start, spans
+
+
+def truncate_ledger(filename: str, size: int) -> None:
+    """Cut a ledger back to an earlier size, undoing frames just written"""
+    try:
+        with open(filename, "r+b") as f:
+            f.truncate(size)
+        trim_ledger_index(filename, size)
+    except Exception as e:
+        print(f"\n\t\t ## ERROR ROLLING BACK TRANSACTION: {e} ##")
+
+
+def trim_ledger_index(filename: str, size: int) -> None:
+    """Drop the index entries of frames at or past a ledger size"""
+    if not os.path.exists(ledger_index_path(filename)):
+        return
+    entry = LEDGER_INDEX_ENTRY.size
+    with open(ledger_index_path(filename), "r+b") as idx:
+        # Entries are in offset order; find the first one past the cut
+        lo, hi = 0, idx.seek(0, os.SEEK_END) // entry
+        while lo < hi:
+            mid = (lo + hi) // 2
+            idx.seek(mid * entry)
+            if LEDGER_INDEX_ENTRY.unpack(idx.read(entry))[0] < size:
+                lo = mid + 1
+            else:
+                hi = mid
+        idx.truncate(lo * entry)
+
+
+def index_ledger_frames(filename: str, frames: List[List[Any]], 
+                        spans: List[Tuple[int, int]]) -> None:
+    """Add frames just written to a ledger to its offset index"""
+    try:
+        with open(ledger_index_path(filename), "ab+") as idx:
+            lock_file(idx)
+            try:
+                if _indexed_end(idx) < spans[0][0]:
+                    # The index fell behind (older ledger or a failed write); catch up
+                    _append_index(idx, filename, _indexed_end(idx), spans[0][0])
+                # A reader may have indexed these frames already
+                indexed = _indexed_end(idx)
+                entries = b"".join(_index_entry(offset, end - offset, frame)
+                                   for frame, (offset, end) in zip(frames, spans) if offset >= indexed)
+                idx.write(entries)
+            finally:
+                unlock_file(idx)
+        if METRICS.enabled:
+            METRICS.io("bytes_written", ledger_index_path(filename), len(entries))
+    except Exception as e:
+        # The ledger itself is intact; the next query indexes whatever the
+        # index is missing from its end
+        print(f"\n\t\t ## ERROR INDEXING TRANSACTION: {e} ##")
+
+
+LOCK_FILE = "Medicines.lock"
+
+
+def lock_file(f) -> None:
+    """Block until this process holds an exclusive lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ten seconds; keep waiting
+            pass
+
+
+def unlock_file(f) -> None:
+    """Release a lock taken with lock_file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class StorageBackend:
+    """Where the inventory and the sales/returns ledgers are persisted"""
+    name = ""
+
+    def __init__(self, directory: str = ".", read_only: bool = False):
+        self.directory = directory
+        # Read-only backends (for reports) never write: no recovery, upgrade or repair
+        self.read_only = read_only
+        self._lock_file = None
+        self._lock_depth = 0
+
+    def path(self, filename: str) -> str:
+        """Path of a data file belonging to this backend"""
+        return os.path.join(self.directory, filename)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the lock shared by every terminal using this data directory (re-entrant)"""
+        if self._lock_depth == 0:
+            self._lock_file = open(self.path(LOCK_FILE), "a+b")
+            lock_file(self._lock_file)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                unlock_file(self._lock_file)
+                self._lock_file.close()
+                self._lock_file = None
+
+    def signature(self) -> Any:
+        """Token that changes whenever another process changes the inventory"""
+        raise NotImplementedError
+
+    def inventory_changes(self, since: Any) -> Tuple[Any, Optional[Dict[int, Optional[Tuple[Any, ...]]]]]:
+        """A lasting, JSON-serializable mark of the inventory on disk, and the
+        records changed since an earlier mark (ID -> record, None once deleted)
+
+        The changes are None when they cannot be told from the mark, so
+        everything has to be read again."""
+        return None, None
+
+    def load(self) -> List[Medicine]:
+        """Load every medicine"""
+        raise NotImplementedError
+
+    def save_changes(self, medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]]) -> bool:
+        """Persist ("put" medicine / "delete" id) changes atomically
+
+        medicines is the whole inventory after the changes, or None from a
+        writer that keeps no copy; those never send more than
+        JOURNAL_BATCH_LIMIT changes at once."""
+        raise NotImplementedError
+
+    def save_all(self, medicines: List[Medicine], next_id: int = 0) -> bool:
+        """Replace the stored inventory with the given medicines
+
+        The ID counter never goes back; next_id carries one over from
+        another store (a conversion)."""
+        raise NotImplementedError
+
+    def next_id(self) -> int:
+        """ID after the highest ever saved, deleted or not, as of the last load or save"""
+        raise NotImplementedError
+
+    # Whether saved changes may still be in memory until flush()
+    deferred = False
+
+    def sync(self) -> None:
+        """Force inventory and ledger writes made so far onto the disk"""
+
+    def flush(self) -> bool:
+        """Wait until every change saved so far is on disk"""
+        return True
+
+    def close(self) -> None:
+        """Finish any outstanding writes and release the files held open"""
+
+    def write_transactions(self, ledger: str, 
+                           frames: List[List[Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+        """Append frames to a ledger; returns its old end position and each frame's span"""
+        raise NotImplementedError
+
+    def rollback_transactions(self, ledger: str, start: int) -> None:
+        """Undo frames written to a ledger since the given end position"""
+        raise NotImplementedError
+
+    def ledger_end(self, ledger: str) -> int:
+        """Position just past the last frame written to a ledger"""
+        raise NotImplementedError
+
+    def frame_spans(self, start: int, frames: List[List[Any]]) -> List[Tuple[int, int]]:
+        """Spans the frames would occupy if written to a ledger ending at start"""
+        raise NotImplementedError
+
+    def index_transactions(self, ledger: str, frames: List[List[Any]], 
+                           spans: List[Tuple[int, int]]) -> None:
+        """Index frames once their write is final"""
+
+    def iter_transactions(self, ledger: str, 
+                          start: int = 0) -> Iterator[Tuple[int, int, List[Any]]]:
+        """Stream (start, end, frame) triples from a ledger position onwards"""
+        raise NotImplementedError
+
+    def transactions_between(self, ledger: str, start_date: datetime.date,
+                             end_date: datetime.date) -> Iterator[List[Any]]:
+        """Stream the frames dated from start_date to end_date inclusive"""
+        raise NotImplementedError
+
+    def transactions_for_medicine(self, ledger: str, med_name: str) -> Iterator[List[Any]]:
+        """Stream the frames recorded for one medicine"""
+        raise NotImplementedError
+
+
+class PickleBackend(StorageBackend):
+    """Medicines.dat snapshot plus journal, and pickle-framed ledger files"""
+    name = "pickle"
+
+    def signature(self) -> Tuple[Any, ...]:
+        """Identify the on-disk state by mtime, size and inode of each file"""
+        signature = []
+        for path in (self.path(MEDICINES_FILE), self.path(JOURNAL_FILE)):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def inventory_changes(self, since: Any) -> Tuple[Any, Optional[Dict[int, Optional[Tuple[Any, ...]]]]]:
+        # The snapshot file only changes by being rewritten whole, and the
+        # journal after it only grows, so an unchanged snapshot means the
+        # changes are just the journal entries past the marked offset
+        snapshot, journal = self.signature()
+        mark = [list(snapshot) if snapshot else None, journal[1] if journal else 0]
+        if not since or since[0] != mark[0] or since[1] > mark[1]:
+            return mark, None
+        entries = read_journal(self.path(JOURNAL_FILE), since[1], repair=not self.read_only)
+        changes: Dict[int, Optional[Tuple[Any, ...]]] = {}
+        pending = list(reversed(entries))
+        while pending:
+            op, payload = pending.pop()
+            if op == "put":
+                record = upgrade_record(payload).to_record()
+                changes[record[0]] = record
+            elif op == "delete":
+                changes[payload] = None
+            elif op == "batch":
+                pending.extend(reversed(payload))
+        return mark, changes
+
+    def __init__(self, directory: str = ".", read_only: bool = False):
+        super().__init__(directory, read_only)
+        # (snapshot signature, journal bytes read, records) from the last load
+        self._loaded: Optional[Tuple[Any, int, List[Tuple[Any, ...]]]] = None
+        self._next_id = 0
+
+    def load(self) -> List[Medicine]:
+        path, journal_path = self.path(MEDICINES_FILE), self.path(JOURNAL_FILE)
+        snapshot, journal = self.signature()
+        loaded = self._loaded
+        if loaded and loaded[0] == snapshot and journal and loaded[1] <= journal[1]:
+            # Same snapshot as last time: replay only what other terminals
+            # appended to the journal since
+            entries = read_journal(journal_path, loaded[1], repair=not self.read_only)
+            medicines = apply_journal([Medicine.from_record(record) for record in loaded[2]], entries)
+            self._next_id = max(self._next_id, journal_next_id(entries))
+        else:
+            medicines, self._next_id = load_inventory(path, journal_path, upgrade=not self.read_only)
+        snapshot, journal = self.signature()
+        self._loaded = (snapshot, journal[1] if journal else 0, 
+                        [med.to_record() for med in medicines])
+        return medicines
+
+    def save_changes(self, medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]]) -> bool:
+        self._next_id = max([self._next_id] + [(payload.id if op == "put" else payload) + 1
+                                               for op, payload in changes])
+        return save_changes(medicines, changes, self.path(MEDICINES_FILE), 
+                            self.path(JOURNAL_FILE), self._next_id)
+
+    def save_all(self, medicines: List[Medicine], next_id: int = 0) -> bool:
+        self._next_id = max(self._next_id, next_id)
+        return compact_journal(medicines, self.path(MEDICINES_FILE), self.path(JOURNAL_FILE),
+                               self._next_id)
+
+    def next_id(self) -> int:
+        return self._next_id
+
+    def sync(self) -> None:
+        # The snapshot is synced as it is written
+        for filename in (JOURNAL_FILE, SALES_FILE, RETURNS_FILE):
+            if os.path.exists(self.path(filename)):
+                fsync_path(self.path(filename))
+
+    def write_transactions(self, ledger: str, 
+                           frames: List[List[Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+        return write_ledger_frames(self.path(ledger), frames)
+
+    def rollback_transactions(self, ledger: str, start: int) -> None:
+        truncate_ledger(self.path(ledger), start)
+
+    def ledger_end(self, ledger: str) -> int:
+        path = self.path(ledger)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def frame_spans(self, start: int, frames: List[List[Any]]) -> List[Tuple[int, int]]:
+        spans = []
+        for frame in frames:
+            end = start + len(pickle.dumps(frame))
+            spans.append((start, end))
+            start = end
+        return spans
+
+    def index_transactions(self, ledger: str, frames: List[List[Any]], 
+                           spans: List[Tuple[int, int]]) -> None:
+        index_ledger_frames(self.path(ledger), frames, spans)
+
+    def iter_transactions(self, ledger: str, 
+                          start: int = 0) -> Iterator[Tuple[int, int, List[Any]]]:
+        return iter_ledger(self.path(ledger), start)
+
+    def transactions_between(self, ledger: str, start_date: datetime.date,
+                             end_date: datetime.date) -> Iterator[List[Any]]:
+        return ledger_between(self.path(ledger), start_date, end_date)
+
+    def transactions_for_medicine(self, ledger: str, med_name: str) -> Iterator[List[Any]]:
+        return ledger_for_medicine(self.path(ledger), med_name)
+
+
+SQLITE_FILE = "Medicines.db"
+SQLITE_LEDGER_TABLES = {SALES_FILE: "sales", RETURNS_FILE: "returns"}
+
+
+class SQLiteBackend(StorageBackend):
+    """Inventory and ledgers as tables in one SQLite database (WAL mode)"""
+    name = "sqlite"
+
+    def __init__(self, directory: str = ".", read_only: bool = False):
+        super().__init__(directory, read_only)
+        # Highest ID counter seen, to skip raising it when a save cannot
+        self._next_id = 0
+        if read_only:
+            # An existing database as it is, without creating or migrating tables
+            self.conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.path(SQLITE_FILE)))}?mode=ro",
+                                        uri=True, check_same_thread=False)
+            return
+        # Opened here but used from the API's handler thread; callers never share it at once
+        self.conn = sqlite3.connect(self.path(SQLITE_FILE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS medicines (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    manufacturing_date INTEGER NOT NULL,
+                    expiry_date INTEGER NOT NULL,
+                    type INTEGER NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    barcode TEXT
+                )""")
+            if "barcode" not in [row[1] for row in self.conn.execute("PRAGMA table_info(medicines)")]:
+                # Databases created before barcodes were recorded
+                self.conn.execute("ALTER TABLE medicines ADD COLUMN barcode TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS medicines_name "
+                              "ON medicines (name COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS medicines_expiry "
+                              "ON medicines (expiry_date)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS medicines_barcode "
+                              "ON medicines (barcode) WHERE barcode IS NOT NULL")
+            # The ID counter, kept apart so deleting the newest medicine does
+            # not hand its ID out again
+            self.conn.execute("CREATE TABLE IF NOT EXISTS counters "
+                              "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            for table in SQLITE_LEDGER_TABLES.values():
+                # Rows are only ever appended (or rolled back from the end), so
+                # ids stay contiguous and serve as ledger positions
+                self.conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        date INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        quantity INTEGER NOT NULL,
+                        amount REAL NOT NULL,
+                        reason TEXT NOT NULL DEFAULT '',
+                        lot INTEGER
+                    )""")
+                columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+                if "lot" not in columns:
+                    # Databases created before lots were tracked
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN lot INTEGER")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_date ON {table} (date)")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_name "
+                                  f"ON {table} (name COLLATE NOCASE)")
+
+    def signature(self) -> int:
+        # Changes only when another connection commits
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def inventory_changes(self, since: Any) -> Tuple[Any, Optional[Dict[int, Optional[Tuple[Any, ...]]]]]:
+        row = self.conn.execute("SELECT value FROM counters WHERE name = 'changes'").fetchone()
+        mark = row[0] if row else 0
+        return mark, ({} if since == mark else None)
+
+    def sync(self) -> None:
+        # With synchronous=NORMAL commits reach the WAL unsynced; a checkpoint syncs it
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def load(self) -> List[Medicine]:
+        rows = self.conn.execute("SELECT id, name, brand, manufacturing_date, expiry_date, "
+                                 "type, quantity, price, barcode FROM medicines ORDER BY id")
+        return [Medicine.from_record(row) for row in rows]
+
+    def next_id(self) -> int:
+        row = self.conn.execute("SELECT value FROM counters WHERE name = 'next_id'").fetchone()
+        self._next_id = max(self._next_id, row[0] if row else 0)
+        return self._next_id
+
+    def _raise_next_id(self, next_id: int) -> None:
+        """Move the stored ID counter up to next_id, in the current transaction"""
+        if next_id > self._next_id:
+            self.conn.execute("INSERT INTO counters VALUES ('next_id', ?) ON CONFLICT(name) "
+                              "DO UPDATE SET value = MAX(value, excluded.value)", (next_id,))
+
+    def _count_change(self) -> None:
+        """Count a save of the inventory, in the current transaction, so backups see it"""
+        self.conn.execute("INSERT INTO counters VALUES ('changes', 1) ON CONFLICT(name) "
+                          "DO UPDATE SET value = value + 1")
+
+    @staticmethod
+    def _row(med: Medicine) -> Tuple[Any, ...]:
+        return (med.id, med.name, med.brand, med.manufacturing_date.toordinal(),
+                med.expiry_date.toordinal(), med.type, med.quantity, med.price, med.barcode or None)
+
+    def _apply(self, changes: List[Tuple[str, Any]]) -> int:
+        """Write changes in the current transaction; returns the ID counter they need"""
+        next_id = 0
+        for op, payload in changes:
+            if op == "put":
+                self.conn.execute(
+                    "INSERT INTO medicines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name=excluded.name, brand=excluded.brand, "
+                    "manufacturing_date=excluded.manufacturing_date, "
+                    "expiry_date=excluded.expiry_date, type=excluded.type, "
+                    "quantity=excluded.quantity, price=excluded.price, barcode=excluded.barcode",
+                    self._row(payload))
+                next_id = max(next_id, payload.id + 1)
+            elif op == "delete":
+                self.conn.execute("DELETE FROM medicines WHERE id = ?", (payload,))
+        self._raise_next_id(next_id)
+        self._count_change()
+        return next_id
+
+    def save_changes(self, medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]]) -> bool:
+        try:
+            with self.conn:
+                next_id = self._apply(changes)
+            # Only once committed, as a rolled back raise must be tried again
+            self._next_id = max(self._next_id, next_id)
+            return True
+        except sqlite3.Error as e:
+            print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+            return False
+
+    def save_all(self, medicines: List[Medicine], next_id: int = 0) -> bool:
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM medicines")
+                self.conn.executemany("INSERT INTO medicines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                      map(self._row, medicines))
+                next_id = max(next_id, max((med.id for med in medicines), default=0) + 1)
+                self._raise_next_id(next_id)
+                self._count_change()
+            self._next_id = max(self._next_id, next_id)
+            return True
+        except sqlite3.Error as e:
+            print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+            return False
+
+    def write_transactions(self, ledger: str, 
+                           frames: List[List[Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        with self.conn:
+            start = self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            self.conn.executemany(
+                f"INSERT INTO {table} (id, date, name, quantity, amount, reason, lot) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((start + i + 1, frame[0].toordinal(), frame[1], frame[2], frame[3],
+                  frame[4] if len(frame) > 4 else "", frame[5] if len(frame) > 5 else None) 
+                 for i, frame in enumerate(frames)))
+        return start, [(start + i, start + i + 1) for i in range(len(frames))]
+
+    def rollback_transactions(self, ledger: str, start: int) -> None:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        try:
+            with self.conn:
+                self.conn.execute(f"DELETE FROM {table} WHERE id > ?", (start,))
+        except sqlite3.Error as e:
+            print(f"\n\t\t ## ERROR ROLLING BACK TRANSACTION: {e} ##")
+
+    def ledger_end(self, ledger: str) -> int:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        return self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+    def frame_spans(self, start: int, frames: List[List[Any]]) -> List[Tuple[int, int]]:
+        return [(start + i, start + i + 1) for i in range(len(frames))]
+
+    @staticmethod
+    def _frame(row: Tuple[Any, ...]) -> List[Any]:
+        return ledger_frame(datetime.date.fromordinal(row[0]), *row[1:])
+
+    def iter_transactions(self, ledger: str, 
+                          start: int = 0) -> Iterator[Tuple[int, int, List[Any]]]:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        rows = self.conn.execute(f"SELECT id, date, name, quantity, amount, reason, lot "
+                                 f"FROM {table} WHERE id > ? ORDER BY id", (start,))
+        for row in rows:
+            yield row[0] - 1, row[0], self._frame(row[1:])
+
+    def transactions_between(self, ledger: str, start_date: datetime.date,
+                             end_date: datetime.date) -> Iterator[List[Any]]:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        rows = self.conn.execute(f"SELECT date, name, quantity, amount, reason, lot FROM {table} "
+                                 f"WHERE date BETWEEN ? AND ? ORDER BY id",
+                                 (start_date.toordinal(), end_date.toordinal()))
+        return map(self._frame, rows)
+
+    def transactions_for_medicine(self, ledger: str, med_name: str) -> Iterator[List[Any]]:
+        table = SQLITE_LEDGER_TABLES[ledger]
+        rows = self.conn.execute(f"SELECT date, name, quantity, amount, reason, lot FROM {table} "
+                                 f"WHERE name = ? COLLATE NOCASE ORDER BY id", (med_name,))
+        return map(self._frame, rows)
+
+
+RECORD_FILE = "Medicines.rec"
+RECORD_MAGIC = b"MEDREC\x00\x02"
+# Header: magic, slot size, string heap generation, change counter, ID counter
+RECORD_HEADER = struct.Struct("<8sIIQQ")
+# Slot: live flag, id, quantity, price, type, manufacturing ordinal,
+# expiry ordinal, name offset, name length, brand offset, brand length,
+# barcode offset, barcode length
+RECORD_SLOT = struct.Struct("<BqqdbiiQIQIQI")
+RECORD_QUANTITY = struct.Struct("<q")
+RECORD_QUANTITY_OFFSET = 9
+RECORD_COUNTER_OFFSET = 16
+RECORD_NEXT_ID = struct.Struct("<Q")
+RECORD_NEXT_ID_OFFSET = 24
+# Version 1 files, from before barcodes and the ID counter, are upgraded on open
+RECORD_MAGIC_V1 = b"MEDREC\x00\x01"
+RECORD_HEADER_V1 = struct.Struct("<8sIIQ")
+RECORD_SLOT_V1 = struct.Struct("<BqqdbiiQIQI")
+
+
+class RecordFileBackend(PickleBackend):
+    """Fixed-width medicine slots in a memory-mapped file, slot N holding ID N + 1"""
+    name = "mmap"
+
+    def __init__(self, directory: str = ".", read_only: bool = False):
+        super().__init__(directory, read_only)
+        self._file = None
+        self._map = None
+        # id -> ((name, brand, barcode), their heap refs) for the live slots
+        self._strings: Dict[int, Tuple[Tuple[str, ...], Tuple[Tuple[int, int], ...]]] = {}
+        self._open()
+
+    # -- file management -------------------------------------------------
+
+    def _heap_path(self, generation: int) -> str:
+        return self.path(f"{RECORD_FILE}.heap{generation}")
+
+    def _open(self) -> None:
+        """Map the record file, creating an empty one if needed"""
+        path = self.path(RECORD_FILE)
+        if self.read_only:
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            if not os.path.exists(path):
+                self._write_fresh([], 0)
+            self._file = open(path, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._strings = {}
+        magic, slot_size = RECORD_HEADER_V1.unpack_from(self._map, 0)[:2]
+        if magic == RECORD_MAGIC_V1 and slot_size == RECORD_SLOT_V1.size:
+            if self.read_only:
+                raise InventoryError(f"{RECORD_FILE} IN {self.directory} NEEDS UPGRADING; OPEN THAT STORE FIRST")
+            self._upgrade_v1()
+        elif magic != RECORD_MAGIC or slot_size != RECORD_SLOT.size:
+            raise InventoryError(f"{RECORD_FILE} IS NOT A MEDICINE RECORD FILE")
+
+    def _upgrade_v1(self) -> None:
+        """Rewrite a version 1 record file in the current layout, keeping the original"""
+        path = self.path(RECORD_FILE)
+        with self.lock():
+            # Reopened under the lock, in case another terminal upgraded it meanwhile
+            self._map.close()
+            self._file.close()
+            with open(path, "rb") as f:
+                data = f.read()
+            _, _, generation, _ = RECORD_HEADER_V1.unpack_from(data, 0)
+            if data[:8] == RECORD_MAGIC_V1:
+                with open(self._heap_path(generation), "rb") as f:
+                    heap = f.read()
+                medicines, highest = [], 0
+                for slot in RECORD_SLOT_V1.iter_unpack(memoryview(data)[RECORD_HEADER_V1.size:]):
+                    # A deleted slot keeps its ID, which must not be handed out again
+                    highest = max(highest, slot[1])
+                    if slot[0]:
+                        medicines.append(Medicine(
+                            slot[1], heap[slot[7]:slot[7] + slot[8]].decode("utf-8"),
+                            heap[slot[9]:slot[9] + slot[10]].decode("utf-8"),
+                            datetime.date.fromordinal(slot[5]), datetime.date.fromordinal(slot[6]),
+                            slot[4], slot[2], slot[3]))
+                shutil.copyfile(path, f"{path}.v1")
+                # A new heap generation, as the original's heap stays with it
+                self._write_fresh(medicines, generation + 1, highest + 1)
+        self._open()
+
+    def _remap(self) -> None:
+        """Pick up a file grown or replaced by another process"""
+        st = os.stat(self.path(RECORD_FILE))
+        if st.st_ino != os.fstat(self._file.fileno()).st_ino:
+            self._map.close()
+            self._file.close()
+            self._open()
+        elif st.st_size != len(self._map):
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ if self.read_only else mmap.ACCESS_DEFAULT)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def _generation(self) -> int:
+        return RECORD_HEADER.unpack_from(self._map, 0)[2]
+
+    def _slot_count(self) -> int:
+        return (len(self._map) - RECORD_HEADER.size) // RECORD_SLOT.size
+
+    def _slot_offset(self, m_id: int) -> int:
+        return RECORD_HEADER.size + (m_id - 1) * RECORD_SLOT.size
+
+    def _ensure_slots(self, count: int) -> None:
+        """Grow the file (doubling) so it holds at least count slots"""
+        if count <= self._slot_count():
+            return
+        count = max(count, 2 * self._slot_count(), 64)
+        self._map.close()
+        self._file.truncate(RECORD_HEADER.size + count * RECORD_SLOT.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _bump_counter(self) -> None:
+        counter = RECORD_HEADER.unpack_from(self._map, 0)[3]
+        struct.pack_into("<Q", self._map, RECORD_COUNTER_OFFSET, counter + 1)
+
+    def _append_strings(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Append strings to the heap, returning their (offset, length) refs"""
+        blobs = [text.encode("utf-8") for text in texts]
+        with open(self._heap_path(self._generation()), "ab") as heap:
+            offset = heap.tell()
+            heap.write(b"".join(blobs))
+        if METRICS.enabled:
+            METRICS.io("bytes_written", f"{RECORD_FILE}.heap", sum(map(len, blobs)))
+        refs = []
+        for blob in blobs:
+            refs.append((offset, len(blob)))
+            offset += len(blob)
+        return refs
+
+    def _write_fresh(self, medicines: List[Medicine], generation: int, next_id: int = 0) -> None:
+        """Write a complete record file and heap, replacing any existing ones"""
+        heap = bytearray()
+        count = max((med.id for med in medicines), default=0)
+        next_id = max(next_id, count + 1)
+        slots = bytearray(count * RECORD_SLOT.size)
+        pack_into, size = RECORD_SLOT.pack_into, RECORD_SLOT.size
+        for med in medicines:
+            name, brand = med.name.encode("utf-8"), med.brand.encode("utf-8")
+            barcode = med.barcode.encode("utf-8")
+            name_at = len(heap)
+            heap += name
+            heap += brand
+            heap += barcode
+            pack_into(slots, (med.id - 1) * size, 1, med.id, med.quantity, med.price, med.type,
+                      med.manufacturing_date.toordinal(), med.expiry_date.toordinal(),
+                      name_at, len(name), name_at + len(name), len(brand),
+                      name_at + len(name) + len(brand), len(barcode))
+
+        with open(self._heap_path(generation), "wb") as f:
+            f.write(heap)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_path = self.path(f"{RECORD_FILE}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(RECORD_HEADER.pack(RECORD_MAGIC, RECORD_SLOT.size, generation, 0, next_id))
+            f.write(slots)
+            f.flush()
+            os.fsync(f.fileno())
+        # The new heap is complete before the record file that points into it
+        # replaces the old one, so a crash leaves one consistent pair
+        os.replace(tmp_path, self.path(RECORD_FILE))
+        if METRICS.enabled:
+            METRICS.io("bytes_written", f"{RECORD_FILE}.heap", len(heap))
+            METRICS.io("bytes_written", RECORD_FILE, RECORD_HEADER.size + len(slots))
+
+    @staticmethod
+    def _slot_values(med: Medicine, refs: Tuple[Tuple[int, int], ...]) -> Tuple[Any, ...]:
+        (name_at, name_len), (brand_at, brand_len), (barcode_at, barcode_len) = refs
+        return (1, med.id, med.quantity, med.price, med.type, 
+                med.manufacturing_date.toordinal(), med.expiry_date.toordinal(),
+                name_at, name_len, brand_at, brand_len, barcode_at, barcode_len)
+
+    # -- reads -----------------------------------------------------------
+
+    def signature(self) -> Tuple[int, ...]:
+        self._remap()
+        _, _, generation, counter, _ = RECORD_HEADER.unpack_from(self._map, 0)
+        return (generation, counter, len(self._map))
+
+    def inventory_changes(self, since: Any) -> Tuple[Any, Optional[Dict[int, Optional[Tuple[Any, ...]]]]]:
+        # The slots are changed in place, so only "nothing changed" can be told
+        mark = list(self.signature())
+        return mark, ({} if since == mark else None)
+
+    def next_id(self) -> int:
+        self._remap()
+        return RECORD_NEXT_ID.unpack_from(self._map, RECORD_NEXT_ID_OFFSET)[0]
+
+    def iter_slots(self) -> Iterator[Tuple[Any, ...]]:
+        """Stream the raw tuples of live slots straight from the mapping"""
+        self._remap()
+        for slot in RECORD_SLOT.iter_unpack(memoryview(self._map)[RECORD_HEADER.size:]):
+            if slot[0]:
+                yield slot
+
+    def quantity(self, m_id: int) -> Optional[int]:
+        """Read one medicine's stock straight from its slot"""
+        self._remap()
+        if not 0 < m_id <= self._slot_count():
+            return None
+        offset = self._slot_offset(m_id)
+        if not self._map[offset]:
+            return None
+        return RECORD_QUANTITY.unpack_from(self._map, offset + RECORD_QUANTITY_OFFSET)[0]
+
+    def load(self) -> List[Medicine]:
+        self._remap()
+        if not self.read_only:
+            self._replay_wal()
+        with open(self._heap_path(self._generation()), "rb") as f:
+            heap = f.read()
+        if METRICS.enabled:
+            METRICS.io("bytes_read", f"{RECORD_FILE}.heap", len(heap))
+            METRICS.io("bytes_read", RECORD_FILE, len(self._map))
+        medicines = []
+        self._strings = {}
+        for slot in self.iter_slots():
+            refs = ((slot[7], slot[8]), (slot[9], slot[10]), (slot[11], slot[12]))
+            texts = tuple(heap[at:at + length].decode("utf-8") for at, length in refs)
+            self._strings[slot[1]] = (texts, refs)
+            medicines.append(Medicine(slot[1], texts[0], texts[1], datetime.date.fromordinal(slot[5]),
+                                      datetime.date.fromordinal(slot[6]), slot[4], 
+                                      slot[2], slot[3], texts[2]))
+        return medicines
+
+    # -- writes ----------------------------------------------------------
+
+    def _read_strings(self, refs: Tuple[Tuple[int, int], ...]) -> Tuple[Tuple[str, ...], Tuple[Tuple[int, int], ...]]:
+        """A slot's name, brand and barcode read from the heap, in the _strings cache layout"""
+        texts = []
+        with open(self._heap_path(self._generation()), "rb") as heap:
+            for at, length in refs:
+                heap.seek(at)
+                texts.append(heap.read(length).decode("utf-8"))
+        return tuple(texts), refs
+
+    def _put(self, med: Medicine) -> None:
+        self._ensure_slots(med.id)
+        offset = self._slot_offset(med.id)
+        cached = self._strings.get(med.id)
+        if cached is None and self._map[offset]:
+            # Not loaded through this instance (a write-behind thread's): reuse
+            # the strings the slot already points at if they are unchanged
+            current = RECORD_SLOT.unpack_from(self._map, offset)
+            cached = self._read_strings(((current[7], current[8]), (current[9], current[10]),
+                                         (current[11], current[12])))
+            self._strings[med.id] = cached
+        texts = (med.name, med.brand, med.barcode)
+        if cached and cached[0] == texts:
+            refs = cached[1]
+        else:
+            refs = tuple(self._append_strings(list(texts)))
+            self._strings[med.id] = (texts, refs)
+
+        values = self._slot_values(med, refs)
+        current = RECORD_SLOT.unpack_from(self._map, offset)
+        if current[:2] + current[3:] == values[:2] + values[3:]:
+            # Only the stock changed (a sale, return or update): 8 bytes in place
+            RECORD_QUANTITY.pack_into(self._map, offset + RECORD_QUANTITY_OFFSET, med.quantity)
+            written = RECORD_QUANTITY.size
+        elif current[0]:
+            RECORD_SLOT.pack_into(self._map, offset, *values)
+            written = RECORD_SLOT.size
+        else:
+            # Fill a free slot completely before marking it live
+            RECORD_SLOT.pack_into(self._map, offset, 0, *values[1:])
+            self._map[offset] = 1
+            written = RECORD_SLOT.size
+            if med.id >= RECORD_NEXT_ID.unpack_from(self._map, RECORD_NEXT_ID_OFFSET)[0]:
+                RECORD_NEXT_ID.pack_into(self._map, RECORD_NEXT_ID_OFFSET, med.id + 1)
+        if METRICS.enabled:
+            METRICS.io("bytes_written", RECORD_FILE, written)
+
+    def _delete(self, m_id: int) -> None:
+        if 0 < m_id <= self._slot_count():
+            self._map[self._slot_offset(m_id)] = 0
+        self._strings.pop(m_id, None)
+
+    def _apply(self, changes: List[Tuple[str, Any]]) -> None:
+        for op, payload in changes:
+            if op == "put":
+                self._put(payload)
+            elif op == "delete":
+                self._delete(payload)
+        self._bump_counter()
+
+    def _replay_wal(self) -> None:
+        """Finish a multi-record write that was interrupted part way"""
+        wal_path = self.path(f"{RECORD_FILE}.wal")
+        if not os.path.exists(wal_path):
+            return
+        # Only a complete batch frame counts as committed; a torn one was
+        # never applied to the slots and is dropped whole
+        changes = [(op, upgrade_record(payload) if op == "put" else payload)
+                   for kind, batch in read_journal(wal_path) if kind == "batch"
+                   for op, payload in batch]
+        if changes:
+            self._apply(changes)
+            self._map.flush()
+        os.remove(wal_path)
+
+    def save_changes(self, medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]]) -> bool:
+        if len(changes) > JOURNAL_BATCH_LIMIT:
+            return self.save_all(medicines)
+        try:
+            self._remap()
+            if len(changes) == 1:
+                self._apply(changes)
+                return True
+            # Several slots must change together: log them first, as one
+            # synced batch frame, so a crash part way through the slots is
+            # completed on the next load and a torn log applies nothing
+            wal_path = self.path(f"{RECORD_FILE}.wal")
+            with open(wal_path, "wb") as wal:
+                pickle.dump(("batch", [(op, payload.to_record() if op == "put" else payload)
+                                       for op, payload in changes]), wal)
+                wal.flush()
+                os.fsync(wal.fileno())
+            self._apply(changes)
+            self._map.flush()
+            os.remove(wal_path)
+            return True
+        except Exception as e:
+            print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+            return False
+
+    def sync(self) -> None:
+        self._remap()
+        self._map.flush()
+        fsync_path(self._heap_path(self._generation()))
+        super().sync()
+
+    def save_all(self, medicines: List[Medicine], next_id: int = 0) -> bool:
+        try:
+            self._remap()
+            old_generation = self._generation()
+            self._write_fresh(medicines, old_generation + 1, max(next_id, self.next_id()))
+            self._map.close()
+            self._file.close()
+            self._open()
+            self._strings = {}
+            self.load()
+            old_heap = self._heap_path(old_generation)
+            if os.path.exists(old_heap):
+                os.remove(old_heap)
+            return True
+        except Exception as e:
+            print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+            return False
+
+
+def convert_dat_to_records(directory: str = ".") -> int:
+    """Copy the inventory in Medicines.dat (and its journal) into Medicines.rec"""
+    source = PickleBackend(directory)
+    medicines = source.load()
+    if not RecordFileBackend(directory).save_all(medicines, source.next_id()):
+        raise InventoryError(f"ERROR WRITING {RECORD_FILE}")
+    return len(medicines)
+
+
+def convert_records_to_dat(directory: str = ".") -> int:
+    """Copy the inventory in Medicines.rec back into Medicines.dat"""
+    source = RecordFileBackend(directory)
+    medicines = source.load()
+    if not PickleBackend(directory).save_all(medicines, source.next_id()):
+        raise InventoryError(f"ERROR WRITING {MEDICINES_FILE}")
+    return len(medicines)
+
+
+# A write-behind save waits this long for more changes to merge into it,
+# and this long before retrying a failed write
+WRITE_BEHIND_DELAY = 0.05
+WRITE_BEHIND_RETRY = 1.0
+# Each background write is logged here, synced, before any data file is touched
+WRITE_BEHIND_LOG = "Medicines.wblog"
+
+
+class WriteBehindBackend(StorageBackend):
+    """Accept inventory changes at once and save them from a background thread
+
+    Changes arriving in quick succession are merged, the last state of each
+    medicine winning, into one write that is synced to disk before it counts
+    as durable; flush() waits for that. Ledger frames wait with the stock
+    change they belong to and go in the same write, which is logged first and
+    replayed on the next start if a crash cuts it short, so the ledgers and
+    the stock on disk always agree. Since other terminals cannot see the
+    changes still held in memory, only this process may write the inventory
+    while it runs."""
+    deferred = True
+
+    def __init__(self, inner: StorageBackend, delay: float = WRITE_BEHIND_DELAY):
+        super().__init__(inner.directory)
+        self.inner = inner
+        self.name = inner.name
+        self.delay = delay
+        # Serializes this process's read-modify-write changes, in place of
+        # the file lock other terminals would wait on
+        self._lock = threading.RLock()
+        self._cond = threading.Condition()
+        # Medicine ID -> ("put", record) or ("delete", last record put or None),
+        # the last change to each
+        self._pending: Dict[int, Tuple[str, Any]] = {}
+        # Ledger -> (frame, span) pairs written since the last saved change,
+        # which they join, and -> (start, frames) waiting with _pending
+        self._staged: Dict[str, List[Tuple[List[Any], Tuple[int, int]]]] = {}
+        self._ledgers: Dict[str, Tuple[int, List[List[Any]]]] = {}
+        # Where each ledger will end once everything accepted is written
+        self._ledger_ends: Dict[str, int] = {}
+        # Sequence numbers: saves accepted, and up to which they are durable
+        # or the last write attempt failed
+        self._queued = self._durable = self._failed = 0
+        self._urgent = False
+        self._closing = False
+        self.recover(inner)
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def signature(self) -> str:
+        # Nothing else writes while this process runs, so memory stays current
+        return "write-behind"
+
+    def load(self) -> List[Medicine]:
+        self.flush()
+        with self.inner.lock():
+            return self.inner.load()
+
+    def _take_staged(self) -> None:
+        """Queue the staged ledger frames with the changes pending (holding _cond)"""
+        for ledger, staged in self._staged.items():
+            if not staged:
+                continue
+            frames = [frame for frame, _ in staged]
+            if ledger in self._ledgers:
+                start, queued = self._ledgers[ledger]
+                self._ledgers[ledger] = (start, queued + frames)
+            else:
+                self._ledgers[ledger] = (staged[0][1][0], frames)
+        self._staged = {}
+
+    def save_changes(self, medicines: Optional[List[Medicine]], changes: List[Tuple[str, Any]]) -> bool:
+        if len(changes) > JOURNAL_BATCH_LIMIT or self._closing:
+            # Bulk imports (and saves during shutdown) are written straight
+            # away, after everything accepted before them
+            return self.flush() and self._write_now(lambda: self.inner.save_changes(medicines, changes))
+        with self._cond:
+            for op, payload in changes:
+                if op == "put":
+                    # Copied now, as the store goes on changing the object
+                    self._pending[payload.id] = ("put", payload.to_record())
+                else:
+                    # A medicine added and deleted within one write is still
+                    # put first, so the stored ID counter moves past it
+                    prior = self._pending.get(payload, (None, None))
+                    self._pending[payload] = ("delete", prior[1])
+            self._take_staged()
+            self._queued += 1
+            self._cond.notify_all()
+        return True
+
+    def save_all(self, medicines: List[Medicine], next_id: int = 0) -> bool:
+        return self.flush() and self._write_now(lambda: self.inner.save_all(medicines, next_id))
+
+    def next_id(self) -> int:
+        # IDs handed out since are pending here, so the store keeps its own count
+        return self.inner.next_id()
+
+    def _write_now(self, write: Callable[[], bool]) -> bool:
+        with self.inner.lock():
+            if not write():
+                return False
+            self.inner.sync()
+        return True
+
+    def flush(self) -> bool:
+        """Wait until every change accepted so far is synced to disk"""
+        # Held so no other thread is between a ledger write and its stock change
+        with self._lock, self._cond:
+            if any(self._staged.values()):
+                # Frames written with no stock change to follow
+                self._take_staged()
+                self._queued += 1
+            target = self._queued
+            self._urgent = True
+            self._cond.notify_all()
+            while self._durable < target and self._failed < target:
+                self._cond.wait()
+            return self._durable >= target
+
+    def close(self) -> None:
+        """Write whatever is still pending and stop the background thread"""
+        with self._cond:
+            self._take_staged()
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._pending or self._ledgers:
+            print(f"\n\t\t ## {len(self._pending)} MEDICINE CHANGES AND "
+                  f"{sum(len(frames) for _, frames in self._ledgers.values())} "
+                  f"TRANSACTIONS COULD NOT BE SAVED ##")
+
+    def _run(self) -> None:
+        # A backend of its own, opened on this thread (SQLite connections
+        # belong to the thread that made them)
+        writer = type(self.inner)(self.inner.directory)
+        while True:
+            with self._cond:
+                while not self._pending and not self._ledgers and not self._closing:
+                    self._cond.wait()
+                if not self._pending and not self._ledgers:
+                    return
+                # Let the rest of a burst arrive, unless someone is waiting
+                deadline = time.monotonic() + self.delay
+                while not self._urgent and not self._closing and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                pending, self._pending = self._pending, {}
+                ledgers, self._ledgers = self._ledgers, {}
+                sequence, self._urgent = self._queued, False
+
+            ok = self._write(writer, pending, ledgers)
+            with self._cond:
+                if ok:
+                    self._durable = sequence
+                else:
+                    self._failed = sequence
+                    # Kept for the next attempt, under anything changed since
+                    pending.update(self._pending)
+                    self._pending = pending
+                    for ledger, (start, frames) in self._ledgers.items():
+                        if ledger in ledgers:
+                            ledgers[ledger] = (ledgers[ledger][0], ledgers[ledger][1] + frames)
+                        else:
+                            ledgers[ledger] = (start, frames)
+                    self._ledgers = ledgers
+                self._cond.notify_all()
+                if not ok:
+                    if self._closing:
+                        return
+                    self._cond.wait(WRITE_BEHIND_RETRY)
+
+    @staticmethod
+    def _apply(writer: StorageBackend, ledgers: Dict[str, Tuple[int, List[List[Any]]]],
+               changes: List[Tuple[str, Any]]) -> bool:
+        """Write logged ledger frames and inventory changes; safe to repeat"""
+        for ledger, (start, frames) in ledgers.items():
+            # Anything past the logged start is this write's own, cut short
+            # by a crash, so a replay writes each frame once
+            if writer.ledger_end(ledger) > start:
+                writer.rollback_transactions(ledger, start)
+            _, spans = writer.write_transactions(ledger, frames)
+            writer.index_transactions(ledger, frames, spans)
+        changes = [(op, Medicine.from_record(payload) if op == "put" else payload)
+                   for op, payload in changes]
+        return not changes or writer.save_changes(None, changes)
+
+    @classmethod
+    def recover(cls, backend: StorageBackend) -> None:
+        """Finish a logged write that a crash interrupted, whoever opens the directory next"""
+        log_path = backend.path(WRITE_BEHIND_LOG)
+        if not os.path.exists(log_path):
+            return
+        with backend.lock():
+            if not os.path.exists(log_path):
+                return
+            # A torn log was never acted on and is dropped whole; a write that
+            # fails again keeps the log for the next attempt
+            if all(cls._apply(backend, *batch) for kind, batch in read_journal(log_path)
+                   if kind == "batch"):
+                backend.sync()
+                os.remove(log_path)
+
+    @classmethod
+    def _write(cls, writer: StorageBackend, pending: Dict[int, Tuple[str, Any]],
+               ledgers: Dict[str, Tuple[int, List[List[Any]]]]) -> bool:
+        """Save merged changes and their ledger frames as one logged batch and sync it"""
+        try:
+            changes = []
+            for m_id, (op, record) in pending.items():
+                if record is not None:
+                    changes.append(("put", record))
+                if op == "delete":
+                    changes.append(("delete", m_id))
+            log_path = writer.path(WRITE_BEHIND_LOG)
+            with writer.lock():
+                with open(log_path, "wb") as log:
+                    pickle.dump(("batch", (ledgers, changes)), log)
+                    log.flush()
+                    os.fsync(log.fileno())
+                if not cls._apply(writer, ledgers, changes):
+                    return False
+                writer.sync()
+                os.remove(log_path)
+            return True
+        except Exception as e:
+            print(f"\n\t\t ## ERROR SAVING FILE: {e} ##")
+            return False
+
+    def write_transactions(self, ledger: str, 
+                           frames: List[List[Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+        # Held back for the stock change that follows; the positions they
+        # will be written at are known, as nothing else writes meanwhile
+        with self._cond:
+            start = self._ledger_ends.get(ledger)
+            if start is None:
+                start = self.inner.ledger_end(ledger)
+            spans = self.inner.frame_spans(start, frames)
+            self._ledger_ends[ledger] = spans[-1][1] if spans else start
+            self._staged.setdefault(ledger, []).extend(zip(frames, spans))
+        return start, spans
+
+    def rollback_transactions(self, ledger: str, start: int) -> None:
+        with self._cond:
+            staged = self._staged.get(ledger)
+            if staged and staged[0][1][0] <= start:
+                self._staged[ledger] = [entry for entry in staged if entry[1][0] < start]
+                self._ledger_ends[ledger] = start
+                return
+        self.flush()
+        with self.inner.lock():
+            self.inner.rollback_transactions(ledger, start)
+        self._ledger_ends[ledger] = start
+
+    def index_transactions(self, ledger: str, frames: List[List[Any]], 
+                           spans: List[Tuple[int, int]]) -> None:
+        # The background write indexes frames as it writes them
+        pass
+
+    def inventory_changes(self, since: Any) -> Tuple[Any, Optional[Dict[int, Optional[Tuple[Any, ...]]]]]:
+        self.flush()
+        return self.inner.inventory_changes(since)
+
+    def ledger_end(self, ledger: str) -> int:
+        self.flush()
+        return self.inner.ledger_end(ledger)
+
+    def frame_spans(self, start: int, frames: List[List[Any]]) -> List[Tuple[int, int]]:
+        return self.inner.frame_spans(start, frames)
+
+    # Reads see every frame accepted so far
+    def iter_transactions(self, ledger: str, 
+                          start: int = 0) -> Iterator[Tuple[int, int, List[Any]]]:
+        self.flush()
+        return self.inner.iter_transactions(ledger, start)
+
+    def transactions_between(self, ledger: str, start_date: datetime.date,
+                             end_date: datetime.date) -> Iterator[List[Any]]:
+        self.flush()
+        return self.inner.transactions_between(ledger, start_date, end_date)
+
+    def transactions_for_medicine(self, ledger: str, med_name: str) -> Iterator[List[Any]]:
+        self.flush()
+        return self.inner.transactions_for_medicine(ledger, med_name)
+
+    def sync(self) -> None:
+        self.inner.sync()
+
+
+BACKENDS = {PickleBackend.name: PickleBackend, SQLiteBackend.name: SQLiteBackend,
+            RecordFileBackend.name: RecordFileBackend}
+
+
+def open_backend(name: Optional[str] = None, directory: str = ".",
+                 read_only: bool = False) -> StorageBackend:
+    """Open a storage backend by name (default: $MEDICINES_BACKEND or pickle)
+
+    A read-only backend is opened as the files are, leaving any write-behind
+    recovery or format upgrade to the next terminal that opens it to write."""
+    name = name or os.environ.get("MEDICINES_BACKEND", PickleBackend.name)
+    if name not in BACKENDS:
+        raise InventoryError(f"UNKNOWN STORAGE BACKEND '{name}'")
+    backend = BACKENDS[name](directory, read_only)
+    if not read_only:
+        WriteBehindBackend.recover(backend)
+    return backend
+
+
+def import_dat_to_sqlite(directory: str = ".", batch_size: int = 10000) -> Dict[str, int]:
+    """Copy Medicines.dat and the .dat ledgers into a new SQLite database"""
+    source = PickleBackend(directory)
+    target = SQLiteBackend(directory)
+    for table in ["medicines", *SQLITE_LEDGER_TABLES.values()]:
+        if target.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+            raise InventoryError(f"{SQLITE_FILE} ALREADY HAS {table.upper()} RECORDS")
+
+    medicines = source.load()
+    if not target.save_all(medicines, source.next_id()):
+        raise InventoryError("ERROR SAVING MEDICINES")
+    counts = {"medicines": len(medicines)}
+    for ledger, table in SQLITE_LEDGER_TABLES.items():
+        counts[table] = 0
+        batch = []
+        for _, _, frame in source.iter_transactions(ledger):
+            batch.append(frame)
+            if len(batch) >= batch_size:
+                target.write_transactions(ledger, batch)
+                counts[table] += len(batch)
+                batch = []
+        if batch:
+            target.write_transactions(ledger, batch)
+            counts[table] += len(batch)
+    return counts
+
+
+STORES_DIR = "stores"
+
+
+def store_directory(name: str, root: str = STORES_DIR) -> str:
+    """Data directory holding one store's shard of the chain"""
+    if not name or name.startswith(".") or os.sep in name or (os.altsep and os.altsep in name):
+        raise InventoryError(f"INVALID STORE NAME '{name}'")
+    return os.path.join(root, name)
+
+
+def list_stores(root: str = STORES_DIR) -> List[str]:
+    """Names of the stores in a chain directory"""
+    try:
+        return sorted(entry.name for entry in os.scandir(root)
+                      if entry.is_dir() and not entry.name.startswith("."))
+    except FileNotFoundError:
+        return []
+
+
+# Each shard_* function reads one store's shard in a worker process and
+# returns only what the chain-wide merge needs, so little crosses back
+
+@contextmanager
+def open_shard(backend_name: str, directory: str) -> Iterator[StorageBackend]:
+    """One store's backend, opened read-only and closed afterwards"""
+    backend = open_backend(backend_name, directory, read_only=True)
+    try:
+        yield backend
+    finally:
+        backend.close()
+
+
+def shard_medicines(backend_name: str, directory: str) -> List[Medicine]:
+    """One store's inventory, loaded under its lock"""
+    with open_shard(backend_name, directory) as backend, backend.lock():
+        return backend.load()
+
+
+def shard_valuation(backend_name: str, directory: str) -> Tuple[int, int, float, float]:
+    """(lots, units, stock value, value already expired) of one store"""
+    columns = ColumnarInventory.from_medicines(shard_medicines(backend_name, directory))
+    # Lots expire on their expiry date, as medicine_expired() has it
+    expired = columns.value(expiring_by=datetime.date.today())
+    return len(columns), sum(columns.quantities), columns.value(), expired
+
+
+def shard_expiring(backend_name: str, directory: str, date: datetime.date) -> List[Tuple[Any, ...]]:
+    """Records of one store's medicines expiring on or before a date, soonest first"""
+    due = [med for med in shard_medicines(backend_name, directory) if med.expiry_date <= date]
+    due.sort(key=lambda med: (med.expiry_date, med.id))
+    return [med.to_record() for med in due]
+
+
+def shard_stock(backend_name: str, directory: str, text: str) -> Dict[Tuple[str, str], List[Any]]:
+    """[name, brand, units in date, units expired, lots] per product whose name
+    contains the text (or whose barcode is the text) in one store"""
+    text = text.strip().lower()
+    stock: Dict[Tuple[str, str], List[Any]] = {}
+    for med in shard_medicines(backend_name, directory):
+        if text in med.name.lower() or (med.barcode and med.barcode.lower() == text):
+            entry = stock.setdefault(product_key(med), [med.name, med.brand, 0, 0, 0])
+            entry[3 if medicine_expired(med.expiry_date) else 2] += med.quantity
+            entry[4] += 1
+    return stock
+
+
+def shard_sales(backend_name: str, directory: str) -> Dict[str, Dict[Any, Any]]:
+    """One store's sales and returns totals, counted up to the end of its ledgers"""
+    with open_shard(backend_name, directory) as backend:
+        return SalesAggregates.load(backend).totals()
+
+
+class StoreChain:
+    """Several stores, each with its own shard (a data directory under root), and
+    chain-wide reports that read the shards in parallel worker processes"""
+    def __init__(self, root: str = STORES_DIR, backend_name: Optional[str] = None,
+                 workers: Optional[int] = None):
+        self.root = root
+        self.backend_name = backend_name or os.environ.get("MEDICINES_BACKEND", PickleBackend.name)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def stores(self) -> List[str]:
+        return list_stores(self.root)
+
+    def open_backend(self, name: str) -> StorageBackend:
+        """Backend over one store's shard, creating the store if it is new"""
+        directory = store_directory(name, self.root)
+        os.makedirs(directory, exist_ok=True)
+        return open_backend(self.backend_name, directory)
+
+    def _fan_out(self, shard_fn: Callable[..., Any], *args: Any) -> List[Tuple[str, Any]]:
+        """(store, shard_fn result) for every store, one worker process per store at a time"""
+        names = self.stores()
+        directories = [store_directory(name, self.root) for name in names]
+        if self.workers <= 1 or len(names) <= 1:
+            results = [shard_fn(self.backend_name, directory, *args) for directory in directories]
+        else:
+            # Started once and kept, so later reports do not pay for new processes
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [self._pool.submit(shard_fn, self.backend_name, directory, *args)
+                       for directory in directories]
+            results = [future.result() for future in futures]
+        return list(zip(names, results))
+
+    def close(self) -> None:
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def valuation(self) -> List[Tuple[str, int, int, float, float]]:
+        """(store, lots, units, stock value, value already expired) for every store"""
+        return [(name, *result) for name, result in self._fan_out(shard_valuation)]
+
+    def expiring_by(self, date: datetime.date) -> Iterator[Tuple[str, Medicine]]:
+        """(store, medicine) expiring on or before a date across the chain, soonest first"""
+        streams = [[(record[4], record[0], name, record) for record in records]
+                   for name, records in self._fan_out(shard_expiring, date)]
+        for _, _, name, record in heapq.merge(*streams):
+            yield name, Medicine.from_record(record)
+
+    def stock_of(self, text: str) -> List[Tuple[str, str, str, int, int, int]]:
+        """(name, brand, store, units in date, units expired, lots) for each product
+        matching a name or barcode, by product and then store"""
+        rows = [(name, brand, store, units, expired, lots)
+                for store, stock in self._fan_out(shard_stock, text)
+                for name, brand, units, expired, lots in stock.values()]
+        return sorted(rows, key=lambda row: (row[0].lower(), row[1].lower(), row[2]))
+
+    def sales(self) -> Tuple[List[Tuple[str, SalesAggregates]], SalesAggregates]:
+        """Each store's sales and returns totals, and the chain's combined"""
+        parts = self._fan_out(shard_sales)
+        return ([(name, SalesAggregates.combined([totals])) for name, totals in parts],
+                SalesAggregates.combined(totals for _, totals in parts))
+
+
+BACKUP_DIR = "backups"
+# Lots are chunked by ID range. IDs are never reused, so a changed lot
+# rewrites only its range's chunk and new lots only the last ranges'
+BACKUP_CHUNK_IDS = 256
+# Ledger frames per chunk of a ledger backup
+BACKUP_LEDGER_FRAMES = 10000
+
+
+def backup_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def backup_bytes(value: Any) -> bytes:
+    """Pickle with a fixed protocol, so unchanged data keeps its digest across Python versions"""
+    return pickle.dumps(value, protocol=4)
+
+
+class BackupRepository:
+    """Incremental snapshots of a data directory, stored as content-addressed chunks
+
+    A snapshot is a manifest listing the digests of its chunks: the inventory
+    by ID range, each ledger as segments of frames up to the ledger position
+    the snapshot reached, and the reorder levels. Chunks already stored by an
+    earlier snapshot are not written again, and ledger frames are read only
+    from where the previous snapshot stopped. When the backend can tell which
+    lots changed since the previous snapshot, only their ranges are rebuilt
+    and the rest of the inventory is not read at all."""
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "chunks", digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.directory, "snapshots", f"{snapshot_id}.json")
+
+    def put_chunk(self, data: bytes) -> Tuple[str, int]:
+        """Store a chunk unless it is stored already; returns its digest and the bytes written"""
+        digest = backup_digest(data)
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = zlib.compress(data)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        return digest, len(blob)
+
+    def get_chunk(self, digest: str) -> bytes:
+        """A stored chunk, checked against its digest"""
+        try:
+            with open(self._chunk_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            data = None
+        if data is None or backup_digest(data) != digest:
+            raise InventoryError(f"BACKUP CHUNK {digest[:12]} IS MISSING OR DAMAGED")
+        return data
+
+    def snapshots(self) -> List[str]:
+        """Snapshot IDs, oldest first"""
+        try:
+            names = os.listdir(os.path.join(self.directory, "snapshots"))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+    def manifest(self, snapshot_id: str) -> Dict[str, Any]:
+        """A snapshot's manifest ('latest' for the newest)"""
+        if snapshot_id == "latest":
+            snapshots = self.snapshots()
+            if not snapshots:
+                raise InventoryError(f"NO BACKUP SNAPSHOTS IN {self.directory}")
+            snapshot_id = snapshots[-1]
+        try:
+            with open(self._manifest_path(snapshot_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise InventoryError(f"NO BACKUP SNAPSHOT '{snapshot_id}'") from None
+
+    @staticmethod
+    def _ledger_continues(backend: 'StorageBackend', ledger: str, saved: Dict[str, Any]) -> bool:
+        """Whether a ledger still holds, where it was, the last frame a snapshot saved"""
+        if saved["tail"] is None:
+            return True
+        offset, digest = saved["tail"]
+        for start, end, frame in backend.iter_transactions(ledger, offset):
+            return start == offset and end == saved["end"] and backup_digest(backup_bytes(frame)) == digest
+        return False
+
+    def _backup_ledger(self, backend: 'StorageBackend', ledger: str, parent: Optional[Dict[str, Any]],
+                       put: Callable[[bytes], str]) -> Dict[str, Any]:
+        """The parent's ledger segments plus the frames appended since, or every
+        frame if the ledger no longer continues the parent's"""
+        if parent is not None and self._ledger_continues(backend, ledger, parent):
+            saved = dict(parent, segments=list(parent["segments"]))
+        else:
+            saved = {"segments": [], "end": 0, "tail": None, "frames": 0}
+        batch: List[List[Any]] = []
+        last = None
+        for offset, end, frame in backend.iter_transactions(ledger, saved["end"]):
+            batch.append(frame)
+            last = offset, end, frame
+            if len(batch) == BACKUP_LEDGER_FRAMES:
+                saved["segments"].append(put(backup_bytes(batch)))
+                saved["frames"] += len(batch)
+                batch = []
+        if batch:
+            saved["segments"].append(put(backup_bytes(batch)))
+            saved["frames"] += len(batch)
+        if last is not None:
+            saved["end"] = last[1]
+            saved["tail"] = [last[0], backup_digest(backup_bytes(last[2]))]
+        return saved
+
+    def _backup_inventory(self, backend: 'StorageBackend', parent: Optional[Dict[str, Any]],
+                          put: Callable[[bytes], str]) -> Tuple[Any, Dict[int, str], int, int]:
+        """(source mark, range -> chunk digest, lot count, ID counter) of the inventory now,
+        from the parent's chunks and the lots changed since it where the backend can tell"""
+        source, changes = backend.inventory_changes(parent and parent.get("source"))
+        if changes is None or "ranges" not in parent:
+            ranges: Dict[int, List[Tuple[Any, ...]]] = {}
+            for med in backend.load():
+                ranges.setdefault(med.id // BACKUP_CHUNK_IDS, []).append(med.to_record())
+            return (source, {key: put(backup_bytes(sorted(records))) for key, records in ranges.items()},
+                    sum(map(len, ranges.values())), backend.next_id())
+
+        chunks = dict(zip(parent["ranges"], parent["inventory"]))
+        count = parent["medicines"]
+        touched: Dict[int, Dict[int, Optional[Tuple[Any, ...]]]] = {}
+        for m_id, record in changes.items():
+            touched.setdefault(m_id // BACKUP_CHUNK_IDS, {})[m_id] = record
+        for key, changed in touched.items():
+            records = {record[0]: record for record in
+                       (pickle.loads(self.get_chunk(chunks[key])) if key in chunks else [])}
+            count -= len(records)
+            for m_id, record in changed.items():
+                if record is None:
+                    records.pop(m_id, None)
+                else:
+                    records[m_id] = record
+            count += len(records)
+            if records:
+                chunks[key] = put(backup_bytes(sorted(records.values())))
+            else:
+                chunks.pop(key, None)
+        # Without a load the backend may not know its counter; it is at least
+        # past every ID the parent counted or that has changed since
+        next_id = max([parent["next_id"], backend.next_id()] + [m_id + 1 for m_id in changes])
+        return source, chunks, count, next_id
+
+    def snapshot(self, backend: 'StorageBackend') -> Dict[str, Any]:
+        """Save a snapshot of the inventory, ledgers and reorder levels; returns its manifest"""
+        snapshots = self.snapshots()
+        parent = self.manifest(snapshots[-1]) if snapshots else None
+        # Ledger positions mean different things in each backend
+        if parent is not None and parent["backend"] != backend.name:
+            parent = None
+        written = {"chunks_written": 0, "bytes_written": 0}
+
+        def put(data: bytes) -> str:
+            digest, size = self.put_chunk(data)
+            if size:
+                written["chunks_written"] += 1
+                written["bytes_written"] += size
+            return digest
+
+        now = datetime.datetime.now()
+        with backend.lock():
+            source, chunks, count, next_id = self._backup_inventory(backend, parent, put)
+            manifest = {
+                "id": f"{now:%Y%m%d-%H%M%S-%f}",
+                "created": now.isoformat(timespec="seconds"),
+                "backend": backend.name,
+                "source": source,
+                "next_id": next_id,
+                "medicines": count,
+                "ranges": sorted(chunks),
+                "inventory": [chunks[key] for key in sorted(chunks)],
+                "ledgers": {ledger: self._backup_ledger(backend, ledger, parent and parent["ledgers"][ledger], put)
+                            for ledger in (SALES_FILE, RETURNS_FILE)},
+                "reorder": None,
+            }
+            try:
+                with open(backend.path(REORDER_FILE), "rb") as f:
+                    manifest["reorder"] = put(f.read())
+            except FileNotFoundError:
+                pass
+        manifest.update(written)
+
+        path = self._manifest_path(manifest["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        fsync_directory(path)
+        return manifest
+
+    def _restore_ledger(self, backend: 'StorageBackend', ledger: str, saved: Dict[str, Any],
+                        same_backend: bool) -> None:
+        if same_backend and self._ledger_continues(backend, ledger, saved):
+            # The snapshot's frames are still in place; only cut off what came after
+            start, segments = saved["end"], []
+        else:
+            start, segments = 0, saved["segments"]
+        if next(backend.iter_transactions(ledger, start), None) is not None:
+            backend.rollback_transactions(ledger, start)
+        for digest in segments:
+            frames = pickle.loads(self.get_chunk(digest))
+            _, spans = backend.write_transactions(ledger, frames)
+            backend.index_transactions(ledger, frames, spans)
+
+    def restore(self, backend: 'StorageBackend', snapshot_id: str) -> Dict[str, Any]:
+        """Put the inventory, ledgers and reorder levels back as a snapshot saved them
+
+        Every chunk but the ledger segments is read and checked before
+        anything is changed; a restore cut short can simply be run again."""
+        manifest = self.manifest(snapshot_id)
+        medicines = [Medicine.from_record(record) for digest in manifest["inventory"]
+                     for record in pickle.loads(self.get_chunk(digest))]
+        reorder = self.get_chunk(manifest["reorder"]) if manifest["reorder"] else None
+        for saved in manifest["ledgers"].values():
+            missing = [digest for digest in saved["segments"] if not os.path.exists(self._chunk_path(digest))]
+            if missing:
+                raise InventoryError(f"BACKUP CHUNK {missing[0][:12]} IS MISSING OR DAMAGED")
+
+        with backend.lock():
+            if not backend.save_all(medicines, manifest["next_id"]):
+                raise InventoryError("ERROR SAVING MEDICINES")
+            for ledger, saved in manifest["ledgers"].items():
+                self._restore_ledger(backend, ledger, saved, manifest["backend"] == backend.name)
+            path = backend.path(REORDER_FILE)
+            if reorder is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(reorder)
+                os.replace(f"{path}.tmp", path)
+            # The saved sales summary may count frames that are gone; it is recounted on the next start
+            if os.path.exists(backend.path(AGGREGATES_FILE)):
+                os.remove(backend.path(AGGREGATES_FILE))
+        return manifest
+
+
+MEDICINE_COLUMNS = ["id", "name", "brand", "manufacturing_date", "expiry_date", 
+                    "type", "quantity", "price", "barcode"]
+LEDGER_COLUMNS = ["date", "name", "quantity", "amount", "reason", "lot"]
+IMPORT_ERROR_LIMIT = 1000
+
+
+@lru_cache(maxsize=4096)
+def parse_import_date(text: Any) -> datetime.date:
+    """Parse a date from an import file, as yyyy, mm, dd or ISO yyyy-mm-dd"""
+    # Cached: a delivery note repeats the same few dates on thousands of lines
+    text = str(text or "").strip()
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        pass
+    if check_valid_date(text):
+        return parse_date(text)
+    raise InventoryError(f"INVALID DATE FORMAT '{text}'")
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Stream (line number, row) pairs from a .csv (with a header) or .jsonl file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield line_no, row if isinstance(row, dict) else None
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def import_medicines(store: InventoryStore, path: str, 
+                     allow_expired: bool = False) -> Tuple[int, int, List[Tuple[int, str]]]:
+    """Add every valid row of a CSV/JSONL file in one commit; returns (added, rejected, errors)"""
+    medicines: List[Medicine] = []
+    errors: List[Tuple[int, str]] = []
+    rejected = 0
+    # Barcode -> product of the rows accepted so far, which the store does not have yet
+    barcodes: Dict[str, Tuple[str, str]] = {}
+    for line_no, row in read_rows(path):
+        try:
+            if row is None:
+                raise InventoryError("NOT A JSON OBJECT")
+            # The IDs are assigned by add_many once every row has been checked
+            med = build_medicine(0, row.get("name") or "", row.get("brand") or "",
+                                 parse_import_date(row.get("manufacturing_date")),
+                                 parse_import_date(row.get("expiry_date")),
+                                 row.get("type"), row.get("price"), row.get("quantity"),
+                                 allow_expired, row.get("barcode"))
+            if med.barcode:
+                store.check_barcode(med)
+                if barcodes.setdefault(med.barcode, product_key(med)) != product_key(med):
+                    raise InventoryError(f"BARCODE {med.barcode} IS USED FOR ANOTHER MEDICINE "
+                                         f"EARLIER IN THE FILE")
+            medicines.append(med)
+        except InventoryError as e:
+            rejected += 1
+            if len(errors) < IMPORT_ERROR_LIMIT:
+                errors.append((line_no, str(e)))
+
+    if medicines and not store.add_many(medicines):
+        raise InventoryError("ERROR SAVING FILE. NOTHING WAS IMPORTED")
+    return len(medicines), rejected, errors
+
+
+def write_rows(path: str, columns: List[str], rows: Iterator[List[Any]]) -> int:
+    """Stream rows to a .csv (with a header) or .jsonl file; returns the row count"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row))) + "\n")
+                count += 1
+        else:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def export_medicines(store: InventoryStore, path: str) -> int:
+    """Write the inventory to a CSV/JSONL file, one row at a time"""
+    store.refresh()
+    rows = ([med.id, med.name, med.brand, med.manufacturing_date.isoformat(), 
+             med.expiry_date.isoformat(), med.type, med.quantity, med.price, med.barcode] 
+            for med in store.medicines)
+    return write_rows(path, MEDICINE_COLUMNS, rows)
+
+
+def export_ledger(backend: StorageBackend, ledger: str, path: str) -> int:
+    """Stream a sales or returns ledger to a CSV/JSONL file without loading it"""
+    rows = ([frame[0].isoformat(), frame[1], frame[2], frame[3], frame[4] if len(frame) > 4 else "",
+             frame[5] if len(frame) > 5 else None]
+            for _, _, frame in backend.iter_transactions(ledger))
+    return write_rows(path, LEDGER_COLUMNS, rows)
+
+
+def sell_medicine(store: InventoryStore) -> None:
+    """Sell medicine and update inventory"""
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -389,19 +3806,19 @@ def sell_medicine() -> None:
         return
 
     print("\n\n\t#################### SELL MEDICINE SCREEN ####################")
-    m_name = input('\n\t\t ENTER MEDICINE NAME: ').strip()
+    m_name = input('\n\t\t ENTER MEDICINE NAME OR SCAN BARCODE: ').strip()
     
     if not m_name:
         print("\n\t\t ## PLEASE ENTER A MEDICINE NAME ##")
         input("\n\t\t\t\t...:::::Press Enter Key:::::...")
         return
     
-    medicine = get_medicine_by_name(medicines, m_name)
+    medicine = get_medicine_by_name(store, m_name)
 
     if medicine:
         unit = "strip" if medicine['type'] == 1 else "bottle"
         print(f"\n\t\t Medicine: {medicine['name']}")
-        print(f"\t\t Available Stock: {medicine['quantity']} {unit}s")
+        print(f"\t\t Available Stock: {medicine['available']} {unit}s")
         print(f"\t\t Price per {unit}: ₹{medicine['price']:.2f}")
         
         try:
@@ -409,39 +3826,121 @@ def sell_medicine() -> None:
             
             if qty <= 0:
                 print("\n\t\t ## QUANTITY MUST BE POSITIVE ##")
-            elif qty <= medicine['quantity']:
-                amount = qty * medicine['price']
+            elif qty <= medicine['available']:
+                # Lots expiring first are sold first
+                plan = store.allocate(medicine['id'], qty)
+                amount = sum(take * lot.price for lot, take in plan)
+                for lot, take in plan:
+                    print(f"\t\t Lot {lot.id} (expires {format_date(lot.expiry_date)}): {take} {unit}s")
                 print(f"\n\t\t\t TOTAL AMOUNT: ₹{amount:.2f}")
                 
                 confirm = input("\n\t\t Confirm sale? (y/n): ")
                 if confirm.lower() == 'y':
-                    # Record sale
-                    if record_transaction("sales.dat", medicine['name'], qty, amount):
-                        # Update inventory
-                        for med in medicines:
-                            if medicine['name'].lower() == med[1].lower():
-                                med[6] -= qty
-                                med[8] = med[6] * med[7]
-                                break
-                        
-                        if save_medicines(medicines):
-                            print("\n\t\t ## MEDICINE SOLD SUCCESSFULLY ##")
-                            print(f"\t\t Remaining Stock: {medicine['quantity'] - qty} {unit}s")
+                    # Stock is checked again under the lock, in case another
+                    # terminal sold some since it was shown
+                    try:
+                        store.checkout([(medicine['id'], qty)])
+                        if not store.flush():
+                            raise InventoryError("SALE RECORDED BUT STOCK NOT YET SAVED")
+                        print("\n\t\t ## MEDICINE SOLD SUCCESSFULLY ##")
+                        print(f"\t\t Remaining Stock: {store.available(medicine['id'])} {unit}s")
+                    except InventoryError as e:
+                        print(f"\n\t\t ## {e} ##")
                 else:
                     print("\n\t\t ## SALE CANCELLED ##")
             else:
-                print(f"\n\t\t ## NOT ENOUGH STOCK. CURRENT STOCK: {medicine['quantity']} {unit}s ##")
+                print(f"\n\t\t ## NOT ENOUGH STOCK. CURRENT STOCK: {medicine['available']} {unit}s ##")
         except ValueError:
             print("\n\t\t ## INVALID INPUT ##")
+        except InventoryError as e:
+            # The lots can fall short of the stock shown, e.g. one expired since
+            print(f"\n\t\t ## {e} ##")
     else:
         print("\n\t\t ## MEDICINE NOT FOUND ##")
 
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def return_medicine() -> None:
+def cart_checkout(store: InventoryStore) -> None:
+    """Sell several medicines on one bill"""
+    store.refresh()
+    
+    if not store.medicines:
+        print("\n\t\t ## NO MEDICINES IN DATABASE ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    print("\n\n\t#################### CART CHECKOUT SCREEN ####################")
+    lines: List[Tuple[int, int]] = []
+    while True:
+        m_name = input('\n\t\t ENTER MEDICINE NAME OR SCAN BARCODE (blank to finish): ').strip()
+        if not m_name:
+            break
+
+        medicine = get_medicine_by_name(store, m_name)
+        if not medicine:
+            print("\n\t\t ## MEDICINE NOT FOUND ##")
+            continue
+
+        unit = "strip" if medicine['type'] == 1 else "bottle"
+        # Earlier lines for any lot of the same product come out of the same stock
+        key = product_key(store.get(medicine['id']))
+        available = medicine['available'] - sum(qty for m_id, qty in lines
+                                                if product_key(store.get(m_id)) == key)
+        print(f"\t\t Medicine: {medicine['name']}  Available: {available} {unit}s  "
+              f"Price per {unit}: ₹{medicine['price']:.2f}")
+        try:
+            qty = int(input(f"\t\t Enter number of {unit}s: "))
+        except ValueError:
+            print("\n\t\t ## INVALID INPUT ##")
+            continue
+        if qty <= 0:
+            print("\n\t\t ## QUANTITY MUST BE POSITIVE ##")
+        elif qty > available:
+            print(f"\n\t\t ## NOT ENOUGH STOCK. CURRENT STOCK: {available} {unit}s ##")
+        else:
+            lines.append((medicine['id'], qty))
+
+    if not lines:
+        print("\n\t\t ## CART IS EMPTY ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    # The lots the sale itself will be filled from
+    try:
+        plan = store.plan_checkout(lines)
+    except InventoryError as e:
+        print(f"\n\t\t ## {e} ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    print(f"\n{'MEDICINE NAME':<25}{'QTY':<8}{'PRICE':<12}{'AMOUNT':<12}")
+    print('-' * 57)
+    total = 0.0
+    for lot, take in plan:
+        total += take * lot.price
+        print(f"{lot.name:<25}{take:<8}₹{lot.price:<11.2f}₹{take * lot.price:<11.2f}")
+    print(f"\n\t\t\t TOTAL AMOUNT: ₹{total:.2f}")
+
+    confirm = input("\n\t\t Confirm sale? (y/n): ")
+    if confirm.lower() == 'y':
+        try:
+            store.checkout(lines)
+            if not store.flush():
+                raise InventoryError("SALE RECORDED BUT STOCK NOT YET SAVED")
+            print("\n\t\t ## BILL SOLD SUCCESSFULLY ##")
+        except InventoryError as e:
+            print(f"\n\t\t ## {e} ##")
+    else:
+        print("\n\t\t ## SALE CANCELLED ##")
+
+    input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+
+
+def return_medicine(store: InventoryStore) -> None:
     """Return a medicine (for expiry or damage)"""
-    medicines = load_medicines()
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -456,43 +3955,45 @@ def return_medicine() -> None:
         input("\n\t\t\t\t...:::::Press Enter Key:::::...")
         return
     
-    medicine = get_medicine_by_name(medicines, m_name)
+    medicine = get_medicine_by_name(store, m_name)
 
     if medicine:
         unit = "strip" if medicine['type'] == 1 else "bottle"
+        lots = store.lots(medicine['id'])
         print(f"\n\t\t Medicine: {medicine['name']}")
-        print(f"\t\t Available Stock: {medicine['quantity']} {unit}s")
-        print(f"\t\t Price per {unit}: ₹{medicine['price']:.2f}")
+        print(f"\n\t\t {'LOT ID':<10}{'EXPIRY DATE':<15}{'QTY':<8}{'PRICE':<10}")
+        for lot in lots:
+            print(f"\t\t {lot.id:<10}{format_date(lot.expiry_date):<15}{lot.quantity:<8}₹{lot.price:<9.2f}")
         
         try:
+            answer = input(f"\n\t\t Enter lot ID to return from [{lots[0].id}]: ").strip()
+            lot = store.get(int(answer)) if answer else lots[0]
+            if lot not in lots:
+                raise ValueError
             qty = int(input(f"\n\t\t Enter number of {unit}s to return: "))
             
             if qty <= 0:
                 print("\n\t\t ## QUANTITY MUST BE POSITIVE ##")
-            elif qty <= medicine['quantity']:
-                amount = qty * medicine['price']
+            elif qty <= lot.quantity:
+                amount = qty * lot.price
                 print(f"\n\t\t\t TOTAL AMOUNT TO BE RETURNED: ₹{amount:.2f}")
                 
                 reason = input("\n\t\t Reason for return (expiry/damage/other): ").strip()
                 confirm = input("\n\t\t Confirm return? (y/n): ")
                 
                 if confirm.lower() == 'y':
-                    # Record return
-                    if record_transaction("return.dat", medicine['name'], qty, amount):
-                        # Update inventory
-                        for med in medicines:
-                            if medicine['name'].lower() == med[1].lower():
-                                med[6] -= qty
-                                med[8] = med[6] * med[7]
-                                break
-                        
-                        if save_medicines(medicines):
-                            print("\n\t\t ## MEDICINE RETURNED SUCCESSFULLY ##")
-                            print(f"\t\t Remaining Stock: {medicine['quantity'] - qty} {unit}s")
+                    try:
+                        med, _, _ = store.return_stock(lot.id, qty, reason)
+                        if not store.flush():
+                            raise InventoryError("RETURN RECORDED BUT STOCK NOT YET SAVED")
+                        print("\n\t\t ## MEDICINE RETURNED SUCCESSFULLY ##")
+                        print(f"\t\t Remaining Stock in Lot {med.id}: {med.quantity} {unit}s")
+                    except InventoryError as e:
+                        print(f"\n\t\t ## {e} ##")
                 else:
                     print("\n\t\t ## RETURN CANCELLED ##")
             else:
-                print(f"\n\t\t ## NOT ENOUGH STOCK TO RETURN. CURRENT STOCK: {medicine['quantity']} {unit}s ##")
+                print(f"\n\t\t ## NOT ENOUGH STOCK TO RETURN. CURRENT STOCK: {lot.quantity} {unit}s ##")
         except ValueError:
             print("\n\t\t ## INVALID INPUT ##")
     else:
@@ -501,9 +4002,28 @@ def return_medicine() -> None:
     input("\n\t\t\t\t...:::::Press Enter Key:::::...")
 
 
-def expiry_list() -> None:
-    """Display medicines expiring within the next 30 days"""
-    medicines = load_medicines()
+def ask_expiry_window() -> Optional[datetime.date]:
+    """Ask for an expiry window as a number of days or a cut-off date"""
+    answer = input("\n\t\t Expiring within how many days (7/30/90) or by which date (yyyy, mm, dd)? [30]: ")
+    return expiry_window(answer)
+
+
+def expiry_window(answer: str) -> Optional[datetime.date]:
+    """Cut-off date for an expiry window given as days or a date (default 30 days)"""
+    answer = answer.strip()
+    if not answer:
+        return datetime.date.today() + datetime.timedelta(days=30)
+    if answer.isdigit():
+        return datetime.date.today() + datetime.timedelta(days=int(answer))
+    if check_valid_date(answer):
+        return parse_date(answer)
+    return None
+
+
+def expiry_list(store: InventoryStore) -> None:
+    """Display medicines expiring within a chosen window (30 days by default)"""
+    store.refresh()
+    medicines = store.medicines
     
     if not medicines:
         print("\n\t\t ## NO MEDICINES IN DATABASE ##")
@@ -511,36 +4031,645 @@ def expiry_list() -> None:
         return
 
     print("\n\n\t#################### UPCOMING EXPIRY MEDICINES ####################")
-    print("\t\t (Medicines expiring within 30 days)")
+    threshold_date = ask_expiry_window()
+    if threshold_date is None:
+        print("\n\t\t ## INVALID INPUT ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    current_date = datetime.date.today()
+    print(f"\t\t (Medicines expiring by {threshold_date:%Y, %m, %d})")
+    header = (f"\n{'LOT ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}"
+              f"{'DAYS LEFT':<12}{'QTY':<8}{'TYPE':<10}\n" + "-" * 95)
+
+    def expiry_row(med: Medicine) -> str:
+        days_left = (med.expiry_date - current_date).days
+        status = "EXPIRED" if days_left < 0 else f"{days_left} days"
+        return (f"{med.id:<10}{med.name:<20}{med.brand:<15}{format_date(med.expiry_date):<15}"
+                f"{status:<12}{med.quantity:<8}{get_medicine_type_name(med.type):<10}")
+
+    if not page_rows(header, store.expiring_by(threshold_date), expiry_row):
+        print("\n\t\t ## NO UPCOMING EXPIRY MEDICINES ##")
+
+    input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+
+
+def sales_report(store: InventoryStore) -> None:
+    """Display sales totals, top sellers and returns by reason"""
+    aggregates = store.aggregates
+    aggregates.catch_up()
+    aggregates.save()
+
+    today = datetime.date.today()
+    print("\n\n\t#################### SALES REPORT ####################")
+    print(f"\n\t\t Today's Revenue:      ₹{aggregates.revenue_between(today, today):.2f}")
+    print(f"\t\t Last 7 Days Revenue:  ₹{aggregates.revenue_between(today - datetime.timedelta(days=6), today):.2f}")
+    print(f"\t\t This Month's Revenue: ₹{aggregates.revenue_between(today.replace(day=1), today):.2f}")
+
+    print(f"\n{'MEDICINE NAME':<25}{'UNITS SOLD':<15}{'REVENUE':<15}")
+    print('-' * 55)
+    top_sellers = aggregates.top_sellers()
+    for name, units, revenue in top_sellers:
+        print(f"{name:<25}{units:<15}₹{revenue:<14.2f}")
+    if not top_sellers:
+        print("\n\t\t ## NO SALES RECORDED ##")
+
+    print(f"\n{'RETURN REASON':<25}{'UNITS':<15}{'AMOUNT':<15}")
+    print('-' * 55)
+    for reason, units in sorted(aggregates.return_units.items()):
+        print(f"{reason:<25}{units:<15}₹{aggregates.return_amounts[reason]:<14.2f}")
+    if not aggregates.return_units:
+        print("\n\t\t ## NO RETURNS RECORDED ##")
+
+    input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+
+
+def low_stock_alerts(store: InventoryStore) -> None:
+    """Display the most urgent medicines to reorder and set reorder levels"""
+    store.refresh()
     
+    if not store.medicines:
+        print("\n\t\t ## NO MEDICINES IN DATABASE ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    print("\n\n\t#################### LOW STOCK / REORDER ALERTS ####################")
+    answer = input("\n\t\t How many of the most urgent items to show? [20]: ").strip()
+    if answer and not answer.isdigit():
+        print("\n\t\t ## INVALID INPUT ##")
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+        return
+
+    alerts = store.low_stock(int(answer) if answer else 20)
+    print(f"\n{'MEDICINE NAME':<20}{'BRAND':<15}{'STOCK':<8}{'REORDER AT':<12}{'SALES/DAY':<11}{'SHORT BY':<10}")
+    print('-' * 76)
+    for med, stock, level, velocity, urgency in alerts:
+        print(f"{med.name:<20}{med.brand:<15}{stock:<8}{level:<12}{velocity:<11.1f}{urgency:<10.1f}")
+    if not alerts:
+        print("\n\t\t ## NOTHING BELOW ITS REORDER LEVEL ##")
+    print(f"\n\t\t (SHORT BY includes {REORDER_LEAD_DAYS} days of sales at the last "
+          f"{VELOCITY_DAYS} days' rate)")
+
+    m_name = input("\n\t\t Set a reorder level for (medicine name, blank to finish): ").strip()
+    if m_name:
+        medicine = get_medicine_by_name(store, m_name)
+        if not medicine:
+            print("\n\t\t ## MEDICINE NOT FOUND ##")
+        else:
+            current = store.reorder.levels.get((medicine['name'].lower(), medicine['brand'].lower()))
+            try:
+                answer = input(f"\t\t Reorder level for {medicine['name']} ({medicine['brand']}) "
+                               f"[{current if current is not None else 'none'}, blank to clear]: ").strip()
+                if store.set_reorder_level(medicine['id'], int(answer) if answer else None):
+                    print("\n\t\t ## REORDER LEVEL SAVED ##")
+            except ValueError:
+                print("\n\t\t ## INVALID INPUT ##")
+            except InventoryError as e:
+                print(f"\n\t\t ## {e} ##")
+
+    input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+
+
+def list_backups(backups: BackupRepository) -> None:
+    """Display the saved snapshots, oldest first"""
+    snapshots = backups.snapshots()
+    if not snapshots:
+        print(f"\n\t\t ## NO BACKUP SNAPSHOTS IN {backups.directory} ##")
+        return
+    print(f"\n{'SNAPSHOT':<25}{'CREATED':<22}{'MEDICINES':<12}{'SALES':<10}{'RETURNS':<10}{'NEW DATA':<10}")
+    print('-' * 89)
+    for snapshot_id in snapshots:
+        manifest = backups.manifest(snapshot_id)
+        print(f"{snapshot_id:<25}{manifest['created']:<22}{manifest['medicines']:<12}"
+              f"{manifest['ledgers'][SALES_FILE]['frames']:<10}{manifest['ledgers'][RETURNS_FILE]['frames']:<10}"
+              f"{manifest['bytes_written'] / 1024:.1f} KB")
+
+
+CHAIN_MENU = "\n".join([
+    "\n\n\t#################### CHAIN REPORTS ####################",
+    "\n\t\t 1. STOCK VALUATION BY STORE",
+    "\t\t 2. EXPIRY LIST FOR ALL STORES",
+    "\t\t 3. STOCK OF A MEDICINE IN EVERY STORE",
+    "\t\t 4. SALES TOTALS",
+    "\t\t 0. EXIT",
+])
+
+
+def chain_valuation(chain: StoreChain) -> None:
+    """Display each store's stock value and the chain's total"""
+    rows = chain.valuation()
+    print(f"\n{'STORE':<20}{'LOTS':<10}{'UNITS':<12}{'STOCK VALUE':<16}{'EXPIRED VALUE':<16}")
+    print('-' * 74)
+    for name, lots, units, value, expired in rows:
+        print(f"{name:<20}{lots:<10}{units:<12}₹{value:<15.2f}₹{expired:<15.2f}")
+    print('-' * 74)
+    print(f"{'ALL STORES':<20}{sum(row[1] for row in rows):<10}{sum(row[2] for row in rows):<12}"
+          f"₹{sum(row[3] for row in rows):<15.2f}₹{sum(row[4] for row in rows):<15.2f}")
+
+
+def chain_expiry_list(chain: StoreChain) -> None:
+    """Display the medicines expiring within a chosen window in every store"""
+    threshold_date = ask_expiry_window()
+    if threshold_date is None:
+        print("\n\t\t ## INVALID INPUT ##")
+        return
+
     current_date = datetime.date.today()
-    threshold_date = current_date + datetime.timedelta(days=30)
-    found = False
+    print(f"\t\t (Medicines expiring by {threshold_date:%Y, %m, %d})")
+    header = (f"\n{'STORE':<15}{'LOT ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}"
+              f"{'DAYS LEFT':<12}{'QTY':<8}\n" + "-" * 95)
+
+    def expiry_row(row: Tuple[str, Medicine]) -> str:
+        name, med = row
+        days_left = (med.expiry_date - current_date).days
+        status = "EXPIRED" if days_left < 0 else f"{days_left} days"
+        return (f"{name:<15}{med.id:<10}{med.name:<20}{med.brand:<15}{format_date(med.expiry_date):<15}"
+                f"{status:<12}{med.quantity:<8}")
+
+    if not page_rows(header, chain.expiring_by(threshold_date), expiry_row):
+        print("\n\t\t ## NO UPCOMING EXPIRY MEDICINES ##")
+
+
+def chain_stock(chain: StoreChain) -> None:
+    """Display how much of a medicine each store holds"""
+    text = input("\n\t\t ENTER MEDICINE NAME OR SCAN BARCODE: ").strip()
+    if not text:
+        print("\n\t\t ## INVALID INPUT ##")
+        return
+    rows = chain.stock_of(text)
+    if not rows:
+        print("\n\t\t ## MEDICINE NOT FOUND IN ANY STORE ##")
+        return
+
+    print(f"\n{'MEDICINE NAME':<20}{'BRAND':<15}{'STORE':<20}{'IN DATE':<10}{'EXPIRED':<10}{'LOTS':<6}")
+    print('-' * 81)
+    for _, product in groupby(rows, key=lambda row: (row[0].lower(), row[1].lower())):
+        product = list(product)
+        for name, brand, store, units, expired, lots in product:
+            print(f"{name:<20}{brand:<15}{store:<20}{units:<10}{expired:<10}{lots:<6}")
+        print(f"{'':<35}{'ALL STORES':<20}{sum(row[3] for row in product):<10}"
+              f"{sum(row[4] for row in product):<10}{sum(row[5] for row in product):<6}\n")
+
+
+def chain_sales(chain: StoreChain) -> None:
+    """Display each store's revenue and the chain's top sellers and returns"""
+    stores, chain_totals = chain.sales()
+    today = datetime.date.today()
+    windows = [today, today - datetime.timedelta(days=6), today.replace(day=1)]
+    print(f"\n{'STORE':<20}{'TODAY':<15}{'LAST 7 DAYS':<15}{'THIS MONTH':<15}")
+    print('-' * 65)
+    for name, aggregates in stores + [("ALL STORES", chain_totals)]:
+        revenues = [aggregates.revenue_between(start, today) for start in windows]
+        print(f"{name:<20}" + "".join(f"₹{revenue:<14.2f}" for revenue in revenues))
+
+    print(f"\n{'MEDICINE NAME':<25}{'UNITS SOLD':<15}{'REVENUE':<15}")
+    print('-' * 55)
+    top_sellers = chain_totals.top_sellers()
+    for name, units, revenue in top_sellers:
+        print(f"{name:<25}{units:<15}₹{revenue:<14.2f}")
+    if not top_sellers:
+        print("\n\t\t ## NO SALES RECORDED ##")
+
+    print(f"\n{'RETURN REASON':<25}{'UNITS':<15}{'AMOUNT':<15}")
+    print('-' * 55)
+    for reason, units in sorted(chain_totals.return_units.items()):
+        print(f"{reason:<25}{units:<15}₹{chain_totals.return_amounts[reason]:<14.2f}")
+    if not chain_totals.return_units:
+        print("\n\t\t ## NO RETURNS RECORDED ##")
+
+
+def chain_reports(chain: StoreChain) -> None:
+    """Menu of consolidated reports over every store in the chain"""
+    reports = {1: chain_valuation, 2: chain_expiry_list, 3: chain_stock, 4: chain_sales}
+    while True:
+        clear_screen()
+        print(CHAIN_MENU)
+        print(f"\n\t\t ({len(chain.stores())} stores in {chain.root})")
+        choice = input("\n\t\t ENTER YOUR CHOICE: ").strip()
+        if choice == "0":
+            return
+        if not choice.isdigit() or int(choice) not in reports:
+            print("\n\t\t\t ## INVALID CHOICE. PLEASE SELECT 0-4 ##")
+        elif not chain.stores():
+            print(f"\n\t\t ## NO STORES IN {chain.root} ##")
+        else:
+            reports[int(choice)](chain)
+        input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+
+
+API_MAX_BODY = 1024 * 1024
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ApiError(InventoryError):
+    """An API request that cannot be served, with the HTTP status to answer with"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def api_date(value: Any, field: str) -> datetime.date:
+    """Parse an ISO (yyyy-mm-dd) date from a request"""
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ApiError(400, f"INVALID DATE FOR {field.upper()}, EXPECTED YYYY-MM-DD")
 
-    print(f"\n{'MED ID':<10}{'MEDICINE NAME':<20}{'BRAND':<15}{'EXPIRY DATE':<15}{'DAYS LEFT':<12}{'QTY':<8}{'TYPE':<10}")
-    print('-' * 95)
 
-    for med in medicines:
+def api_int(value: Any, field: str, minimum: Optional[int] = None) -> int:
+    """Parse an integer from a request, no smaller than minimum if given"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"INVALID NUMBER FOR {field.upper()}")
+    if minimum is not None and number < minimum:
+        raise ApiError(400, f"{field.upper()} MUST BE AT LEAST {minimum}")
+    return number
+
+
+class InventoryService:
+    """JSON request handlers over one resident InventoryStore, shared by all connections"""
+    def __init__(self, store: InventoryStore):
+        self.store = store
+        # One worker thread runs every handler, so their file I/O and locks stay
+        # off the event loop while writes to the store are still serialized
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api")
+        self.routes: Dict[Tuple[str, str], Callable[[Dict[str, str], Any], Tuple[int, Any]]] = {
+            ("GET", "/medicines"): self.view,
+            ("POST", "/medicines"): self.add,
+            ("GET", "/search"): self.search,
+            ("GET", "/expiry"): self.expiry,
+            ("POST", "/sell"): self.sell,
+            ("POST", "/return"): self.return_stock,
+            ("POST", "/stock"): self.update_stock,
+            ("GET", "/report"): self.report,
+            ("GET", "/low-stock"): self.low_stock,
+            ("POST", "/reorder-level"): self.reorder_level,
+        }
+
+    def respond(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        """Serve one request, turning every failure into an error status and message"""
         try:
-            exp_date = parse_date(med[4])
-            days_left = (exp_date - current_date).days
-            
-            if exp_date <= threshold_date:
-                m_type_name = get_medicine_type_name(med[5])
-                status = "EXPIRED" if days_left < 0 else f"{days_left} days"
-                print(f"{med[0]:<10}{med[1]:<20}{med[2]:<15}{med[4]:<15}{status:<12}{med[6]:<8}{m_type_name:<10}")
-                found = True
+            url = urlsplit(target)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            payload = json.loads(body) if body else {}
+            path = url.path.rstrip("/") or "/"
+            if method == "GET" and path.startswith("/medicines/"):
+                return self.medicine(api_int(path[len("/medicines/"):], "id"))
+            if method == "GET" and path.startswith("/barcodes/"):
+                return self.medicine(self.barcode_lot(unquote(path[len("/barcodes/"):])))
+            route = self.routes.get((method, path))
+            if route is None:
+                raise ApiError(404, f"NO ENDPOINT {method} {path}")
+            if method == "POST" and not isinstance(payload, dict):
+                raise ApiError(400, "REQUEST BODY MUST BE A JSON OBJECT")
+            self.store.refresh()
+            return route(query, payload)
+        except json.JSONDecodeError:
+            return 400, {"error": "REQUEST BODY IS NOT VALID JSON"}
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except InventoryError as e:
+            return 400, {"error": str(e)}
         except Exception as e:
-            print(f"\t\t ## ERROR PROCESSING MEDICINE ID {med[0]}: {e} ##")
+            return 500, {"error": f"{type(e).__name__}: {e}"}
 
-    if not found:
-        print("\n\t\t ## NO UPCOMING EXPIRY MEDICINES ##")
+    def view(self, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        offset = api_int(query.get("offset", 0), "offset", minimum=0)
+        limit = api_int(query.get("limit", 100), "limit", minimum=0)
+        page = islice(self.store.medicines, offset, offset + limit)
+        return 200, {"count": len(self.store), "total_value": self.store.columns().value(),
+                     "medicines": [medicine_to_dict(med) for med in page]}
 
-    input("\n\t\t\t\t...:::::Press Enter Key:::::...")
+    def medicine(self, m_id: int) -> Tuple[int, Any]:
+        self.store.refresh()
+        med = self.store.get(m_id)
+        if med is None:
+            raise ApiError(404, f"MEDICINE ID {m_id} NOT FOUND")
+        return 200, dict(medicine_to_dict(med), available=self.store.available(m_id),
+                         lots=[medicine_to_dict(lot) for lot in self.store.lots(m_id)])
+
+    def add(self, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        med = build_medicine(self.store.next_id(), body.get("name", ""), body.get("brand", ""),
+                             api_date(body.get("manufacturing_date"), "manufacturing_date"),
+                             api_date(body.get("expiry_date"), "expiry_date"),
+                             body.get("type"), body.get("price"), body.get("quantity"),
+                             allow_expired=bool(body.get("allow_expired")), barcode=body.get("barcode"))
+        if not self.store.add(med):
+            raise ApiError(500, "ERROR SAVING FILE")
+        return 201, medicine_to_dict(med)
+
+    def search(self, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        text = query.get("q", "").strip()
+        if not text:
+            raise ApiError(400, "PLEASE ENTER A MEDICINE NAME")
+        limit = api_int(query.get("limit", 20), "limit", minimum=0)
+        return 200, {"medicines": [medicine_to_dict(med) for med in self.store.search(text)[:limit]]}
+
+    def expiry(self, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        if "by" in query:
+            threshold_date = api_date(query["by"], "by")
+        else:
+            threshold_date = expiry_window(query.get("within", ""))
+            if threshold_date is None:
+                raise ApiError(400, "INVALID NUMBER FOR WITHIN")
+        limit = api_int(query.get("limit", 100), "limit", minimum=0)
+        today = datetime.date.today()
+        expiring = self.store.expiring_by(threshold_date)
+        return 200, {"by": threshold_date.isoformat(), "count": len(expiring),
+                     "medicines": [dict(medicine_to_dict(med), days_left=(med.expiry_date - today).days)
+                                   for med in expiring[:limit]]}
+
+    def barcode_lot(self, code: str) -> int:
+        """ID of a lot sold under a barcode"""
+        self.store.refresh()
+        med = self.store.find_barcode(code)
+        if med is None:
+            raise ApiError(404, f"NO MEDICINE WITH BARCODE {code}")
+        return med.id
+
+    def sell(self, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        lines = body.get("lines", [body])
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            raise ApiError(400, "LINES MUST BE A LIST OF {id or barcode, quantity} OBJECTS")
+        # A scanned line names its barcode instead of an ID
+        bill = self.store.checkout([(self.barcode_lot(str(line["barcode"])) if "barcode" in line
+                                     else api_int(line.get("id"), "id"),
+                                     api_int(line.get("quantity"), "quantity"))
+                                    for line in lines])
+        # One line per lot the sale was filled from
+        return 200, {"lines": [{"lot": lot.id, "name": lot.name, "quantity": qty, "amount": amount,
+                                "remaining": lot.quantity} for lot, qty, amount in bill],
+                     "total": sum(amount for _, _, amount in bill)}
+
+    def return_stock(self, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        med, qty, amount = self.store.return_stock(api_int(body.get("id"), "id"),
+                                                   api_int(body.get("quantity"), "quantity"),
+                                                   str(body.get("reason", "")).strip())
+        return 200, {"lot": med.id, "name": med.name, "quantity": qty, "amount": amount,
+                     "remaining": med.quantity}
+
+    def update_stock(self, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        med = self.store.adjust_stock(api_int(body.get("id"), "id"), api_int(body.get("change"), "change"))
+        return 200, medicine_to_dict(med)
+
+    def low_stock(self, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        alerts = self.store.low_stock(api_int(query.get("limit", 20), "limit", minimum=0))
+        return 200, {"medicines": [{"id": med.id, "name": med.name, "brand": med.brand, "stock": stock,
+                                    "reorder_level": level, "sales_per_day": velocity, "short_by": urgency}
+                                   for med, stock, level, velocity, urgency in alerts]}
 
+    def reorder_level(self, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        level = body.get("level")
+        m_id = api_int(body.get("id"), "id")
+        if level is not None:
+            level = api_int(level, "level")
+        if not self.store.set_reorder_level(m_id, level):
+            raise ApiError(500, "ERROR SAVING REORDER LEVELS")
+        return 200, {"id": m_id, "level": level}
 
-def main():
+    def report(self, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        aggregates = self.store.aggregates
+        aggregates.catch_up()
+        today = datetime.date.today()
+        return 200, {
+            "revenue": {"today": aggregates.revenue_between(today, today),
+                        "last_7_days": aggregates.revenue_between(today - datetime.timedelta(days=6), today),
+                        "this_month": aggregates.revenue_between(today.replace(day=1), today)},
+            "top_sellers": [{"name": name, "units": units, "revenue": revenue}
+                            for name, units, revenue in aggregates.top_sellers()],
+            "returns": {reason: {"units": units, "amount": aggregates.return_amounts[reason]}
+                        for reason, units in aggregates.return_units.items()},
+        }
+
+
+async def handle_connection(service: InventoryService, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+    """Serve HTTP/1.1 requests on one keep-alive connection"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            if length > API_MAX_BODY:
+                status, payload, keep_alive = 413, {"error": "REQUEST BODY TOO LARGE"}, False
+            else:
+                body = await reader.readexactly(length) if length else b""
+                loop = asyncio.get_running_loop()
+                status, payload = await loop.run_in_executor(service.worker, service.respond,
+                                                             method.upper(), target, body)
+                if service.store.backend.deferred and method.upper() != "GET" and status < 300:
+                    # Acknowledge a change only once it is on disk. Waiting outside
+                    # the handler thread lets other requests' changes join the same write
+                    if not await loop.run_in_executor(None, service.store.flush):
+                        status, payload = 503, {"error": "CHANGE NOT YET SAVED; RETRYING"}
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+
+            data = json.dumps(payload).encode("utf-8")
+            writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        # Dropped connections and malformed requests just close the connection
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(store: InventoryStore, host: str = "127.0.0.1", port: int = 8080) -> None:
+    """Serve the JSON API until cancelled"""
+    service = InventoryService(store)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer),
+                                        host, port)
+    print(f"\n\t\t ## SERVING THE INVENTORY API ON http://{host}:{port} ##")
+    try:
+        # Stop cleanly (saving the sales summary) when a service manager asks
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:  # Windows
+        pass
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.worker.shutdown()
+
+
+def main(argv: Optional[List[str]] = None):
     """Main program loop"""
+    parser = argparse.ArgumentParser(description="Good Health medical store inventory")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        default=os.environ.get("MEDICINES_BACKEND", PickleBackend.name),
+                        help="where the inventory and ledgers are stored (default: pickle)")
+    parser.add_argument("--import-dat", action="store_true",
+                        help=f"copy {MEDICINES_FILE} and the .dat ledgers into {SQLITE_FILE} and exit")
+    parser.add_argument("--convert", choices=["dat-to-rec", "rec-to-dat"],
+                        help=f"copy the inventory between {MEDICINES_FILE} and {RECORD_FILE} and exit")
+    parser.add_argument("--import", dest="import_file", metavar="FILE",
+                        help="add the medicines in a .csv or .jsonl file and exit")
+    parser.add_argument("--allow-expired", action="store_true",
+                        help="with --import, accept rows that are already expired")
+    parser.add_argument("--export", nargs=2, metavar=("WHAT", "FILE"),
+                        help="write inventory, sales or returns to a .csv or .jsonl file and exit")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="run the JSON API server instead of the menu")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="save inventory changes from a background thread, merging bursts "
+                             "into one synced write (only one process may use the data directory)")
+    parser.add_argument("--metrics", metavar="FILE", default=os.environ.get(METRICS_ENV),
+                        help="time operations and count file I/O, writing the totals to FILE "
+                             f"at exit (.json, otherwise Prometheus text; or set {METRICS_ENV})")
+    parser.add_argument("--profile", metavar="FILE", default=os.environ.get(PROFILE_ENV),
+                        help=f"profile the session with cProfile into FILE at exit (or set {PROFILE_ENV})")
+    parser.add_argument("--backup", action="store_true",
+                        help="save an incremental snapshot of the data directory and exit")
+    parser.add_argument("--backups", action="store_true",
+                        help="list the saved snapshots and exit")
+    parser.add_argument("--restore", metavar="SNAPSHOT",
+                        help="put the data back as a snapshot saved it ('latest' for the newest) "
+                             "and exit; the current data is snapshotted first")
+    parser.add_argument("--backup-dir", metavar="DIR",
+                        help=f"where snapshots are kept (default: {BACKUP_DIR} in the data directory)")
+    parser.add_argument("--store", metavar="NAME",
+                        help="work on one store of a chain, kept in its own directory under --stores")
+    parser.add_argument("--stores", metavar="DIR", default=STORES_DIR,
+                        help=f"directory holding one subdirectory per store (default: {STORES_DIR})")
+    parser.add_argument("--chain", action="store_true",
+                        help="show consolidated reports over every store under --stores")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        METRICS.enable()
+        atexit.register(METRICS.dump, args.metrics)
+    if args.profile:
+        profiler = cProfile.Profile()
+        atexit.register(write_profile, profiler, args.profile)
+        profiler.enable()
+
+    if args.chain:
+        chain = StoreChain(args.stores, args.backend)
+        try:
+            chain_reports(chain)
+        except KeyboardInterrupt:
+            print("\n\n\t\t\t ## PROGRAM INTERRUPTED ##")
+        finally:
+            chain.close()
+        return
+
+    directory = "."
+    if args.store:
+        try:
+            directory = store_directory(args.store, args.stores)
+        except InventoryError as e:
+            parser.error(str(e))
+        os.makedirs(directory, exist_ok=True)
+
+    if args.convert:
+        try:
+            if args.convert == "dat-to-rec":
+                count, target = convert_dat_to_records(directory), RECORD_FILE
+            else:
+                count, target = convert_records_to_dat(directory), MEDICINES_FILE
+        except InventoryError as e:
+            print(f"\n\t\t ## {e} ##")
+            return
+        print(f"\n\t\t ## COPIED {count} MEDICINES INTO {target} ##")
+        return
+
+    if args.import_dat:
+        try:
+            counts = import_dat_to_sqlite(directory)
+        except InventoryError as e:
+            print(f"\n\t\t ## {e} ##")
+            return
+        print(f"\n\t\t ## IMPORTED {counts['medicines']} MEDICINES, {counts['sales']} SALES "
+              f"AND {counts['returns']} RETURNS INTO {SQLITE_FILE} ##")
+        return
+
+    backend = open_backend(args.backend, directory)
+    if args.backup or args.backups or args.restore:
+        backups = BackupRepository(args.backup_dir or backend.path(BACKUP_DIR))
+        try:
+            if args.backups:
+                list_backups(backups)
+                return
+            if args.restore:
+                # Looked up before the safety snapshot, which would otherwise
+                # be 'latest'; a mistyped ID changes nothing
+                target = backups.manifest(args.restore)["id"]
+            manifest = backups.snapshot(backend)
+            print(f"\n\t\t ## SNAPSHOT {manifest['id']} SAVED: {manifest['medicines']} MEDICINES, "
+                  f"{manifest['chunks_written']} NEW CHUNKS ({manifest['bytes_written'] / 1024:.1f} KB) ##")
+            if args.restore:
+                manifest = backups.restore(backend, target)
+                print(f"\n\t\t ## RESTORED SNAPSHOT {manifest['id']} FROM {manifest['created']} ##")
+        except (InventoryError, OSError) as e:
+            print(f"\n\t\t ## {e} ##")
+        return
+
+    if args.write_behind:
+        backend = WriteBehindBackend(backend)
+        atexit.register(backend.close)
+    store = InventoryStore(backend)
+    if args.import_file:
+        try:
+            added, rejected, errors = import_medicines(store, args.import_file, args.allow_expired)
+        except (InventoryError, OSError) as e:
+            print(f"\n\t\t ## {e} ##")
+            return
+        for line_no, error in errors:
+            print(f"\t\t LINE {line_no}: {error}")
+        if rejected > len(errors):
+            print(f"\t\t ... AND {rejected - len(errors)} MORE")
+        print(f"\n\t\t ## IMPORTED {added} MEDICINES, REJECTED {rejected} ROWS ##")
+        return
+
+    if args.export:
+        what, path = args.export
+        ledgers = {"sales": SALES_FILE, "returns": RETURNS_FILE}
+        try:
+            if what == "inventory":
+                count = export_medicines(store, path)
+            elif what in ledgers:
+                count = export_ledger(store.backend, ledgers[what], path)
+            else:
+                parser.error("--export WHAT must be inventory, sales or returns")
+        except OSError as e:
+            print(f"\n\t\t ## {e} ##")
+            return
+        print(f"\n\t\t ## EXPORTED {count} {what.upper()} ROWS TO {path} ##")
+        return
+
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        if not port.isdigit():
+            parser.error("--serve expects [HOST:]PORT")
+        try:
+            asyncio.run(serve(store, host or "127.0.0.1", int(port)))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        finally:
+            store.aggregates.save()
+        return
+
     while True:
         try:
             show_menu()
@@ -554,26 +4683,33 @@ def main():
             choice = int(choice)
             
             if choice == 0:
+                store.aggregates.save()
                 print("\n\t\t\t ## THANK YOU FOR USING THE SYSTEM ##")
                 break
             elif choice == 1:
-                add_stock()
+                add_stock(store)
             elif choice == 2:
-                update_stock()
+                update_stock(store)
             elif choice == 3:
-                delete_medicine()
+                delete_medicine(store)
             elif choice == 4:
-                sell_medicine()
+                sell_medicine(store)
             elif choice == 5:
-                return_medicine()
+                return_medicine(store)
             elif choice == 6:
-                expiry_list()
+                expiry_list(store)
             elif choice == 7:
-                search_medicine()
+                search_medicine(store)
             elif choice == 8:
-                view_all_medicines()
+                view_all_medicines(store)
+            elif choice == 9:
+                sales_report(store)
+            elif choice == 10:
+                cart_checkout(store)
+            elif choice == 11:
+                low_stock_alerts(store)
             else:
-                print("\n\t\t\t ## INVALID CHOICE. PLEASE SELECT 0-8 ##")
+                print("\n\t\t\t ## INVALID CHOICE. PLEASE SELECT 0-11 ##")
                 input("\n\t\t\t\t...:::::Press Enter Key:::::...")
         except KeyboardInterrupt:
             print("\n\n\t\t\t ## PROGRAM INTERRUPTED ##")